@@ -1,23 +1,80 @@
-"""
-flask主程序
-"""
-from flask import Flask
-from flask_cors import CORS
-from routes.user_routes import user_bp
-from routes.data_routes import data_bp
-from routes.record_routes import record_bp
-
-app = Flask(__name__)
-CORS(app)  # 允许跨域
-
-# 注册蓝图（模块化路由）
-app.register_blueprint(user_bp, url_prefix='/api/user')
-app.register_blueprint(data_bp, url_prefix='/api/data')
-app.register_blueprint(record_bp, url_prefix='/api/record')
-
-@app.route('/')
-def home():
-    return "船舶轨迹查询及海洋环境分析平台后端已启动！"
-
-if __name__ == '__main__':
+"""
+flask主程序
+"""
+import atexit
+import os
+import secrets
+import sys
+from flask import Flask, jsonify, request
+from flask_cors import CORS
+from models.database import get_pool_stats, close_pool
+from models.snapshot import init_snapshot_refresh, shutdown_snapshot_refresh
+from models.nearby_index import init_nearby_index, shutdown_nearby_index, nearby_index
+from utils.audit import shutdown_audit
+from utils.import_jobs import shutdown_import_jobs
+from utils import metrics
+from utils.slow_query import init_slow_query_log, shutdown_slow_query_log, get_slow_query_summary, slow_query_log
+from utils.auth import admin_required
+from routes.user_routes import user_bp
+from routes.data_routes import data_bp
+from routes.record_routes import record_bp
+from config import Config
+
+app = Flask(__name__)
+CORS(app)  # 允许跨域
+metrics.init_app(app)  # Config.METRICS_ENABLED 时启用 /metrics
+init_slow_query_log()  # Config.SLOW_QUERY_ENABLED 时记录慢查询
+init_snapshot_refresh()  # READ_ENGINE 为 sqlite/duckdb 且 READ_SNAPSHOT_REFRESH > 0 时后台刷新只读快照
+init_nearby_index()  # Config.NEARBY_ENABLED 时后台建立最近船舶索引（/api/data/nearby）
+
+# 令牌密钥必须由所有工作进程共享；只有开发调试和测试允许每个进程随机生成
+if not Config.AUTH_SECRET_KEY:
+    if not (__name__ == '__main__' or os.environ.get('FLASK_DEBUG') == '1' or 'pytest' in sys.modules):
+        raise SystemExit('错误: 未设置环境变量 AUTH_SECRET_KEY（所有工作进程须使用同一个值），服务拒绝启动')
+    Config.AUTH_SECRET_KEY = secrets.token_hex(32)
+    print('警告: 未设置环境变量 AUTH_SECRET_KEY，已为本进程随机生成令牌密钥（仅限开发调试/测试，重启后需重新登录）')
+
+# 注册蓝图（模块化路由）
+app.register_blueprint(user_bp, url_prefix='/api/user')
+app.register_blueprint(data_bp, url_prefix='/api/data')
+app.register_blueprint(record_bp, url_prefix='/api/record')
+
+@app.route('/')
+def home():
+    return "船舶轨迹查询及海洋环境分析平台后端已启动！"
+
+# 连接池状态（监控用），管理员可用
+@app.route('/api/db/pool')
+@admin_required
+def pool_stats():
+    return jsonify({"success": True, "pool": get_pool_stats()})
+
+# 慢查询汇总（按 SQL 形状的总耗时排序），管理员可用
+@app.route('/api/db/slow-queries')
+@admin_required
+def slow_queries():
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({"success": True, "slow_queries": get_slow_query_summary(max(1, limit))})
+
+@app.route('/api/db/slow-queries/reset', methods=['POST'])
+@admin_required
+def reset_slow_queries():
+    slow_query_log.reset()
+    return jsonify({"success": True})
+
+# 最近船舶索引状态（观测数、建立用时、内存、待应用的写入），管理员可用
+@app.route('/api/db/nearby-index')
+@admin_required
+def nearby_index_stats():
+    return jsonify({"success": True, "index": nearby_index.get_stats()})
+
+# 进程退出时先停止导入任务，再写完操作记录队列，最后关闭空闲连接（atexit 按注册的逆序执行）
+atexit.register(close_pool)
+atexit.register(shutdown_snapshot_refresh)
+atexit.register(shutdown_nearby_index)
+atexit.register(shutdown_slow_query_log)
+atexit.register(shutdown_audit)
+atexit.register(shutdown_import_jobs)
+
+if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""
+对比两次基准结果（bench.run 输出的 JSON）
+
+逐场景、逐并发级别打印 p50/p95/p99 和吞吐的变化；p95 变慢或吞吐下降超过 --threshold（百分比）的标记为回退，
+有回退时退出码为 1，可用于 CI：
+    cd backend
+    python -m bench.compare bench/results/base.json bench/results/new.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _change(old, new):
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+
+def _fmt(old, new):
+    change = _change(old, new)
+    text = f'{old:>9.2f} -> {new:>9.2f}'
+    return text + (f' ({change:+6.1f}%)' if change is not None else ' (   n/a )')
+
+
+def compare(base, new, threshold):
+    """返回 (输出行, 回退列表)"""
+    lines, regressions = [], []
+    for name, levels in new['results'].items():
+        for level, r in levels.items():
+            b = base['results'].get(name, {}).get(level)
+            if b is None:
+                lines.append(f'{name:<20} {level:<4} 基准结果中没有该场景')
+                continue
+            p95 = _change(b['p95_ms'], r['p95_ms'])
+            rps = _change(b['throughput_rps'], r['throughput_rps'])
+            worse = (p95 is not None and p95 > threshold) or (rps is not None and -rps > threshold)
+            if worse:
+                regressions.append(f'{name}/{level}')
+            lines.append(f"{name:<20} {level:<4} p50 {_fmt(b['p50_ms'], r['p50_ms'])}  "
+                         f"p95 {_fmt(b['p95_ms'], r['p95_ms'])}  p99 {_fmt(b['p99_ms'], r['p99_ms'])}  "
+                         f"req/s {_fmt(b['throughput_rps'], r['throughput_rps'])}"
+                         + (f"  错误 {b['errors']} -> {r['errors']}" if b['errors'] or r['errors'] else '')
+                         + ('  <- 回退' if worse else ''))
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比两次基准结果')
+    parser.add_argument('base', help='基准结果 JSON')
+    parser.add_argument('new', help='新结果 JSON')
+    parser.add_argument('--threshold', type=float, default=10.0, help='判定回退的百分比阈值')
+    args = parser.parse_args()
+
+    base, new = _load(args.base), _load(args.new)
+    print(f"基准: {base['meta']['commit']} ({base['meta']['timestamp']}, {base['meta']['observations']} 条观测)")
+    print(f"新:   {new['meta']['commit']} ({new['meta']['timestamp']}, {new['meta']['observations']} 条观测)")
+    for key in ('mode', 'observations', 'iterations', 'seed'):
+        if base['meta'].get(key) != new['meta'].get(key):
+            print(f"注意: {key} 不同（{base['meta'].get(key)} / {new['meta'].get(key)}），结果可能不可比")
+
+    lines, regressions = compare(base, new, args.threshold)
+    print('\n'.join(lines))
+    if regressions:
+        print(f'回退（>{args.threshold:g}%）: {", ".join(regressions)}')
+        sys.exit(1)
+    print('没有超过阈值的回退')
+
+
+if __name__ == '__main__':
+    main()
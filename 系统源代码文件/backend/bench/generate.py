@@ -0,0 +1,343 @@
+"""
+基准测试用合成数据生成
+
+以 data/converted/*.csv 为样本估计分布（观测海域、时间间隔、海温随纬度的变化、
+浪高/波周期/涌浪高度的取值范围、缺测比例、涌浪方向频率），生成任意规模的
+User_u / Data_u / Record / Ship 数据：
+- 每艘船一条连续航迹：航向随机游走、航速 8~16 节、在样本海域边界处反射
+- 观测间隔按样本的小时分布（以 6 小时为主）
+- 环境值沿航迹缓慢漂移，海温按纬度回归 + 噪声，缺测值沿用源数据的 -99.9
+
+写入独立的基准库（默认 vessel_tracking_bench，不存在则创建并执行迁移），或导出为导入格式的 CSV：
+    cd backend
+    python -m bench.generate --rows 1000000 [--ships 500] [--users 50] [--seed 42] [--reset]
+    python -m bench.generate --rows 100000 --csv-out bench/data
+"""
+import argparse
+import csv
+import glob
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+from config import Config
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data', 'converted')
+DEFAULT_DATABASE = 'vessel_tracking_bench'
+BENCH_PASSWORD = 'bench123'
+MISSING = -99.9
+DIRECTIONS = np.array(['E', 'S', 'W', 'N'])
+_BATCH = 5000
+CSV_HEADER = ['ship_id', 'datetime', 'lat', 'long', 'sea_temp', 'wave_height', 'wave_period',
+              'surge_direction', 'surge_height']
+
+# 样本缺失时使用的默认分布（与 data/converted 的统计接近）
+_DEFAULT_SEED = {
+    'lat': (15.0, 39.0), 'lon': (107.7, 130.0),
+    'hours': ([6, 3, 12], [0.6, 0.25, 0.15]),
+    'temp_fit': (33.0, -0.35), 'temp_resid': 1.5,
+    'ranges': {'wave_height': (0.5, 6.0), 'wave_period': (2.0, 12.0), 'surge_height': (0.0, 6.0)},
+    'missing': {'sea_temp': 0.13, 'wave_height': 0.24, 'wave_period': 0.21, 'surge_height': 0.31},
+    'directions': [0.35, 0.21, 0.12, 0.32],
+}
+
+
+def fit_seed(data_dir=DATA_DIR):
+    """从样本 CSV 估计生成参数；没有样本时返回默认值"""
+    rows = []
+    for path in sorted(glob.glob(os.path.join(data_dir, '*.csv'))):
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            rows.extend(csv.DictReader(f))
+    if len(rows) < 20:
+        return dict(_DEFAULT_SEED)
+
+    def floats(key):
+        out = []
+        for r in rows:
+            try:
+                out.append(float(r[key]))
+            except (KeyError, TypeError, ValueError):
+                out.append(np.nan)
+        return np.array(out)
+
+    lat, lon = floats('lat'), floats('long')
+    seed = {'lat': (float(np.nanmin(lat)), float(np.nanmax(lat))),
+            'lon': (float(np.nanmin(lon)), float(np.nanmax(lon)))}
+
+    # 同一船舶相邻观测的时间间隔（小时）
+    by_ship = {}
+    for r in rows:
+        try:
+            by_ship.setdefault(r['ship_id'], []).append(datetime.strptime(r['datetime'], '%Y-%m-%d %H'))
+        except (KeyError, ValueError):
+            continue
+    gaps = []
+    for times in by_ship.values():
+        times.sort()
+        gaps += [int((b - a).total_seconds() // 3600) for a, b in zip(times, times[1:])]
+    gaps = [g for g in gaps if 0 < g <= 24]
+    if gaps:
+        values, counts = np.unique(gaps, return_counts=True)
+        seed['hours'] = (values.tolist(), (counts / counts.sum()).tolist())
+    else:
+        seed['hours'] = _DEFAULT_SEED['hours']
+
+    temp = floats('sea_temp')
+    ok = temp > -99
+    if ok.sum() >= 10:
+        slope, intercept = np.polyfit(lat[ok], temp[ok], 1)
+        seed['temp_fit'] = (float(intercept), float(slope))
+        seed['temp_resid'] = float(np.std(temp[ok] - (intercept + slope * lat[ok])))
+    else:
+        seed['temp_fit'], seed['temp_resid'] = _DEFAULT_SEED['temp_fit'], _DEFAULT_SEED['temp_resid']
+
+    seed['ranges'] = {}
+    seed['missing'] = {'sea_temp': float(1 - ok.mean())}
+    for key in ('wave_height', 'wave_period', 'surge_height'):
+        v = floats(key)
+        seed['missing'][key] = float(1 - (v > -99).mean())
+        # 样本中的 99 也是缺测标记，不参与取值范围；取 1%~99% 分位
+        valid = v[(v > -99) & (v < 99)]
+        seed['ranges'][key] = (float(np.percentile(valid, 1)), float(np.percentile(valid, 99))) \
+            if len(valid) >= 10 else _DEFAULT_SEED['ranges'][key]
+
+    counts = np.array([sum(1 for r in rows if r.get('surge_direction') == d) for d in DIRECTIONS], dtype=float)
+    seed['directions'] = (counts / counts.sum()).tolist() if counts.sum() else _DEFAULT_SEED['directions']
+    return seed
+
+
+def _group_cumsum(x, starts, counts):
+    """按船舶分段的累加和"""
+    c = np.cumsum(x)
+    offset = c[starts] - x[starts]
+    return c - np.repeat(offset, counts)
+
+
+def _reflect(x, lo, hi):
+    """把 x 反射回 [lo, hi]"""
+    span = hi - lo
+    y = np.mod(x - lo, 2 * span)
+    return lo + np.where(y > span, 2 * span - y, y)
+
+
+def generate_observations(rows, ships, seed, start, days, rng):
+    """
+    生成 rows 条观测，返回各列 numpy 数组：
+    ship（从 1 开始的序号）、time（datetime64[s]）、lat、lon、sea_temp、wave_height、wave_period、direction、surge_height
+    """
+    # 观测数按对数正态分配到各船，少数船观测很多
+    ships = min(ships, rows)
+    weights = rng.lognormal(0, 1, ships)
+    counts = np.maximum(1, np.floor(weights / weights.sum() * (rows - ships))).astype(np.int64)
+    counts[np.argmax(counts)] += rows - counts.sum()
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    ship = np.repeat(np.arange(1, ships + 1), counts)
+    first = np.zeros(rows, dtype=bool)
+    first[starts] = True
+
+    # 时间：起点在 [start, start + days) 内，之后按样本间隔递增
+    hours_values, hours_p = seed['hours']
+    gap = rng.choice(hours_values, size=rows, p=hours_p).astype(np.int64)
+    gap[first] = 0
+    t0 = np.datetime64(start, 's') + rng.integers(0, days * 24, ships) * np.timedelta64(3600, 's')
+    hours = _group_cumsum(gap, starts, counts)
+    when = np.repeat(t0, counts) + hours * np.timedelta64(3600, 's')
+
+    # 航迹：航向随机游走，航速 8~16 节，1 纬度 = 60 海里
+    (lat_lo, lat_hi), (lon_lo, lon_hi) = seed['lat'], seed['lon']
+    heading = _group_cumsum(np.where(first, rng.uniform(0, 2 * np.pi, rows), rng.normal(0, 0.35, rows)), starts, counts)
+    dist = np.where(first, 0.0, rng.uniform(8, 16, rows) * gap / 60.0)
+    lat0 = np.repeat(rng.uniform(lat_lo, lat_hi, ships), counts)
+    lon0 = np.repeat(rng.uniform(lon_lo, lon_hi, ships), counts)
+    lat = _reflect(lat0 + _group_cumsum(dist * np.cos(heading), starts, counts), lat_lo, lat_hi)
+    lon = _reflect(lon0 + _group_cumsum(dist * np.sin(heading) / np.cos(np.radians(lat)), starts, counts), lon_lo, lon_hi)
+
+    def drifting(lo, hi, step):
+        base = np.repeat(rng.uniform(lo, hi, ships), counts)
+        return _reflect(base + _group_cumsum(np.where(first, 0.0, rng.normal(0, step, rows)), starts, counts), lo, hi)
+
+    intercept, slope = seed['temp_fit']
+    sea_temp = intercept + slope * lat + _group_cumsum(np.where(first, rng.normal(0, seed['temp_resid'], rows),
+                                                                rng.normal(0, 0.2, rows)), starts, counts)
+    sea_temp = np.clip(sea_temp, -2.0, 35.0)
+    wh_lo, wh_hi = seed['ranges']['wave_height']
+    wave_height = drifting(wh_lo, wh_hi, (wh_hi - wh_lo) * 0.05)
+    wp_lo, wp_hi = seed['ranges']['wave_period']
+    wave_period = np.clip(wp_lo + (wave_height - wh_lo) / max(wh_hi - wh_lo, 1e-6) * (wp_hi - wp_lo)
+                          + rng.normal(0, 1.0, rows), wp_lo, wp_hi)
+    sh_lo, sh_hi = seed['ranges']['surge_height']
+    surge_height = drifting(sh_lo, sh_hi, (sh_hi - sh_lo) * 0.05)
+
+    # 涌浪方向：按样本频率抽取，80% 概率沿用上一条
+    direction_idx = rng.choice(len(DIRECTIONS), size=rows, p=seed['directions'])
+    keep = ~first & (rng.random(rows) < 0.8)
+    source = np.maximum.accumulate(np.where(keep, 0, np.arange(rows)))
+    direction_idx = direction_idx[source]
+
+    out = {
+        'ship': ship,
+        'time': when,
+        'lat': np.round(lat, 1),
+        'lon': np.round(lon, 1),
+        'sea_temp': np.round(sea_temp, 1),
+        'wave_height': np.round(wave_height * 2) / 2,
+        'wave_period': np.round(wave_period),
+        'direction': DIRECTIONS[direction_idx],
+        'surge_height': np.round(surge_height * 2) / 2,
+    }
+    for key, rate in seed['missing'].items():
+        out[key][rng.random(rows) < rate] = MISSING
+    return out
+
+
+def _rows(obs, lo, hi, ship_offset=0):
+    times = obs['time'][lo:hi].astype('datetime64[s]').astype(datetime)
+    return [(int(obs['ship'][i]) + ship_offset, times[i - lo], float(obs['lat'][i]), float(obs['lon'][i]),
+             float(obs['sea_temp'][i]), float(obs['wave_height'][i]), float(obs['wave_period'][i]),
+             str(obs['direction'][i]), float(obs['surge_height'][i])) for i in range(lo, hi)]
+
+
+def csv_records(obs, lo, hi):
+    """CSV 行（时间格式化为字符串）"""
+    for r in _rows(obs, lo, hi):
+        yield (r[0], r[1].strftime('%Y-%m-%d %H:%M:%S')) + r[2:]
+
+
+def write_csv(obs, out_dir, rows_per_file=100000):
+    """导出为 /api/data/import 可直接导入的 CSV，返回文件列表"""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    n = len(obs['ship'])
+    for part, lo in enumerate(range(0, n, rows_per_file)):
+        path = os.path.join(out_dir, f'bench_{part:04d}.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+            writer.writerows(csv_records(obs, lo, min(lo + rows_per_file, n)))
+        paths.append(path)
+    return paths
+
+
+def use_database(database):
+    """切换本进程使用的数据库（必须在第一次借出连接之前调用），不存在则创建"""
+    import mysql.connector
+    conn = mysql.connector.connect(host=Config.MYSQL_HOST, port=Config.MYSQL_PORT, user=Config.MYSQL_USER,
+                                   password=Config.MYSQL_PASSWORD, charset=Config.MYSQL_CHARSET)
+    try:
+        cur = conn.cursor()
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS `{database}` DEFAULT CHARSET utf8mb4 COLLATE utf8mb4_unicode_ci")
+        cur.close()
+    finally:
+        conn.close()
+    Config.MYSQL_DATABASE = database
+
+
+def load(obs, users, admins, rng, reset=False):
+    """写入当前数据库：User_u、Ship、Data_u、Record，然后重建汇总表和 Ship 统计"""
+    from models.database import get_db_connection
+    from models import schema, rollup, ships as ships_model
+
+    schema.migrate()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # 批量装载时关闭唯一/外键检查（数据由本脚本保证一致）
+        cur.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+        if reset:
+            for table in ('Record', 'Data_u', 'Ship', 'User_u', 'Rollup_ShipHour', 'Rollup_ShipDay', 'Rollup_CellDay'):
+                cur.execute(f"TRUNCATE TABLE {table}")
+            conn.commit()
+
+        cur.execute("SELECT COALESCE(MAX(UserID), 0) FROM User_u")
+        user_base = cur.fetchone()[0]
+        password = generate_password_hash(BENCH_PASSWORD)
+        tag = int(time.time())
+        cur.executemany("INSERT INTO User_u (UserID, Email, Password_u, Name_u, Role_u) VALUES (%s, %s, %s, %s, %s)",
+                        [(user_base + i, f'bench{tag}_{i}@example.com', password, f'Bench{i}', 1 if i <= admins else 0)
+                         for i in range(1, users + 1)])
+        admin_ids = np.arange(user_base + 1, user_base + admins + 1)
+
+        cur.execute("SELECT COALESCE(MAX(ShipID), 0) FROM Ship")
+        ship_base = cur.fetchone()[0]
+        n_ships = int(obs['ship'].max())
+        cur.executemany("INSERT INTO Ship (ShipID, CallSign) VALUES (%s, %s)",
+                        [(ship_base + i, f'BENCH{tag}-{i:05d}') for i in range(1, n_ships + 1)])
+        conn.commit()
+
+        cur.execute("SELECT COALESCE(MAX(DataID), 0) FROM Data_u")
+        data_base = cur.fetchone()[0]
+        n = len(obs['ship'])
+        started = time.perf_counter()
+        for lo in range(0, n, _BATCH):
+            hi = min(lo + _BATCH, n)
+            rows = _rows(obs, lo, hi, ship_base)
+            ids = range(data_base + lo + 1, data_base + hi + 1)
+            cur.executemany("""
+                INSERT INTO Data_u (DataID, ShipID, DateTime_u, Lat, Long_u, SeaTemp, WaveHeight, WavePeriod, SurgeDirection, SurgeHeight)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [(did,) + r for did, r in zip(ids, rows)])
+            # 每条观测一条导入记录，约 2% 另有一次修改记录
+            who = rng.choice(admin_ids, size=hi - lo)
+            records = [('IMPORT', r[1], int(u), did) for did, r, u in zip(ids, rows, who)]
+            records += [('UPDATE', r[1], int(u), did) for did, r, u, x in zip(ids, rows, who, rng.random(hi - lo)) if x < 0.02]
+            cur.executemany("INSERT INTO Record (OprateType, DateTime_u, UserID, DataID) VALUES (%s, %s, %s, %s)", records)
+            conn.commit()
+            rate = hi / (time.perf_counter() - started)
+            print(f'已写入 {hi}/{n} 行（{rate:.0f} 行/秒）')
+    finally:
+        # 会话变量随连接归还连接池，必须恢复，否则之后借到这条连接的代码也不做检查
+        # （恢复失败说明连接已断开，归还时连接池会丢弃它）
+        try:
+            conn.rollback()
+            cur.execute("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+        except Exception as e:
+            print(f'恢复唯一/外键检查失败: {e}')
+        cur.close()
+        conn.close()
+
+    if schema.rollups_available():
+        rollup.rebuild()
+    if schema.ships_available():
+        ships_model.rebuild()
+    return {'users': users, 'admin_ids': admin_ids.tolist(), 'ships': n_ships, 'rows': n}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成基准测试用的合成数据')
+    parser.add_argument('--rows', type=int, default=100000, help='观测条数')
+    parser.add_argument('--ships', type=int, default=None, help='船舶数（默认 rows / 2000，至少 10）')
+    parser.add_argument('--users', type=int, default=50, help='用户数')
+    parser.add_argument('--admins', type=int, default=5, help='其中管理员数')
+    parser.add_argument('--start', default='2002-01-01', help='最早的航迹起点日期')
+    parser.add_argument('--days', type=int, default=730, help='航迹起点分布的天数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子（相同参数生成相同数据）')
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='写入的数据库（不存在则创建）')
+    parser.add_argument('--reset', action='store_true', help='写入前清空基准库中的全部表')
+    parser.add_argument('--csv-out', default=None, help='只导出为导入格式的 CSV 到该目录，不写数据库')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    ships = args.ships or max(10, args.rows // 2000)
+    seed = fit_seed()
+    started = time.perf_counter()
+    obs = generate_observations(args.rows, ships, seed, args.start, args.days, rng)
+    print(f'生成 {args.rows} 行，{int(obs["ship"].max())} 艘船，用时 {time.perf_counter() - started:.1f}s')
+
+    if args.csv_out:
+        for path in write_csv(obs, args.csv_out):
+            print(f'已写入 {path}')
+        return
+
+    if args.reset and args.database == Config.MYSQL_DATABASE:
+        print(f'拒绝清空应用数据库 {args.database}，请使用单独的基准库')
+        return
+    use_database(args.database)
+    result = load(obs, args.users, min(args.admins, args.users), rng, reset=args.reset)
+    print(f'完成：数据库 {args.database}，{result["rows"]} 行，{result["ships"]} 艘船，{result["users"]} 个用户')
+
+
+if __name__ == '__main__':
+    main()
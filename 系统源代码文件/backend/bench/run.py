@@ -0,0 +1,317 @@
+"""
+接口吞吐/延迟基准
+
+对每个场景先预热，再按给定并发数发出固定数量的请求，记录延迟分位数、吞吐、响应字节数和错误数，
+结果写成 JSON（含提交号、数据规模、参数），可用 bench.compare 与其他提交的结果对比。
+请求参数由 --seed 决定，同一数据集上重复运行发出的请求序列相同。
+
+默认在进程内用 Flask test client 调用（不需要启动服务，排除网络开销），也可用 --url 压测运行中的服务：
+    cd backend
+    python -m bench.generate --rows 1000000 --reset
+    python -m bench.run [--database vessel_tracking_bench] [--iterations 200] [--concurrency 1,8]
+                        [--scenarios vessel_tracks,list_page] [--out bench/results/xxx.json]
+    python -m bench.run --url http://127.0.0.1:5000 --admin-id 1   # 需与服务设置相同的 AUTH_SECRET_KEY 环境变量
+
+import 场景每次导入一批新的合成观测（时间在 2100 年之后，不与已有数据重复），会使基准库增长。
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from config import Config
+from bench.generate import CSV_HEADER, DEFAULT_DATABASE, csv_records, fit_seed, generate_observations
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+IMPORT_ROWS = 500
+
+
+# ---------- 客户端 ----------
+
+class InProcessClient:
+    """Flask test client；每个线程一个 client"""
+
+    def __init__(self, database):
+        Config.MYSQL_DATABASE = database
+        from app import app
+        self._app = app
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self._app.test_client()
+        return self._local.client
+
+    def request(self, method, path, params=None, headers=None, upload=None):
+        kwargs = {'query_string': params or {}, 'headers': headers or {}}
+        if upload is not None:
+            kwargs['data'] = {'file': (io.BytesIO(upload), 'bench.csv')}
+            kwargs['content_type'] = 'multipart/form-data'
+        resp = self._client().open(path, method=method, **kwargs)
+        body = resp.get_data()
+        return resp.status_code, len(body), body
+
+
+class HttpClient:
+    """对运行中的服务发请求；每个线程一个 Session"""
+
+    def __init__(self, base_url):
+        import requests
+        self._requests = requests
+        self._base = base_url.rstrip('/')
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = self._requests.Session()
+        return self._local.session
+
+    def request(self, method, path, params=None, headers=None, upload=None):
+        files = {'file': ('bench.csv', upload, 'text/csv')} if upload is not None else None
+        resp = self._session().request(method, self._base + path, params=params, headers=headers, files=files, timeout=300)
+        return resp.status_code, len(resp.content), resp.content
+
+
+# ---------- 场景 ----------
+
+def load_context(client, admin_headers, rng):
+    """读取船舶列表和时间范围，作为生成请求参数的依据"""
+    status, _, body = client.request('GET', '/api/data/ships')
+    if status != 200:
+        raise RuntimeError(f'获取船舶列表失败: HTTP {status}')
+    data = json.loads(body)
+    details = [d for d in data.get('details') or [] if d.get('first_seen') and d.get('count')]
+    if not details:
+        raise RuntimeError('基准库没有 Ship 统计，请先运行 python -m bench.generate')
+    seed = fit_seed()
+    return {
+        'ships': [(d['ship_id'], datetime.strptime(d['first_seen'], TIME_FORMAT),
+                   datetime.strptime(d['last_seen'], TIME_FORMAT)) for d in details],
+        'observations': sum(d['count'] for d in details),
+        'time_range': (min(datetime.strptime(d['first_seen'], TIME_FORMAT) for d in details),
+                       max(datetime.strptime(d['last_seen'], TIME_FORMAT) for d in details)),
+        'lat': seed['lat'],
+        'lon': seed['lon'],
+        'seed': seed,
+        'admin_headers': admin_headers,
+        'import_batch': 0,
+    }
+
+
+def _window(rng, lo, hi, days, align_day=False):
+    """[lo, hi] 内随机取一个 days 天的窗口"""
+    span = max(0, int((hi - lo).total_seconds()) - days * 86400)
+    start = lo + timedelta(seconds=int(rng.integers(0, span + 1)))
+    if align_day:
+        start = datetime(start.year, start.month, start.day)
+    return start.strftime(TIME_FORMAT), (start + timedelta(days=days)).strftime(TIME_FORMAT)
+
+
+def _ship(ctx, rng):
+    return ctx['ships'][int(rng.integers(0, len(ctx['ships'])))]
+
+
+def _vessel_tracks(ctx, rng, zoom=None):
+    ship_id, first, last = _ship(ctx, rng)
+    start, end = _window(rng, first, last, 30)
+    params = {'ship_id': ship_id, 'start_time': start, 'end_time': end}
+    if zoom is not None:
+        params['zoom'] = zoom
+    return 'GET', '/api/data/vessel-tracks', params, None, False
+
+
+def _bbox(ctx, rng, size):
+    lat = float(rng.uniform(ctx['lat'][0], ctx['lat'][1] - size))
+    lng = float(rng.uniform(ctx['lon'][0], ctx['lon'][1] - size))
+    return {'min_lat': round(lat, 2), 'max_lat': round(lat + size, 2), 'min_lng': round(lng, 2), 'max_lng': round(lng + size, 2)}
+
+
+def _ocean_environment(ctx, rng):
+    start, end = _window(rng, *ctx['time_range'], 30)
+    return 'GET', '/api/data/ocean-environment', dict(_bbox(ctx, rng, 4.0), start_time=start, end_time=end), None, False
+
+
+def _ocean_grid(ctx, rng):
+    start, end = _window(rng, *ctx['time_range'], 90, align_day=True)
+    return 'GET', '/api/data/ocean-grid', {'resolution': 1.0, 'start_time': start, 'end_time': end}, None, False
+
+
+def _ship_stats(ctx, rng):
+    ship_id, _, _ = _ship(ctx, rng)
+    return 'GET', '/api/data/ship-stats', {'ship_id': ship_id, 'granularity': 'day'}, None, False
+
+
+def _list_page(ctx, rng):
+    return 'GET', '/api/data/list', {'page': int(rng.integers(1, 201)), 'per_page': 50}, None, True
+
+
+def _list_cursor(ctx, rng):
+    return 'GET', '/api/data/list', {'mode': 'cursor', 'per_page': 50}, None, True
+
+
+def _operations(ctx, rng):
+    params = {'page': int(rng.integers(1, 101)), 'per_page': 50}
+    op = rng.choice(['', 'IMPORT', 'UPDATE'])
+    if op:
+        params['operation_type'] = str(op)
+    return 'GET', '/api/record/operations', params, None, True
+
+
+def _record_stats(ctx, rng):
+    return 'GET', '/api/record/stats', {}, None, True
+
+
+def _import(ctx, rng):
+    """一批新的合成观测（2100 年之后，按批次错开），船舶映射到已有 ShipID"""
+    ctx['import_batch'] += 1
+    obs = generate_observations(IMPORT_ROWS, 5, ctx['seed'], '2100-01-01', 1, rng)
+    obs['time'] = obs['time'] + np.timedelta64(ctx['import_batch'] * 365, 'D')
+    ship_ids = [s[0] for s in ctx['ships']]
+    obs['ship'] = np.array([ship_ids[(i * 7919) % len(ship_ids)] for i in obs['ship']])
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_HEADER)
+    writer.writerows(csv_records(obs, 0, len(obs['ship'])))
+    body = buf.getvalue().encode('utf-8')
+    return 'POST', '/api/data/import', {}, body, True
+
+
+SCENARIOS = {
+    'vessel_tracks': _vessel_tracks,
+    'vessel_tracks_zoom': lambda ctx, rng: _vessel_tracks(ctx, rng, zoom=6),
+    'ocean_environment': _ocean_environment,
+    'ocean_grid': _ocean_grid,
+    'ship_stats': _ship_stats,
+    'list_page': _list_page,
+    'list_cursor': _list_cursor,
+    'operations': _operations,
+    'record_stats': _record_stats,
+    'import': _import,
+}
+# import 会写库，单独给较少的迭代次数
+WRITE_SCENARIOS = {'import'}
+
+
+# ---------- 执行 ----------
+
+def _send(client, ctx, spec):
+    method, path, params, upload, admin = spec
+    headers = ctx['admin_headers'] if admin else None
+    started = time.perf_counter()
+    status, nbytes, _ = client.request(method, path, params, headers, upload)
+    return time.perf_counter() - started, status, nbytes
+
+
+def run_scenario(client, ctx, name, iterations, concurrency, warmup, rng):
+    build = SCENARIOS[name]
+    for _ in range(warmup):
+        _send(client, ctx, build(ctx, rng))
+    specs = [build(ctx, rng) for _ in range(iterations)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda spec: _send(client, ctx, spec), specs))
+    wall = time.perf_counter() - started
+
+    latency = np.array([r[0] for r in results]) * 1000
+    errors = [r[1] for r in results if r[1] >= 400]
+    return {
+        'requests': len(results),
+        'errors': len(errors),
+        'error_statuses': sorted(set(errors)),
+        'mean_ms': round(float(latency.mean()), 3),
+        'p50_ms': round(float(np.percentile(latency, 50)), 3),
+        'p90_ms': round(float(np.percentile(latency, 90)), 3),
+        'p95_ms': round(float(np.percentile(latency, 95)), 3),
+        'p99_ms': round(float(np.percentile(latency, 99)), 3),
+        'max_ms': round(float(latency.max()), 3),
+        'throughput_rps': round(len(results) / wall, 2) if wall > 0 else 0,
+        'mean_bytes': int(np.mean([r[2] for r in results])),
+    }
+
+
+def _git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'], stderr=subprocess.DEVNULL) != 0
+        return commit + ('-dirty' if dirty else '')
+    except Exception:
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='接口吞吐/延迟基准')
+    parser.add_argument('--url', default=None, help='压测运行中的服务（默认进程内调用）')
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='进程内模式使用的数据库')
+    parser.add_argument('--admin-id', type=int, default=1, help='管理员接口使用的 UserID（令牌由本地密钥签发）')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='逗号分隔的场景名')
+    parser.add_argument('--iterations', type=int, default=200, help='每个场景、每个并发级别的请求数')
+    parser.add_argument('--write-iterations', type=int, default=10, help='写入场景（import）的请求数')
+    parser.add_argument('--concurrency', default='1,8', help='逗号分隔的并发数')
+    parser.add_argument('--warmup', type=int, default=5, help='每个场景的预热请求数')
+    parser.add_argument('--seed', type=int, default=42, help='请求参数的随机种子')
+    parser.add_argument('--out', default=None, help='结果 JSON 路径（默认 bench/results/<时间>-<提交>.json）')
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.scenarios.split(',') if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        print(f'未知场景: {", ".join(unknown)}；可选: {", ".join(SCENARIOS)}')
+        return
+    levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+
+    from utils.auth import issue_token
+    admin_headers = {'Authorization': 'Bearer ' + issue_token(args.admin_id, 1)}
+    client = HttpClient(args.url) if args.url else InProcessClient(args.database)
+    rng = np.random.default_rng(args.seed)
+    ctx = load_context(client, admin_headers, rng)
+
+    commit = _git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.now().strftime(TIME_FORMAT),
+            'mode': 'http' if args.url else 'in-process',
+            'target': args.url or args.database,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'ships': len(ctx['ships']),
+            'observations': ctx['observations'],
+            'iterations': args.iterations,
+            'write_iterations': args.write_iterations,
+            'concurrency': levels,
+            'warmup': args.warmup,
+            'seed': args.seed,
+        },
+        'results': {},
+    }
+    for name in names:
+        iterations = args.write_iterations if name in WRITE_SCENARIOS else args.iterations
+        report['results'][name] = {}
+        for c in levels:
+            # 每个场景、并发级别使用独立的随机序列，增删场景不影响其他场景的请求
+            scenario_rng = np.random.default_rng([args.seed, list(SCENARIOS).index(name), c])
+            r = run_scenario(client, ctx, name, iterations, c, args.warmup, scenario_rng)
+            report['results'][name][f'c{c}'] = r
+            print(f"{name:<20} c={c:<3} p50 {r['p50_ms']:>9.2f}ms  p95 {r['p95_ms']:>9.2f}ms  "
+                  f"{r['throughput_rps']:>8.1f} req/s  错误 {r['errors']}")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'结果已写入 {out}')
+
+
+if __name__ == '__main__':
+    main()
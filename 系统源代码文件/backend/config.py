@@ -1,13 +1,105 @@
-"""
-数据库配置
-"""
-
-class Config:
-    MYSQL_HOST = 'localhost'
-    MYSQL_PORT = 3306
-    MYSQL_USER = 'root'
-    MYSQL_PASSWORD = 'wangxijing218'
-    MYSQL_DATABASE = 'vessel_tracking_system'
-    MYSQL_CHARSET = 'utf8mb4'
-    MYSQL_AUTOCOMMIT = False
-    
\ No newline at end of file
+"""
+数据库配置
+"""
+import os
+
+class Config:
+    MYSQL_HOST = 'localhost'
+    MYSQL_PORT = 3306
+    MYSQL_USER = 'root'
+    MYSQL_PASSWORD = 'wangxijing218'
+    MYSQL_DATABASE = 'vessel_tracking_system'
+    MYSQL_CHARSET = 'utf8mb4'
+    MYSQL_AUTOCOMMIT = False
+
+    # 连接池
+    MYSQL_POOL_SIZE = 10            # 最大连接数
+    MYSQL_POOL_TIMEOUT = 5          # 连接耗尽时最长等待秒数
+    MYSQL_POOL_PING_INTERVAL = 30   # 连接空闲超过该秒数，借出前先 ping
+
+    # CSV 导入
+    IMPORT_CHUNK_SIZE = 1000        # 每批校验/写入的行数
+    IMPORT_COMMIT_PER_CHUNK = False # True 时每批提交一次事务，否则整个文件一个事务
+    IMPORT_USE_LOAD_DATA = False    # True 时使用 LOAD DATA LOCAL INFILE（需服务端 local_infile=ON）
+    IMPORT_ON_DUPLICATE = 'insert'  # 重复观测的默认处理：insert / skip / update（后两者需迁移 v6）
+
+    # 后台导入任务（/api/data/import?mode=job）
+    IMPORT_JOB_WORKERS = 2          # 同时执行的导入任务数（每个占用一个连接池连接）
+    IMPORT_JOB_MAX_ACTIVE = 8       # 排队加运行中的任务上限，超出时返回 429
+    IMPORT_JOB_TTL = 3600           # 结束的任务保留多少秒供查询
+    IMPORT_JOB_SYNC_INTERVAL = 1.0  # 进度写入 Import_Job（迁移 v9）的最短间隔秒数，多进程部署时据此查询和取消
+
+    # 操作记录异步写入
+    AUDIT_BATCH_SIZE = 200          # 攒够该条数即写入
+    AUDIT_FLUSH_INTERVAL = 2        # 最长攒批秒数
+    AUDIT_QUEUE_SIZE = 100000       # 队列上限，超出的事件被丢弃并计数
+    AUDIT_SPILL_FILE = 'logs/audit_spill.jsonl'  # 数据库不可用时的本地溢出文件
+
+    # 登录令牌
+    # 必须通过环境变量 AUTH_SECRET_KEY 设置，所有工作进程和副本使用同一个值（否则令牌随请求落到的进程随机失效）。
+    # 未设置时服务拒绝启动；仅开发调试（python app.py、FLASK_DEBUG=1）和 pytest 下改为每个进程随机生成
+    AUTH_SECRET_KEY = os.environ.get('AUTH_SECRET_KEY', '')
+    AUTH_TOKEN_TTL = 8 * 3600       # 令牌有效期（秒）
+
+    # 分页
+    PAGINATION_COUNT_TTL = 30       # 游标分页可选总数的缓存秒数
+
+    # 流式响应
+    STREAM_FETCH_SIZE = 2000        # 非缓冲游标每次 fetchmany 的行数
+
+    # 轨迹抽稀
+    SIMPLIFY_PIXEL_TOLERANCE = 1.5  # 按 zoom 抽稀时允许的像素误差
+    SIMPLIFY_TEMP_DELTA = 1.0       # 海温变化超过该值（℃）的点强制保留
+    SIMPLIFY_WAVE_DELTA = 0.5       # 浪高/涌浪高度变化超过该值（m）的点强制保留
+
+    # 网格聚合
+    GRID_DEFAULT_RESOLUTION = 0.5   # 默认网格边长（度）
+    GRID_MIN_RESOLUTION = 0.01      # 最小网格边长，限制返回的网格数量
+    GRID_MAX_CELLS = 300000         # 经纬度框按 resolution 划分后可能的网格数上限（默认边长下全球约 26 万格），超出返回 400
+
+    # 环境统计汇总表
+    ROLLUP_ENABLED = True           # 写入时增量维护 Rollup_* 表，并在粒度允许时从汇总表读取
+    ROLLUP_CELL_RESOLUTION = 0.5    # Rollup_CellDay 的网格边长（度），修改后需 python -m models.rollup --rebuild
+
+    # 船舶维表
+    SHIP_ID_MAP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'converted', 'ship_id_map.json')  # 迁移 v5 从该文件回填呼号
+
+    # HTTP 缓存
+    HTTP_CACHE_ENABLED = True       # 写入方（各工作进程、命令行工具）通过版本文件使 ETag 失效，须在同一台机器上
+    DATA_VERSION_FILE = 'logs/data_version'  # 共享的数据版本文件（见 utils/http_cache.py）
+    DEPLOY_ID = os.environ.get('DEPLOY_ID', '')  # 发布标识，参与 ETag 计算；响应格式变化的版本发布时修改，使旧 ETag 失效
+    HTTP_CACHE_MAX_AGE = 0          # 读接口 Cache-Control max-age（秒）；0 表示每次用 ETag 重新验证
+
+    # 慢查询日志（GET /api/db/slow-queries 查看汇总）
+    SLOW_QUERY_ENABLED = os.environ.get('SLOW_QUERY_ENABLED', '0') == '1'  # 为连接池游标计时（排查时开启）
+    SLOW_QUERY_THRESHOLD_MS = 500   # 超过该耗时（毫秒，含取结果）的语句写入慢查询日志
+    SLOW_QUERY_EXPLAIN = True       # 对慢的 SELECT/UPDATE/DELETE 在另一条连接上执行 EXPLAIN
+    SLOW_QUERY_LOG_FILE = 'logs/slow_query.log'  # JSON Lines，按大小轮转
+    SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS = 5
+    SLOW_QUERY_QUEUE_SIZE = 1000    # 待处理慢查询队列上限，超出的丢弃并计数
+
+    # 指标（GET /metrics，Prometheus 文本格式）
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'  # 关闭时不注册钩子、不包装游标
+
+    # 只读分析引擎（轨迹、区域环境、网格/单船统计等读接口）
+    READ_ENGINE = os.environ.get('READ_ENGINE', 'mysql')  # mysql / sqlite / duckdb；后两者查询 python -m models.snapshot 生成的只读快照
+    READ_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'snapshot')
+    READ_SNAPSHOT_REFRESH = 0       # >0 时 API 进程每隔该秒数从 MySQL 重建快照；0 表示由外部定时任务刷新
+
+    # 冷数据归档（python -m models.archive；需迁移 v7 和 pyarrow）
+    ARCHIVE_ENABLED = True          # 轨迹/区域环境查询的时间范围落入归档时合并 Parquet 分区
+    ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'archive')
+    ARCHIVE_HORIZON_DAYS = 365      # 早于该天数的观测会被归档（可用 --before 指定截止时间）
+    ARCHIVE_SHIP_BUCKETS = 16       # 每个年/月分区再按 ShipID % N 分桶，单船查询只读一个桶
+
+    # 最近船舶查询（GET /api/data/nearby，进程内时空索引，见 models/nearby_index.py）
+    NEARBY_ENABLED = os.environ.get('NEARBY_ENABLED', '0') == '1'  # API 进程启动时在后台从 Data_u 建立索引（每个进程一份完整副本）
+    NEARBY_CELL_DEG = 0.5           # 网格边长（度）
+    NEARBY_SLICE_HOURS = 6          # 时间片长度（小时）
+    NEARBY_DELTA_MAX = 20000        # 增量区 + 失效行超过该数量时合并进主数组
+    NEARBY_REBUILD_INTERVAL = 600   # 每隔该秒数重建，纳入其他进程（命令行导入、归档、去重）的写入；0 表示不重建
+    NEARBY_MAX_WINDOW_HOURS = 24 * 30   # 单次查询的时间窗上限
+    NEARBY_MAX_RADIUS_KM = 2000     # 半径上限
+    NEARBY_MAX_K = 200              # k 近邻的 k 上限
+    NEARBY_MAX_RESULTS = 1000       # 半径查询返回的最大条数
@@ -0,0 +1,312 @@
+"""
+冷数据归档：把早于截止时间的 Data_u 观测移到按 年/月/船舶桶 分区的 Parquet 文件
+
+    cd backend
+    python -m models.schema                                  # 迁移 v7/v8：分区目录表 Archive_Partition 及归档关联列
+    python -m models.archive [--before 2004-01-01] [--dry-run]
+    python -m models.archive --list
+
+- 文件布局：Config.ARCHIVE_DIR/year=YYYY/month=MM/bucket=KK/part-<批次>.parquet，KK = ShipID % ARCHIVE_SHIP_BUCKETS，
+  文件内按 (ShipID, DateTime_u) 排序；同一分区多次归档（截止时间落在月中）各写一个文件
+- 按月处理，每月一个事务：锁定并读出该月待归档的行，写 Parquet 文件，登记分区目录，删除 Data_u 中的行，
+  重算受影响的汇总表桶和船舶统计后提交；失败时回滚并删除已写出的文件。读接口只读取目录中登记的文件，
+  因此不会看到写了一半的归档，也不会重复或遗漏
+- /vessel-tracks 和 /ocean-environment 的时间范围落入归档时，按目录中的时间/经纬度范围和船舶桶剪枝，
+  读取剩余文件（行组统计再过滤）并与 MySQL 中的热数据合并（见 archived_rows()）
+- 归档后汇总表和网格/单船统计只覆盖 Data_u 中的热数据；Ship 另行累计已归档观测的数量和时间范围，
+  全部归档的船舶仍出现在 /ships 中。指向归档行的 Record.DataID 被外键置空，
+  原值保存在 Record.ArchivedDataID（迁移 v8），归档文件中保留 DataID
+- 每月提交后更新共享的数据版本（utils/http_cache.py），运行中的服务的 ETag 随之失效
+"""
+import argparse
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from config import Config
+from models.database import get_db_connection
+from models.schema import archive_available, archive_links_available
+from models import rollup, ships
+from utils.http_cache import bump_data_version
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+COLUMNS = ('DataID', 'ShipID', 'DateTime_u', 'Lat', 'Long_u', 'SeaTemp', 'WaveHeight', 'WavePeriod',
+           'SurgeDirection', 'SurgeHeight')
+_DELETE_BATCH = 1000
+_COMPRESSION = 'zstd'
+_ROW_GROUP_SIZE = 64 * 1024
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("读写归档需要安装 pyarrow（pip install pyarrow）")
+
+
+def _schema():
+    return pa.schema([
+        ('DataID', pa.int32()),
+        ('ShipID', pa.int32()),
+        ('DateTime_u', pa.timestamp('s')),
+        ('Lat', pa.float64()),
+        ('Long_u', pa.float64()),
+        ('SeaTemp', pa.float64()),
+        ('WaveHeight', pa.float64()),
+        ('WavePeriod', pa.float64()),
+        ('SurgeDirection', pa.string()),
+        ('SurgeHeight', pa.float64()),
+    ])
+
+
+def _plain(v):
+    return float(v) if isinstance(v, Decimal) else v
+
+
+def _write_parquet(path, rows):
+    """rows 为按 COLUMNS 顺序的元组列表；先写临时文件再改名"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    columns = list(zip(*rows))
+    table = pa.Table.from_arrays(
+        [pa.array([_plain(v) for v in col], type=field.type) for col, field in zip(columns, _schema())],
+        schema=_schema()
+    )
+    tmp = path + '.tmp'
+    pq.write_table(table, tmp, compression=_COMPRESSION, row_group_size=_ROW_GROUP_SIZE)
+    os.replace(tmp, path)
+
+
+def _month_start(t):
+    return datetime(t.year, t.month, 1)
+
+
+def _next_month(t):
+    return datetime(t.year + (t.month == 12), t.month % 12 + 1, 1)
+
+
+def archive_month(conn, start, end, run_id, buckets):
+    """
+    归档 [start, end) 内的观测（同一年月），返回归档的行数；在一个事务中完成，失败回滚并删除已写文件
+    """
+    cur = conn.cursor()
+    written = []
+    try:
+        cur.execute(f"""
+            SELECT {', '.join(COLUMNS)} FROM Data_u
+            WHERE DateTime_u >= %s AND DateTime_u < %s
+            ORDER BY ShipID, DateTime_u
+            FOR UPDATE
+        """, (start, end))
+        rows = cur.fetchall()
+        if not rows:
+            conn.rollback()
+            return 0
+        keys = rollup.collect_keys(conn, 'DateTime_u >= %s AND DateTime_u < %s', (start, end)) if rollup.enabled(recheck=True) else None
+
+        by_bucket = defaultdict(list)
+        for r in rows:
+            by_bucket[r[1] % buckets].append(r)
+        for bucket, part in sorted(by_bucket.items()):
+            rel = f'year={start.year:04d}/month={start.month:02d}/bucket={bucket:02d}/part-{run_id}.parquet'
+            path = os.path.join(Config.ARCHIVE_DIR, *rel.split('/'))
+            _write_parquet(path, part)
+            written.append(path)
+            lats = [float(r[3]) for r in part]
+            lngs = [float(r[4]) for r in part]
+            cur.execute("""
+                INSERT INTO Archive_Partition
+                    (Path, PartYear, PartMonth, ShipBucket, BucketCount, RowCount, MinTime, MaxTime, MinLat, MaxLat, MinLng, MaxLng)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (rel, start.year, start.month, bucket, buckets, len(part),
+                  min(r[2] for r in part), max(r[2] for r in part), min(lats), max(lats), min(lngs), max(lngs)))
+
+        # 删除前：已归档观测计入 Ship 的归档统计（该部分无法从 Data_u 重算，失败时整月回滚），
+        # Record 中保存 DataID（外键会把 Record.DataID 置空）
+        ships.observe_archived(conn, 'DateTime_u >= %s AND DateTime_u < %s', (start, end))
+        ids = sorted(r[0] for r in rows)
+        for i in range(0, len(ids), _DELETE_BATCH):
+            part = ids[i:i + _DELETE_BATCH]
+            marks = ', '.join(['%s'] * len(part))
+            cur.execute(f"UPDATE Record SET ArchivedDataID = DataID WHERE DataID IN ({marks})", part)
+            cur.execute(f"DELETE FROM Data_u WHERE DataID IN ({marks})", part)
+        if keys is not None:
+            rollup.refresh_safely(conn, keys)
+        ships.maintain_safely(ships.recount, conn, {r[1] for r in rows})
+        conn.commit()
+        bump_data_version()
+        return len(rows)
+    except Exception:
+        conn.rollback()
+        for path in written:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    finally:
+        cur.close()
+
+
+def archive(before, dry_run=False):
+    """归档早于 before 的全部观测，按月逐个提交；返回 [(年月, 行数)]"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT MIN(DateTime_u) FROM Data_u WHERE DateTime_u < %s", (before,))
+        oldest = cur.fetchone()[0]
+    finally:
+        cur.close()
+    done = []
+    if oldest is None:
+        conn.close()
+        return done
+    run_id = datetime.now().strftime('%Y%m%d%H%M%S')
+    try:
+        month = _month_start(oldest)
+        while month < before:
+            end = min(_next_month(month), before)
+            label = month.strftime('%Y-%m')
+            if dry_run:
+                cur = conn.cursor()
+                try:
+                    cur.execute("SELECT COUNT(*) FROM Data_u WHERE DateTime_u >= %s AND DateTime_u < %s", (month, end))
+                    n = cur.fetchone()[0]
+                finally:
+                    cur.close()
+            else:
+                n = archive_month(conn, month, end, run_id, Config.ARCHIVE_SHIP_BUCKETS)
+            if n:
+                done.append((label, n))
+                print(f"{label}: {'待归档' if dry_run else '已归档'} {n} 行")
+            month = _next_month(month)
+        return done
+    finally:
+        conn.close()
+
+
+# ---------- 查询 ----------
+
+def enabled():
+    return Config.ARCHIVE_ENABLED and archive_available()
+
+
+def partitions(ship_id=None, start=None, end=None, bbox=None):
+    """目录中与条件可能相交的分区，按 MaxTime 从新到旧"""
+    where = ""
+    params = []
+    if start is not None:
+        where += " AND MaxTime >= %s"
+        params.append(start)
+    if end is not None:
+        where += " AND MinTime <= %s"
+        params.append(end)
+    if ship_id:
+        where += " AND ShipBucket = MOD(%s, BucketCount)"
+        params.append(ship_id)
+    if bbox is not None:
+        min_lat, max_lat, min_lng, max_lng = bbox
+        if min_lat is not None and max_lat is not None:
+            where += " AND MaxLat >= %s AND MinLat <= %s"
+            params.extend([min_lat, max_lat])
+        if min_lng is not None and max_lng is not None:
+            where += " AND MaxLng >= %s AND MinLng <= %s"
+            params.extend([min_lng, max_lng])
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(f"""
+            SELECT Path, RowCount, MinTime, MaxTime FROM Archive_Partition
+            WHERE 1=1 {where}
+            ORDER BY MaxTime DESC
+        """, params)
+        return cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _read(rel, filters, columns):
+    path = os.path.join(Config.ARCHIVE_DIR, *rel.split('/'))
+    table = pq.read_table(path, columns=list(columns), filters=filters or None)
+    return table.to_pylist()
+
+
+def archived_rows(columns, ship_id=None, start=None, end=None, bbox=None, newest_limit=None):
+    """
+    读取归档中满足条件的观测（字典行，键为 Data_u 列名，与 MySQL 游标的 dictionary 行一致）。
+    默认按 DateTime_u 升序；newest_limit 时只返回最新的 newest_limit 行（降序），
+    已取够且剩余分区都更旧时不再读取
+    """
+    parts = partitions(ship_id, start, end, bbox)
+    if not parts:
+        return []
+    _require_pyarrow()
+    filters = []
+    if ship_id:
+        filters.append(('ShipID', '=', ship_id))
+    if start is not None:
+        filters.append(('DateTime_u', '>=', start))
+    if end is not None:
+        filters.append(('DateTime_u', '<=', end))
+    if bbox is not None:
+        min_lat, max_lat, min_lng, max_lng = bbox
+        if min_lat is not None and max_lat is not None:
+            filters += [('Lat', '>=', min_lat), ('Lat', '<=', max_lat)]
+        if min_lng is not None and max_lng is not None:
+            filters += [('Long_u', '>=', min_lng), ('Long_u', '<=', max_lng)]
+
+    def by_time(r):
+        return r['DateTime_u']
+
+    rows = []
+    for p in parts:
+        if newest_limit is not None and len(rows) >= newest_limit:
+            rows.sort(key=by_time, reverse=True)
+            del rows[newest_limit:]
+            if p['MaxTime'] < rows[-1]['DateTime_u']:
+                break
+        rows += _read(p['Path'], filters, columns)
+    if newest_limit is not None:
+        rows.sort(key=by_time, reverse=True)
+        return rows[:newest_limit]
+    rows.sort(key=by_time)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把早于截止时间的观测归档为 Parquet')
+    parser.add_argument('--before', default=None,
+                        help=f'截止时间 YYYY-MM-DD（默认当前时间前 {Config.ARCHIVE_HORIZON_DAYS} 天）')
+    parser.add_argument('--dry-run', action='store_true', help='只统计每月待归档的行数')
+    parser.add_argument('--list', action='store_true', help='列出已归档的分区')
+    args = parser.parse_args()
+
+    if not archive_available() or not archive_links_available():
+        print('缺少 Archive_Partition 表或归档关联列，请先运行: python -m models.schema')
+        return
+    if args.list:
+        for p in reversed(partitions()):
+            print(f"{p['Path']}  {p['RowCount']} 行  {p['MinTime']} ~ {p['MaxTime']}")
+        return
+    if args.before:
+        before = datetime.strptime(args.before, '%Y-%m-%d')
+    else:
+        before = datetime.combine((datetime.now() - timedelta(days=Config.ARCHIVE_HORIZON_DAYS)).date(), datetime.min.time())
+    if not args.dry_run:
+        _require_pyarrow()
+
+    started = time.perf_counter()
+    done = archive(before, args.dry_run)
+    total = sum(n for _, n in done)
+    if args.dry_run:
+        print(f'早于 {before:%Y-%m-%d} 的观测共 {total} 行')
+    else:
+        print(f'完成：归档 {total} 行（{len(done)} 个月），用时 {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
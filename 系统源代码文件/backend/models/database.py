@@ -1,23 +1,523 @@
-"""
-数据库连接模块
-"""
-import mysql.connector
-from config import Config
-
-def get_db_connection():
-    """
-    获取数据库连接
-    """
-    try:
-        conn = mysql.connector.connect(
-            host=Config.MYSQL_HOST,
-            user=Config.MYSQL_USER,
-            password=Config.MYSQL_PASSWORD,
-            database=Config.MYSQL_DATABASE,
-            charset='utf8mb4',
-            collation='utf8mb4_unicode_ci'
-        )
-        return conn
-    except mysql.connector.Error as e:
-        print(f"数据库连接错误: {e}")
-        raise
\ No newline at end of file
+"""
+数据库连接模块
+
+维护一个进程内的 MySQL 连接池：
+- get_db_connection() 从池中借出连接，调用方 conn.close() 时归还而不是断开
+- db_connection() 上下文管理器，with 块结束自动归还
+- 借出时对空闲过久的连接做 ping，失效则重连
+- 连接耗尽时最多等待 Config.MYSQL_POOL_TIMEOUT 秒，超时抛出 PoolError
+- get_pool_stats() 返回池的统计信息供监控使用
+- add_cursor_wrapper() 为借出连接创建的游标套上包装（utils/metrics.py 查询计时、utils/slow_query.py 慢查询日志）
+
+只读分析查询（轨迹、区域环境、网格/单船统计）通过 get_read_connection() 获取连接，
+由 Config.READ_ENGINE 选择引擎：
+- mysql（默认）：即连接池连接
+- sqlite / duckdb：进程内查询 models/snapshot.py 生成的只读快照文件，大范围扫描不占用 MySQL、不与写入争用；
+  快照只在刷新时更新。这两种引擎的游标不经过 add_cursor_wrapper 的包装
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+from config import Config
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+def _connect():
+    """建立一条新的物理连接"""
+    try:
+        conn = mysql.connector.connect(
+            host=Config.MYSQL_HOST,
+            port=Config.MYSQL_PORT,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DATABASE,
+            charset=Config.MYSQL_CHARSET,
+            collation='utf8mb4_unicode_ci',
+            autocommit=Config.MYSQL_AUTOCOMMIT,
+            allow_local_infile=Config.IMPORT_USE_LOAD_DATA
+        )
+        return conn
+    except mysql.connector.Error as e:
+        print(f"数据库连接错误: {e}")
+        raise
+
+
+_cursor_wrappers = []
+
+
+def add_cursor_wrapper(wrapper):
+    """wrapper(cursor) -> 包装后的游标；按注册顺序由内向外套用（重复注册忽略）"""
+    if wrapper not in _cursor_wrappers:
+        _cursor_wrappers.append(wrapper)
+
+
+class PooledConnection:
+    """
+    池化连接包装：其余属性/方法透传给底层连接，close() 时归还连接池
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._returned = False
+        self._on_commit = []
+
+    def close(self):
+        if self._returned:
+            return
+        self._returned = True
+        self._on_commit = []
+        self._pool._release(self._raw)
+
+    def on_commit(self, fn):
+        """登记在本事务提交成功后调用的回调；回滚或未提交就归还时丢弃"""
+        self._on_commit.append(fn)
+
+    def commit(self):
+        self._raw.commit()
+        callbacks, self._on_commit = self._on_commit, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print(f"提交后回调失败: {e}")
+
+    def rollback(self):
+        self._on_commit = []
+        self._raw.rollback()
+
+    def cursor(self, *args, **kwargs):
+        cur = self._raw.cursor(*args, **kwargs)
+        for wrapper in _cursor_wrappers:
+            cur = wrapper(cur)
+        return cur
+
+    def plain_cursor(self, *args, **kwargs):
+        """不经过游标包装（监控自身执行的查询使用，避免被重复统计）"""
+        return self._raw.cursor(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name in ('_pool', '_raw', '_returned', '_on_commit'):
+            raise AttributeError(name)
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __del__(self):
+        # 调用方忘记 close 时兜底归还，避免连接泄漏
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    固定上限的连接池。连接按需创建，最多 size 条。
+    """
+
+    def __init__(self, size, timeout, ping_interval):
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._cond = threading.Condition()
+        self._idle = []  # [(raw_conn, last_used_ts)]
+        self._created = 0
+        self._in_use = 0
+        # 统计
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._discarded = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    def get(self):
+        """借出一条连接；耗尽时最多等待 timeout 秒"""
+        start = time.perf_counter()
+        raw, last_used, need_new = None, None, False
+        with self._cond:
+            waited = False
+            deadline = time.monotonic() + self.timeout
+            while True:
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    # 先占位，在锁外建立连接
+                    self._created += 1
+                    need_new = True
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolError(f"连接池已耗尽（{self.size} 条连接均在使用中），等待 {self.timeout} 秒超时")
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                self._cond.wait(remaining)
+            self._in_use += 1
+
+        try:
+            if need_new:
+                raw = _connect()
+            elif time.monotonic() - last_used >= self.ping_interval:
+                raw = self._revive(raw)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self._checkouts += 1
+            self._checkout_time_total += elapsed
+            if elapsed > self._checkout_time_max:
+                self._checkout_time_max = elapsed
+        return PooledConnection(self, raw)
+
+    def _revive(self, raw):
+        """对空闲过久的连接做存活检测，失效则重建"""
+        try:
+            raw.ping(reconnect=False)
+            return raw
+        except Exception:
+            pass
+        with self._cond:
+            self._reconnects += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+        return _connect()
+
+    def _release(self, raw):
+        """归还连接：回滚未提交事务，状态异常的连接直接丢弃"""
+        ok = True
+        try:
+            if not raw.is_connected():
+                ok = False
+            elif raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            ok = False
+        if not ok:
+            try:
+                raw.close()
+            except Exception:
+                pass
+        with self._cond:
+            self._in_use -= 1
+            if ok:
+                self._idle.append((raw, time.monotonic()))
+            else:
+                self._created -= 1
+                self._discarded += 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            avg_ms = (self._checkout_time_total / self._checkouts * 1000) if self._checkouts else 0.0
+            return {
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'reconnects': self._reconnects,
+                'discarded': self._discarded,
+                'checkout_latency_avg_ms': round(avg_ms, 3),
+                'checkout_latency_max_ms': round(self._checkout_time_max * 1000, 3)
+            }
+
+    def close_all(self):
+        """关闭全部空闲连接（进程退出时使用）"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for raw, _ in idle:
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """获取全局连接池（首次调用时创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    size=Config.MYSQL_POOL_SIZE,
+                    timeout=Config.MYSQL_POOL_TIMEOUT,
+                    ping_interval=Config.MYSQL_POOL_PING_INTERVAL
+                )
+    return _pool
+
+
+def get_db_connection():
+    """
+    获取数据库连接（从连接池借出，conn.close() 即归还）
+    """
+    return get_pool().get()
+
+
+@contextmanager
+def db_connection():
+    """
+    借出连接的上下文管理器：
+        with db_connection() as conn:
+            ...
+    """
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+# 锁等待超时 / 死锁：事务（或语句）已被 MySQL 回滚，不能当作附属维护失败吞掉
+LOCK_ERRNOS = (1205, 1213)
+
+
+@contextmanager
+def savepoint(conn, name):
+    """
+    在调用方事务中设置保存点，块内出错时回滚到保存点再抛出原异常：
+        with savepoint(conn, 'rollup_refresh'):
+            ...
+    死锁时整个事务已回滚、保存点不复存在，此时只抛出原异常
+    """
+    cur = conn.plain_cursor()
+    try:
+        cur.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except Exception:
+            try:
+                cur.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            except Exception:
+                pass
+            raise
+        cur.execute(f"RELEASE SAVEPOINT {name}")
+    finally:
+        cur.close()
+
+
+def get_pool_stats():
+    """连接池统计信息"""
+    return get_pool().stats()
+
+
+def close_pool():
+    """关闭连接池中的空闲连接（进程退出时调用）"""
+    if _pool is not None:
+        _pool.close_all()
+
+
+# ---------- 只读分析引擎 ----------
+
+READ_ENGINES = ('mysql', 'sqlite', 'duckdb')
+_SNAPSHOT_SUFFIX = {'sqlite': '.sqlite', 'duckdb': '.duckdb'}
+_DATE_TEXT = re.compile(r'\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?$')
+
+
+def read_engine():
+    """当前的只读分析引擎（Config.READ_ENGINE）"""
+    engine = Config.READ_ENGINE
+    if engine not in READ_ENGINES:
+        raise ValueError(f"READ_ENGINE 必须是 {', '.join(READ_ENGINES)} 之一")
+    if engine == 'duckdb' and duckdb is None:
+        raise RuntimeError("READ_ENGINE=duckdb 需要安装 duckdb（pip install duckdb）")
+    return engine
+
+
+def snapshot_path(engine=None):
+    """只读快照文件路径：Config.READ_SNAPSHOT_DIR/vessel.<sqlite|duckdb>"""
+    engine = engine or read_engine()
+    return os.path.join(Config.READ_SNAPSHOT_DIR, 'vessel' + _SNAPSHOT_SUFFIX[engine])
+
+
+def _from_text(v):
+    """SQLite 没有日期类型，日期以 'YYYY-MM-DD[ HH:MM:SS]' 文本存取，读出时转换为与 MySQL 驱动一致的 datetime/date"""
+    if isinstance(v, str) and _DATE_TEXT.match(v):
+        if len(v) > 10:
+            return datetime.strptime(v, '%Y-%m-%d %H:%M:%S')
+        return datetime.strptime(v, '%Y-%m-%d').date()
+    return v
+
+
+class EmbeddedCursor:
+    """
+    嵌入式引擎游标适配：%s 占位符改为 ?，dictionary=True 时返回字典行，
+    使路由中按 mysql.connector 写法的查询代码不用区分引擎
+    """
+
+    def __init__(self, cursor, dictionary, convert_text):
+        self._cursor = cursor
+        self._dictionary = dictionary
+        self._convert_text = convert_text
+        self._columns = None
+
+    def execute(self, operation, params=None):
+        self._cursor.execute(operation.replace('%s', '?'), tuple(params or ()))
+        desc = self._cursor.description
+        self._columns = [d[0] for d in desc] if desc else None
+
+    def _row(self, row):
+        if row is None:
+            return None
+        if self._convert_text:
+            row = [_from_text(v) for v in row]
+        return dict(zip(self._columns, row)) if self._dictionary else tuple(row)
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size else self._cursor.fetchmany()
+        return [self._row(r) for r in rows]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class EmbeddedConnection:
+    """嵌入式引擎的只读连接，接口与 PooledConnection 的读操作一致"""
+
+    def __init__(self, engine, raw):
+        self.engine = engine
+        self._raw = raw
+
+    def cursor(self, dictionary=False, buffered=None, **kwargs):
+        if self.engine == 'sqlite':
+            return EmbeddedCursor(self._raw.cursor(), dictionary, True)
+        # duckdb 的连接即游标，每个游标独立执行
+        return EmbeddedCursor(self._raw.cursor(), dictionary, False)
+
+    plain_cursor = cursor
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        if self._raw is not None:
+            self._raw.close()
+            self._raw = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class SnapshotEngine:
+    """
+    打开只读快照。SQLite 每次借出新建一条只读连接（开销很小）；
+    DuckDB 在进程内共享一个数据库句柄，每次借出一个独立游标。
+    快照文件被原子替换后（mtime 变化）重新打开
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._duck = None
+        self._duck_key = None
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            raise RuntimeError(f"只读快照 {path} 不存在，请先运行 python -m models.snapshot") from None
+        return (path, st.st_mtime_ns, st.st_size)
+
+    def connect(self, engine):
+        path = snapshot_path(engine)
+        key = self._stat(path)
+        if engine == 'sqlite':
+            raw = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+            return EmbeddedConnection(engine, raw)
+        with self._lock:
+            if self._duck_key != key:
+                # 旧句柄上仍在执行的查询由各自的游标持有引用，不受影响
+                self._duck = duckdb.connect(path, read_only=True)
+                self._duck_key = key
+            raw = self._duck.cursor()
+        return EmbeddedConnection(engine, raw)
+
+    def version(self, engine):
+        try:
+            st = os.stat(snapshot_path(engine))
+        except FileNotFoundError:
+            return '0'
+        return f'{st.st_mtime_ns}.{st.st_size}'
+
+
+_snapshots = SnapshotEngine()
+
+
+def get_read_connection():
+    """
+    只读分析查询使用的连接（conn.close() 归还/关闭）：
+    READ_ENGINE=mysql 时即 get_db_connection()，否则为只读快照上的连接
+    """
+    engine = read_engine()
+    if engine == 'mysql':
+        return get_db_connection()
+    return _snapshots.connect(engine)
+
+
+def read_snapshot_version():
+    """只读快照的版本标识（文件 mtime 和大小），READ_ENGINE=mysql 时为空串；参与 ETag 计算"""
+    engine = read_engine()
+    if engine == 'mysql':
+        return ''
+    return _snapshots.version(engine)
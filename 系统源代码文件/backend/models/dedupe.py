@@ -0,0 +1,116 @@
+"""
+Data_u 重复观测清理
+
+按自然键 (ShipID, DateTime_u, Lat, Long_u) 分组，每组保留 DataID 最小的一行（最早导入），
+指向被删除行的 Record 改为指向保留的行，然后分批删除其余行并逐批提交。
+清理后重建汇总表和 Ship 统计，此后可执行迁移 v6 创建唯一索引：
+    cd backend
+    python -m models.dedupe [--dry-run] [--batch-size 5000]
+    python -m models.schema
+
+每批提交后更新共享的数据版本（utils/http_cache.py），运行中的服务的 ETag 随之失效
+"""
+import argparse
+
+from models.database import get_db_connection
+from models.schema import rollups_available, ships_available
+from models import rollup, ships
+from utils.http_cache import bump_data_version
+
+
+def duplicate_stats(cur):
+    """返回 (重复的组数, 多余的行数)"""
+    cur.execute("""
+        SELECT COUNT(*), COALESCE(SUM(c - 1), 0) FROM (
+            SELECT COUNT(*) AS c FROM Data_u
+            GROUP BY ShipID, DateTime_u, Lat, Long_u HAVING COUNT(*) > 1
+        ) AS d
+    """)
+    groups, extra = cur.fetchone()
+    return int(groups), int(extra)
+
+
+def dedupe(batch_size=5000):
+    """删除重复观测，返回删除的行数"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    removed = 0
+    try:
+        # 被删除行 -> 保留行 的映射（临时表只对本连接可见）
+        cur.execute("DROP TEMPORARY TABLE IF EXISTS dedupe_map")
+        cur.execute("""
+            CREATE TEMPORARY TABLE dedupe_map (
+                DataID INT PRIMARY KEY,
+                KeepID INT NOT NULL
+            ) ENGINE=InnoDB
+        """)
+        cur.execute("""
+            INSERT INTO dedupe_map (DataID, KeepID)
+            SELECT d.DataID, k.KeepID
+            FROM Data_u d
+            JOIN (
+                SELECT ShipID, DateTime_u, Lat, Long_u, MIN(DataID) AS KeepID
+                FROM Data_u GROUP BY ShipID, DateTime_u, Lat, Long_u HAVING COUNT(*) > 1
+            ) AS k USING (ShipID, DateTime_u, Lat, Long_u)
+            WHERE d.DataID <> k.KeepID
+        """)
+        conn.commit()
+
+        last_id = 0
+        while True:
+            cur.execute("SELECT DataID FROM dedupe_map WHERE DataID > %s ORDER BY DataID LIMIT %s", (last_id, batch_size))
+            ids = [row[0] for row in cur.fetchall()]
+            if not ids:
+                break
+            lo, hi = ids[0], ids[-1]
+            cur.execute("""
+                UPDATE Record r JOIN dedupe_map m ON r.DataID = m.DataID
+                SET r.DataID = m.KeepID
+                WHERE m.DataID BETWEEN %s AND %s
+            """, (lo, hi))
+            cur.execute("""
+                DELETE d FROM Data_u d JOIN dedupe_map m ON d.DataID = m.DataID
+                WHERE m.DataID BETWEEN %s AND %s
+            """, (lo, hi))
+            removed += cur.rowcount
+            conn.commit()
+            bump_data_version()
+            last_id = hi
+            print(f'已删除 {removed} 行')
+        cur.execute("DROP TEMPORARY TABLE IF EXISTS dedupe_map")
+        return removed
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='清理 Data_u 中的重复观测')
+    parser.add_argument('--dry-run', action='store_true', help='只统计重复，不删除')
+    parser.add_argument('--batch-size', type=int, default=5000, help='每批（每个事务）删除的行数')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        groups, extra = duplicate_stats(cur)
+    finally:
+        cur.close()
+        conn.close()
+    print(f'重复观测 {groups} 组，多余 {extra} 行')
+    if args.dry_run or not extra:
+        return
+
+    removed = dedupe(max(1, args.batch_size))
+    print(f'完成，共删除 {removed} 行')
+    if rollups_available():
+        rollup.rebuild()
+    if ships_available():
+        print(f'已重算 {ships.rebuild()} 艘船舶的统计')
+
+
+if __name__ == '__main__':
+    main()
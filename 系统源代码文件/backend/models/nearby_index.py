@@ -0,0 +1,382 @@
+"""
+进程内时空索引（GET /api/data/nearby：某点附近、某时间窗内报告过位置的船舶）
+
+- 每条观测按 (时间片, 纬度格, 经度格) 编码为一个整数键，全部观测按键排序存放在 numpy 数组中；
+  时间片长 Config.NEARBY_SLICE_HOURS 小时，网格边长 Config.NEARBY_CELL_DEG 度
+- 半径查询：由时间窗和半径算出需要的 (时间片, 纬度格) 行，每行是一段连续的经度格、即一段连续的键，
+  用 searchsorted 批量定位后只对这些候选点计算球面距离（haversine）
+- k 近邻：从一个网格的半径开始查询，半径内的结果不足 k 个（按船舶去重时为不足 k 艘船）就把半径加倍
+- 写入：写路径用 track(conn, ids) 登记变化的 DataID，事务提交后才进入待处理队列（回滚则丢弃）；
+  后台线程从数据库重新读取这些行，放入增量区并使主数组中的旧版本失效，增量区过大时在锁外合并重排。
+  查询不读库，提交后的写入通常在几毫秒内可见
+- Config.NEARBY_ENABLED（环境变量 NEARBY_ENABLED=1）时 API 进程启动后在后台线程中从 Data_u 建立，
+  完成后打印观测数、用时和内存；建立完成前查询返回 503。每个进程各持有一份完整副本，命令行工具和测试默认不建立。
+  只覆盖本进程可见的写入，其他进程（命令行导入、归档、去重）的写入由 Config.NEARBY_REBUILD_INTERVAL 定时重建补上，
+  在此之前可能返回已被删除的 DataID；不包含已归档到 Parquet 的观测
+"""
+import math
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from config import Config
+from models.database import get_db_connection
+
+EARTH_RADIUS_KM = 6371.0088
+HALF_CIRCUMFERENCE_KM = math.pi * EARTH_RADIUS_KM
+_KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+_FETCH_BATCH = 50000
+_ID_BATCH = 1000
+
+
+def _epoch(values):
+    """datetime 列表 -> int64 秒（按无时区的本地时间编码，与查询参数一致）"""
+    return np.array(values, dtype='datetime64[s]').astype(np.int64)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """(lat1, lon1) 到数组 (lat2, lon2) 的球面距离（公里）"""
+    lat1, lon1 = math.radians(lat1), math.radians(lon1)
+    lat2 = np.radians(lat2.astype(np.float64))
+    lon2 = np.radians(lon2.astype(np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class _Points:
+    """一组观测的列数组"""
+
+    __slots__ = ('data_id', 'ship', 't', 'lat', 'lon')
+
+    def __init__(self, data_id, ship, t, lat, lon):
+        self.data_id = np.asarray(data_id, dtype=np.int32)
+        self.ship = np.asarray(ship, dtype=np.int32)
+        self.t = np.asarray(t, dtype=np.int64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [], [])
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows: [(DataID, ShipID, DateTime_u, Lat, Long_u)]"""
+        if not rows:
+            return cls.empty()
+        ids, ships, times, lats, lons = zip(*rows)
+        return cls(ids, ships, _epoch(times), [float(v) for v in lats], [float(v) for v in lons])
+
+    @classmethod
+    def concat(cls, parts):
+        return cls(*(np.concatenate([getattr(p, k) for p in parts]) for k in cls.__slots__))
+
+    def take(self, idx):
+        return _Points(*(getattr(self, k)[idx] for k in self.__slots__))
+
+    def __len__(self):
+        return len(self.data_id)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, k).nbytes for k in self.__slots__)
+
+
+class NearbyIndex:
+
+    def __init__(self, cell_deg, slice_hours, delta_max):
+        self.cell = float(cell_deg)
+        self.slice_seconds = int(slice_hours * 3600)
+        self.delta_max = delta_max
+        self.ny = int(math.ceil(180 / self.cell)) + 1
+        self.nx = int(math.ceil(360 / self.cell))
+        self._lock = threading.RLock()
+        self._main = None           # 按 _keys 排序的主数组
+        self._keys = None
+        self._dead = np.empty(0, dtype=np.int32)   # 主数组中已失效的 DataID（已排序）
+        self._delta = _Points.empty()
+        self._pending = set()       # 已提交、尚未应用的变化 DataID
+        self._replay = None         # 重建期间应用过的 DataID，重建完成后重新应用
+        self._generation = 0        # 主数组/增量区每次替换时加一，锁外合并据此判断是否过期
+        self.changed = threading.Event()   # 有待应用的写入
+        self.stats = {'ready': False, 'points': 0, 'build_seconds': None, 'memory_bytes': 0, 'built_at': None}
+
+    # ---------- 编码 ----------
+
+    def _key(self, t, lat, lon):
+        s = t // self.slice_seconds
+        cy = np.clip(np.floor((lat.astype(np.float64) + 90) / self.cell), 0, self.ny - 1).astype(np.int64)
+        cx = np.floor((lon.astype(np.float64) + 180) / self.cell).astype(np.int64) % self.nx
+        return (s * self.ny + cy) * self.nx + cx
+
+    # ---------- 建立 ----------
+
+    def _fetch(self, where='', params=()):
+        conn = get_db_connection()
+        cur = conn.plain_cursor(buffered=False)
+        parts = []
+        try:
+            cur.execute(f"SELECT DataID, ShipID, DateTime_u, Lat, Long_u FROM Data_u {where}", params)
+            while True:
+                rows = cur.fetchmany(_FETCH_BATCH)
+                if not rows:
+                    break
+                parts.append(_Points.from_rows(rows))
+        finally:
+            cur.close()
+            conn.close()
+        return _Points.concat(parts) if parts else _Points.empty()
+
+    def _sorted(self, points):
+        keys = self._key(points.t, points.lat, points.lon)
+        order = np.argsort(keys, kind='stable')
+        return points.take(order), keys[order]
+
+    def build(self):
+        """从 Data_u 建立（或重建）索引，完成后原子替换；返回统计信息"""
+        started = time.perf_counter()
+        with self._lock:
+            self._replay = set()
+        try:
+            main, keys = self._sorted(self._fetch())
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            self._main, self._keys = main, keys
+            self._dead = np.empty(0, dtype=np.int32)
+            self._delta = _Points.empty()
+            # 读取期间提交的写入可能不在读到的数据中，重新应用一遍（应用是幂等的）
+            self._pending |= self._replay
+            self._replay = None
+            self._generation += 1
+            self.stats.update(ready=True, points=len(main), build_seconds=round(time.perf_counter() - started, 3),
+                              built_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            self._update_memory()
+            if self._pending:
+                self.changed.set()
+            return dict(self.stats)
+
+    def _update_memory(self):
+        self.stats['memory_bytes'] = int(self._main.nbytes + self._keys.nbytes + self._delta.nbytes + self._dead.nbytes)
+
+    # ---------- 写入 ----------
+
+    def mark_changed(self, data_ids):
+        """登记已提交的新增/修改/删除（由后台线程 apply_pending() 应用）"""
+        with self._lock:
+            self._pending.update(int(i) for i in data_ids)
+        self.changed.set()
+
+    def apply_pending(self):
+        """
+        重新读取变化的行，使主数组中的旧版本失效，新版本放入增量区；返回应用的 DataID 数。
+        读库和合并重排都在锁外进行，查询只在替换数组的瞬间等待
+        """
+        with self._lock:
+            if not self.stats['ready'] or not self._pending:
+                return 0
+            ids = sorted(self._pending)
+            self._pending.clear()
+            if self._replay is not None:
+                self._replay.update(ids)
+        try:
+            fresh = [self._fetch(f"WHERE DataID IN ({', '.join(['%s'] * len(part))})", part)
+                     for part in (ids[i:i + _ID_BATCH] for i in range(0, len(ids), _ID_BATCH))]
+        except Exception:
+            with self._lock:
+                self._pending.update(ids)
+            raise
+        changed = np.array(ids, dtype=np.int32)
+        with self._lock:
+            self._dead = np.union1d(self._dead, changed).astype(np.int32)
+            keep = self._delta.take(~np.isin(self._delta.data_id, changed))
+            self._delta = _Points.concat([keep] + fresh)
+            self._generation += 1
+            merge = len(self._delta) + len(self._dead) > self.delta_max
+            self._update_counts()
+        if merge:
+            self._merge()
+        return len(ids)
+
+    def _merge(self):
+        """把增量区合并进主数组；排序期间有新的写入或重建时放弃，下次再合并"""
+        with self._lock:
+            main, dead, delta, generation = self._main, self._dead, self._delta, self._generation
+        alive = main.take(~np.isin(main.data_id, dead))
+        merged, keys = self._sorted(_Points.concat([alive, delta]))
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._main, self._keys = merged, keys
+            self._dead = np.empty(0, dtype=np.int32)
+            self._delta = _Points.empty()
+            self._generation += 1
+            self._update_counts()
+
+    def _update_counts(self):
+        """调用方持有锁"""
+        self.stats['points'] = len(self._main) - len(self._dead) + len(self._delta)
+        self._update_memory()
+
+    # ---------- 查询 ----------
+
+    def _ranges(self, lat, lon, t0, t1, radius_km):
+        """覆盖 (lat, lon) 半径 radius_km、时间 [t0, t1] 的键区间 [(lo, hi)]（闭区间）"""
+        dlat = radius_km / _KM_PER_DEG
+        lat_lo, lat_hi = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+        cy0 = int(np.clip(math.floor((lat_lo + 90) / self.cell), 0, self.ny - 1))
+        cy1 = int(np.clip(math.floor((lat_hi + 90) / self.cell), 0, self.ny - 1))
+        max_abs_lat = max(abs(lat_lo), abs(lat_hi))
+        if max_abs_lat >= 89.9 or radius_km >= HALF_CIRCUMFERENCE_KM / 2:
+            cx_ranges = [(0, self.nx - 1)]
+        else:
+            dlon = dlat / math.cos(math.radians(max_abs_lat))
+            if dlon >= 180:
+                cx_ranges = [(0, self.nx - 1)]
+            else:
+                cx0 = int(math.floor((lon - dlon + 180) / self.cell)) % self.nx
+                cx1 = int(math.floor((lon + dlon + 180) / self.cell)) % self.nx
+                cx_ranges = [(cx0, cx1)] if cx0 <= cx1 else [(cx0, self.nx - 1), (0, cx1)]
+        slices = np.arange(t0 // self.slice_seconds, t1 // self.slice_seconds + 1, dtype=np.int64)
+        rows = (slices[:, None] * self.ny + np.arange(cy0, cy1 + 1, dtype=np.int64)[None, :]).ravel() * self.nx
+        lo = np.concatenate([rows + a for a, _ in cx_ranges])
+        hi = np.concatenate([rows + b for _, b in cx_ranges])
+        return lo, hi
+
+    def _within(self, lat, lon, t0, t1, radius_km):
+        """半径和时间窗内的观测及其距离"""
+        lo, hi = self._ranges(lat, lon, t0, t1, radius_km)
+        start = np.searchsorted(self._keys, lo, side='left')
+        end = np.searchsorted(self._keys, hi, side='right')
+        lengths = end - start
+        total = int(lengths.sum())
+        if total:
+            offsets = np.repeat(start - np.cumsum(lengths) + lengths, lengths)
+            idx = offsets + np.arange(total)
+            cand = self._main.take(idx)
+            if len(self._dead):
+                cand = cand.take(~np.isin(cand.data_id, self._dead))
+        else:
+            cand = _Points.empty()
+        cand = _Points.concat([cand, self._delta])
+        in_time = (cand.t >= t0) & (cand.t <= t1)
+        cand = cand.take(in_time)
+        dist = haversine_km(lat, lon, cand.lat, cand.lon)
+        near = dist <= radius_km
+        return cand.take(near), dist[near]
+
+    @staticmethod
+    def _nearest_per_ship(points, dist):
+        order = np.argsort(dist, kind='stable')
+        _, first = np.unique(points.ship[order], return_index=True)
+        pick = order[np.sort(first)]
+        return points.take(pick), dist[pick]
+
+    def query(self, lat, lon, start, end, radius_km=None, k=None, per_ship=True, limit=1000):
+        """
+        查询 [start, end]（datetime）内的观测：radius_km 给定时返回半径内的结果（按距离排序，最多 limit 条）；否则返回最近的 k 个。
+        per_ship=True 时每艘船只保留距离最近的一条观测。返回 (结果列表, 实际搜索半径)
+        """
+        t0, t1 = (int(v) for v in _epoch([start, end]))
+        with self._lock:
+            if not self.stats['ready']:
+                return None, None
+            if radius_km is not None:
+                points, dist = self._within(lat, lon, t0, t1, radius_km)
+                if per_ship:
+                    points, dist = self._nearest_per_ship(points, dist)
+                searched = radius_km
+                want = limit
+            else:
+                searched = self.cell * _KM_PER_DEG
+                while True:
+                    points, dist = self._within(lat, lon, t0, t1, searched)
+                    if per_ship:
+                        points, dist = self._nearest_per_ship(points, dist)
+                    if len(points) >= k or searched >= HALF_CIRCUMFERENCE_KM:
+                        break
+                    searched = min(searched * 2, HALF_CIRCUMFERENCE_KM)
+                want = k
+        order = np.argsort(dist, kind='stable')[:want]
+        times = points.t[order].astype('datetime64[s]').astype(datetime)
+        results = [{
+            'ship_id': int(points.ship[i]),
+            'data_id': int(points.data_id[i]),
+            'datetime': times[n].strftime('%Y-%m-%d %H:%M:%S'),
+            'latitude': round(float(points.lat[i]), 6),
+            'longitude': round(float(points.lon[i]), 6),
+            'distance_km': round(float(dist[i]), 3)
+        } for n, i in enumerate(order)]
+        return results, searched
+
+    def get_stats(self):
+        with self._lock:
+            out = dict(self.stats)
+            out.update(pending=len(self._pending), delta=len(self._delta), invalidated=len(self._dead),
+                       cell_deg=self.cell, slice_hours=self.slice_seconds / 3600)
+            return out
+
+
+nearby_index = NearbyIndex(
+    cell_deg=Config.NEARBY_CELL_DEG,
+    slice_hours=Config.NEARBY_SLICE_HOURS,
+    delta_max=Config.NEARBY_DELTA_MAX
+)
+
+_active = False
+_stop = threading.Event()
+
+
+def track(conn, data_ids):
+    """写路径调用：在 conn 的事务提交后把这些 DataID 登记为已变化（索引未在本进程启用时不做任何事）"""
+    if not _active or not data_ids:
+        return
+    ids = list(data_ids)
+    conn.on_commit(lambda: nearby_index.mark_changed(ids))
+
+
+def _run():
+    while True:
+        try:
+            s = nearby_index.build()
+            print(f"最近船舶索引已建立：{s['points']} 条观测，用时 {s['build_seconds']}s，"
+                  f"内存 {s['memory_bytes'] / 1024 / 1024:.1f} MB")
+        except Exception as e:
+            print(f"建立最近船舶索引失败: {e}")
+        if Config.NEARBY_REBUILD_INTERVAL <= 0 or _stop.wait(Config.NEARBY_REBUILD_INTERVAL):
+            return
+
+
+def _apply_loop():
+    """把已提交的写入应用到索引（查询路径不读库）"""
+    while not _stop.is_set():
+        nearby_index.changed.wait()
+        nearby_index.changed.clear()
+        if _stop.is_set():
+            return
+        try:
+            nearby_index.apply_pending()
+        except Exception as e:
+            print(f"更新最近船舶索引失败（稍后重试）: {e}")
+            if _stop.wait(5):
+                return
+            nearby_index.changed.set()
+
+
+def init_nearby_index():
+    """Config.NEARBY_ENABLED 时在后台线程中建立索引（并按 NEARBY_REBUILD_INTERVAL 定时重建）、应用写入"""
+    global _active
+    if not Config.NEARBY_ENABLED or _active:
+        return
+    _active = True
+    threading.Thread(target=_run, name='nearby-index', daemon=True).start()
+    threading.Thread(target=_apply_loop, name='nearby-index-apply', daemon=True).start()
+
+
+def shutdown_nearby_index():
+    _stop.set()
+    nearby_index.changed.set()
@@ -0,0 +1,245 @@
+"""
+环境统计汇总表（Rollup_ShipHour / Rollup_ShipDay / Rollup_CellDay）
+
+- 写入路径（新增/导入/修改/删除）在同一事务中调用 refresh()，
+  只重算受影响的 (船舶, 小时)、(船舶, 天)、(网格, 天) 桶
+- 每个桶保存计数、各指标有效值的个数/和/最小/最大和各涌浪方向计数，
+  因此可以继续向上合并（均值 = 和 / 个数）
+- 回填或修复：
+    cd backend
+    python -m models.rollup --rebuild
+"""
+import argparse
+from datetime import datetime, time, timedelta
+
+from config import Config
+from models.database import get_db_connection, savepoint, LOCK_ERRNOS
+from models.schema import ROLLUP_METRICS, ROLLUP_DIRECTIONS, rollups_available
+from utils.http_cache import bump_data_version
+
+MISSING_VALUE_THRESHOLD = -99  # 源数据用 -99.9 表示缺测
+_BATCH = 200
+
+
+def _cell_res():
+    return repr(float(Config.ROLLUP_CELL_RESOLUTION))
+
+
+def rollup_columns():
+    cols = ['Cnt']
+    for m in ROLLUP_METRICS:
+        cols += [f'{m}N', f'{m}Sum', f'{m}Min', f'{m}Max']
+    cols += [f'Dir{d}' for d in ROLLUP_DIRECTIONS]
+    return cols
+
+
+def _raw_aggregates():
+    """Data_u 原始行聚合为汇总列（顺序与 rollup_columns() 一致），缺测值不参与统计"""
+    parts = ['COUNT(*)']
+    for m in ROLLUP_METRICS:
+        valid = f'CASE WHEN {m} > {MISSING_VALUE_THRESHOLD} THEN {m} END'
+        parts += [f'SUM(CASE WHEN {m} > {MISSING_VALUE_THRESHOLD} THEN 1 ELSE 0 END)',
+                  f'SUM({valid})', f'MIN({valid})', f'MAX({valid})']
+    parts += [f"SUM(CASE WHEN SurgeDirection = '{d}' THEN 1 ELSE 0 END)" for d in ROLLUP_DIRECTIONS]
+    return ', '.join(parts)
+
+
+def merged_aggregates():
+    """对汇总表再次合并，输出 {Metric}_mean/_min/_max、dir_X、cnt 列"""
+    parts = ['SUM(Cnt) AS cnt']
+    for m in ROLLUP_METRICS:
+        parts += [f'SUM({m}Sum) / NULLIF(SUM({m}N), 0) AS {m}_mean', f'MIN({m}Min) AS {m}_min', f'MAX({m}Max) AS {m}_max']
+    parts += [f'SUM(Dir{d}) AS dir_{d}' for d in ROLLUP_DIRECTIONS]
+    return ', '.join(parts)
+
+
+def _tables():
+    r = _cell_res()
+    return {
+        'ship_hour': {
+            'table': 'Rollup_ShipHour',
+            'keys': ['ShipID', 'Bucket'],
+            'key_expr': ['ShipID', 'TIMESTAMP(DATE(DateTime_u), MAKETIME(HOUR(DateTime_u), 0, 0))'],
+            'match': '(ShipID = %s AND Bucket = %s)',
+            'source': '(ShipID = %s AND DateTime_u >= %s AND DateTime_u < %s)',
+            'source_params': lambda k: (k[0], k[1], k[1] + timedelta(hours=1)),
+        },
+        'ship_day': {
+            'table': 'Rollup_ShipDay',
+            'keys': ['ShipID', 'Bucket'],
+            'key_expr': ['ShipID', 'DATE(DateTime_u)'],
+            'match': '(ShipID = %s AND Bucket = %s)',
+            'source': '(ShipID = %s AND DateTime_u >= %s AND DateTime_u < %s)',
+            'source_params': lambda k: (k[0], k[1], k[1] + timedelta(days=1)),
+        },
+        'cell_day': {
+            'table': 'Rollup_CellDay',
+            'keys': ['CellY', 'CellX', 'Bucket'],
+            'key_expr': [f'FLOOR(Lat / {r})', f'FLOOR(Long_u / {r})', 'DATE(DateTime_u)'],
+            'match': '(CellY = %s AND CellX = %s AND Bucket = %s)',
+            'source': f'(DateTime_u >= %s AND DateTime_u < %s AND FLOOR(Lat / {r}) = %s AND FLOOR(Long_u / {r}) = %s)',
+            'source_params': lambda k: (k[2], k[2] + timedelta(days=1), k[0], k[1]),
+        },
+    }
+
+
+def enabled(recheck=False):
+    """recheck=True 用于写路径，见 models.schema._capability"""
+    return Config.ROLLUP_ENABLED and rollups_available(recheck)
+
+
+def empty_keys():
+    return {'ship_hour': set(), 'ship_day': set(), 'cell_day': set()}
+
+
+def merge_keys(a, b):
+    for kind in a:
+        a[kind] |= b[kind]
+    return a
+
+
+def collect_keys(conn, where, params):
+    """找出满足条件的 Data_u 行所属的全部桶"""
+    r = _cell_res()
+    keys = empty_keys()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT DISTINCT ShipID, DATE(DateTime_u), HOUR(DateTime_u), FLOOR(Lat / {r}), FLOOR(Long_u / {r})
+            FROM Data_u WHERE {where}
+        """, params)
+        for ship, day, hour, cy, cx in cur.fetchall():
+            if isinstance(day, datetime):
+                day = day.date()
+            day_start = datetime.combine(day, time())
+            keys['ship_hour'].add((ship, day_start + timedelta(hours=int(hour))))
+            keys['ship_day'].add((ship, day_start))
+            keys['cell_day'].add((int(cy), int(cx), day_start))
+    finally:
+        cur.close()
+    return keys
+
+
+def keys_for_ids(conn, ids):
+    """按 DataID 收集桶；连续区间用 BETWEEN，否则分批 IN"""
+    ids = sorted(int(i) for i in ids)
+    if not ids:
+        return empty_keys()
+    if ids[-1] - ids[0] + 1 == len(ids):
+        return collect_keys(conn, 'DataID BETWEEN %s AND %s', (ids[0], ids[-1]))
+    keys = empty_keys()
+    for i in range(0, len(ids), _BATCH):
+        part = ids[i:i + _BATCH]
+        merge_keys(keys, collect_keys(conn, f"DataID IN ({', '.join(['%s'] * len(part))})", tuple(part)))
+    return keys
+
+
+def refresh(conn, keys):
+    """按 Data_u 当前内容重算给定的桶（不提交，由调用方控制事务）"""
+    cols = ', '.join(rollup_columns())
+    aggs = _raw_aggregates()
+    cur = conn.cursor()
+    try:
+        for kind, spec in _tables().items():
+            key_list = sorted(keys.get(kind, ()))
+            for i in range(0, len(key_list), _BATCH):
+                part = key_list[i:i + _BATCH]
+                match_params = [v for k in part for v in k]
+                cur.execute(f"DELETE FROM {spec['table']} WHERE " + ' OR '.join([spec['match']] * len(part)), match_params)
+                source_params = [v for k in part for v in spec['source_params'](k)]
+                group = ', '.join(spec['key_expr'])
+                cur.execute(f"""
+                    INSERT INTO {spec['table']} ({', '.join(spec['keys'])}, {cols})
+                    SELECT {group}, {aggs}
+                    FROM Data_u
+                    WHERE {' OR '.join([spec['source']] * len(part))}
+                    GROUP BY {group}
+                """, source_params)
+    finally:
+        cur.close()
+
+
+def refresh_safely(conn, keys):
+    """
+    写入路径调用：汇总表维护失败时回滚到保存点（不留下删了旧桶、没插入新桶的半截结果），
+    不影响主操作，打印提示后可用 --rebuild 修复；死锁/锁等待超时时主操作也已失效，原样抛出
+    """
+    if not keys or not any(keys.values()):
+        return
+    try:
+        with savepoint(conn, 'rollup_refresh'):
+            refresh(conn, keys)
+    except Exception as e:
+        if getattr(e, 'errno', None) in LOCK_ERRNOS:
+            raise
+        print(f"更新汇总表失败（可运行 python -m models.rollup --rebuild 修复）: {e}")
+
+
+def rebuild(since=None):
+    """
+    重建全部汇总表；since 为日期时只重建该日期之后的部分。
+    按月分段插入，每段单独提交，避免长事务。
+    """
+    cols = ', '.join(rollup_columns())
+    aggs = _raw_aggregates()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT MIN(DateTime_u), MAX(DateTime_u) FROM Data_u")
+        lo, hi = cur.fetchone()
+        if lo is None:
+            print('Data_u 为空，无需重建')
+            return 0
+        if since is not None:
+            lo = max(lo, datetime.combine(since, time()))
+        lo = datetime(lo.year, lo.month, 1)
+        for spec in _tables().values():
+            if since is None:
+                cur.execute(f"DELETE FROM {spec['table']}")
+            else:
+                cur.execute(f"DELETE FROM {spec['table']} WHERE Bucket >= %s", (lo,))
+        conn.commit()
+
+        months = 0
+        start = lo
+        while start <= hi:
+            end = datetime(start.year + (start.month == 12), start.month % 12 + 1, 1)
+            for spec in _tables().values():
+                group = ', '.join(spec['key_expr'])
+                cur.execute(f"""
+                    INSERT INTO {spec['table']} ({', '.join(spec['keys'])}, {cols})
+                    SELECT {group}, {aggs}
+                    FROM Data_u
+                    WHERE DateTime_u >= %s AND DateTime_u < %s
+                    GROUP BY {group}
+                """, (start, end))
+            conn.commit()
+            months += 1
+            print(f'已重建 {start:%Y-%m}')
+            start = end
+        bump_data_version()
+        return months
+    finally:
+        cur.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='环境统计汇总表维护')
+    parser.add_argument('--rebuild', action='store_true', help='从 Data_u 重建汇总表')
+    parser.add_argument('--since', help='只重建该日期（YYYY-MM-DD）之后的数据')
+    args = parser.parse_args()
+
+    if not rollups_available():
+        print('汇总表不存在，请先运行: python -m models.schema')
+        return
+    if args.rebuild:
+        since = datetime.strptime(args.since, '%Y-%m-%d').date() if args.since else None
+        months = rebuild(since)
+        print(f'完成，共 {months} 个月')
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+"""
+数据库表结构与索引管理
+
+按版本号顺序执行迁移，已执行的版本记录在 schema_version 表中：
+    cd backend
+    python -m models.schema            # 升级到最新版本
+    python -m models.schema --status   # 查看当前版本
+
+每个迁移都是可重复执行的（先检查表/列/索引是否已存在），
+因此也可以用于已经手工建好表的旧库。
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from config import Config
+from models.database import get_db_connection
+
+
+# ---------- 辅助函数 ----------
+
+def _table_exists(cur, table):
+    cur.execute("SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,))
+    return cur.fetchone()[0] > 0
+
+
+def _column_exists(cur, table, column):
+    cur.execute("SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+                (table, column))
+    return cur.fetchone()[0] > 0
+
+
+def _index_exists(cur, table, index):
+    cur.execute("SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+                (table, index))
+    return cur.fetchone()[0] > 0
+
+
+def _create_index(cur, table, index, ddl):
+    if not _index_exists(cur, table, index):
+        cur.execute(ddl)
+
+
+# ---------- 迁移 ----------
+
+def _v1_base_tables(cur):
+    """User_u / Data_u / Record 基础表"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS User_u (
+            UserID INT AUTO_INCREMENT PRIMARY KEY,
+            Email VARCHAR(255) NOT NULL UNIQUE,
+            Password_u VARCHAR(255) NOT NULL,
+            Name_u VARCHAR(100),
+            Role_u TINYINT NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Data_u (
+            DataID INT AUTO_INCREMENT PRIMARY KEY,
+            ShipID INT NOT NULL,
+            DateTime_u DATETIME NOT NULL,
+            Lat DECIMAL(9,6) NOT NULL,
+            Long_u DECIMAL(9,6) NOT NULL,
+            SeaTemp DECIMAL(6,2),
+            WaveHeight DECIMAL(6,2),
+            WavePeriod DECIMAL(6,2),
+            SurgeDirection CHAR(1),
+            SurgeHeight DECIMAL(6,2)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Record (
+            RecordID INT AUTO_INCREMENT PRIMARY KEY,
+            OprateType VARCHAR(20) NOT NULL,
+            DateTime_u DATETIME NOT NULL,
+            UserID INT NULL,
+            DataID INT NULL,
+            CONSTRAINT fk_record_user FOREIGN KEY (UserID) REFERENCES User_u (UserID) ON DELETE SET NULL,
+            CONSTRAINT fk_record_data FOREIGN KEY (DataID) REFERENCES Data_u (DataID) ON DELETE SET NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def _v2_query_indexes(cur):
+    """按船舶+时间范围、按时间排序、按操作时间/用户筛选的索引"""
+    _create_index(cur, 'Data_u', 'idx_data_ship_time', "CREATE INDEX idx_data_ship_time ON Data_u (ShipID, DateTime_u)")
+    _create_index(cur, 'Data_u', 'idx_data_time', "CREATE INDEX idx_data_time ON Data_u (DateTime_u)")
+    _create_index(cur, 'Record', 'idx_record_time_user', "CREATE INDEX idx_record_time_user ON Record (DateTime_u, UserID)")
+
+
+def _v3_spatial_index(cur):
+    """由 (Long_u, Lat) 生成的 POINT 列及空间索引，供经纬度框查询使用"""
+    if not _column_exists(cur, 'Data_u', 'Geo'):
+        cur.execute("""
+            ALTER TABLE Data_u
+            ADD COLUMN Geo POINT SRID 0 GENERATED ALWAYS AS (POINT(Long_u, Lat)) STORED NOT NULL
+        """)
+    _create_index(cur, 'Data_u', 'idx_data_geo', "CREATE SPATIAL INDEX idx_data_geo ON Data_u (Geo)")
+
+
+# 汇总表统计的指标列与涌浪方向
+ROLLUP_METRICS = ('SeaTemp', 'WaveHeight', 'WavePeriod', 'SurgeHeight')
+ROLLUP_DIRECTIONS = ('E', 'S', 'W', 'N')
+
+
+def _rollup_columns():
+    """汇总表公共的统计列：总数、各指标的有效值个数/和/最小/最大、各涌浪方向计数"""
+    cols = ["Cnt INT NOT NULL"]
+    for m in ROLLUP_METRICS:
+        cols += [f"{m}N INT NOT NULL", f"{m}Sum DOUBLE", f"{m}Min DOUBLE", f"{m}Max DOUBLE"]
+    cols += [f"Dir{d} INT NOT NULL" for d in ROLLUP_DIRECTIONS]
+    return ',\n            '.join(cols)
+
+
+def _v4_rollup_tables(cur):
+    """按船舶-小时、船舶-天、网格-天的汇总表（由 models/rollup.py 增量维护）"""
+    cols = _rollup_columns()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS Rollup_ShipHour (
+            ShipID INT NOT NULL,
+            Bucket DATETIME NOT NULL,
+            {cols},
+            PRIMARY KEY (ShipID, Bucket)
+        ) ENGINE=InnoDB
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS Rollup_ShipDay (
+            ShipID INT NOT NULL,
+            Bucket DATE NOT NULL,
+            {cols},
+            PRIMARY KEY (ShipID, Bucket)
+        ) ENGINE=InnoDB
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS Rollup_CellDay (
+            CellY INT NOT NULL,
+            CellX INT NOT NULL,
+            Bucket DATE NOT NULL,
+            {cols},
+            PRIMARY KEY (CellY, CellX, Bucket),
+            KEY idx_rollup_cell_day (Bucket)
+        ) ENGINE=InnoDB
+    """)
+
+
+def _v5_ship_table(cur):
+    """船舶维表：ShipID、呼号、首末观测时间、观测数；按现有 Data_u 和 ship_id_map.json 回填"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Ship (
+            ShipID INT AUTO_INCREMENT PRIMARY KEY,
+            CallSign VARCHAR(64) NULL,
+            FirstSeen DATETIME NULL,
+            LastSeen DATETIME NULL,
+            ObsCount INT NOT NULL DEFAULT 0,
+            UNIQUE KEY uk_ship_call_sign (CallSign)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    # 转换脚本此前分配的 呼号 -> ShipID 映射
+    if os.path.exists(Config.SHIP_ID_MAP_FILE):
+        with open(Config.SHIP_ID_MAP_FILE, 'r', encoding='utf-8') as mf:
+            ship_map = json.load(mf)
+        cur.executemany(
+            "INSERT INTO Ship (ShipID, CallSign) VALUES (%s, %s) ON DUPLICATE KEY UPDATE CallSign = COALESCE(CallSign, VALUES(CallSign))",
+            [(int(v), str(k)) for k, v in ship_map.items()]
+        )
+    cur.execute("""
+        INSERT INTO Ship (ShipID, FirstSeen, LastSeen, ObsCount)
+        SELECT * FROM (
+            SELECT ShipID AS sid, MIN(DateTime_u) AS f, MAX(DateTime_u) AS l, COUNT(*) AS c
+            FROM Data_u GROUP BY ShipID
+        ) AS s
+        ON DUPLICATE KEY UPDATE FirstSeen = s.f, LastSeen = s.l, ObsCount = s.c
+    """)
+
+
+def _v6_natural_key(cur):
+    """Data_u 自然键 (ShipID, DateTime_u, Lat, Long_u) 唯一索引，供去重导入使用"""
+    if _index_exists(cur, 'Data_u', 'uk_data_natural'):
+        return
+    cur.execute("""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM Data_u GROUP BY ShipID, DateTime_u, Lat, Long_u HAVING COUNT(*) > 1
+        ) AS d
+    """)
+    groups = cur.fetchone()[0]
+    if groups:
+        raise RuntimeError(f'Data_u 中有 {groups} 组重复观测，无法创建唯一索引，请先运行: python -m models.dedupe')
+    cur.execute("CREATE UNIQUE INDEX uk_data_natural ON Data_u (ShipID, DateTime_u, Lat, Long_u)")
+
+
+def _v7_archive_catalog(cur):
+    """冷数据归档的分区目录：每个 Parquet 文件一行，记录时间和经纬度范围供查询剪枝（models/archive.py）"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Archive_Partition (
+            PartitionID INT AUTO_INCREMENT PRIMARY KEY,
+            Path VARCHAR(255) NOT NULL,
+            PartYear SMALLINT NOT NULL,
+            PartMonth TINYINT NOT NULL,
+            ShipBucket SMALLINT NOT NULL,
+            BucketCount SMALLINT NOT NULL,
+            RowCount INT NOT NULL,
+            MinTime DATETIME NOT NULL,
+            MaxTime DATETIME NOT NULL,
+            MinLat DECIMAL(9,6) NOT NULL,
+            MaxLat DECIMAL(9,6) NOT NULL,
+            MinLng DECIMAL(9,6) NOT NULL,
+            MaxLng DECIMAL(9,6) NOT NULL,
+            CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uk_archive_path (Path),
+            KEY idx_archive_time (MinTime, MaxTime)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def _v8_archive_links(cur):
+    """
+    归档后保留的关联：Ship 记录已归档观测的数量和时间范围（Data_u 中的行全部归档后船舶仍在列表中），
+    Record.ArchivedDataID 保存被归档观测的 DataID（外键 ON DELETE SET NULL 会清空 Record.DataID）
+    """
+    if not _column_exists(cur, 'Ship', 'ArchivedCount'):
+        cur.execute("""
+            ALTER TABLE Ship
+                ADD COLUMN ArchivedFirst DATETIME NULL,
+                ADD COLUMN ArchivedLast DATETIME NULL,
+                ADD COLUMN ArchivedCount INT NOT NULL DEFAULT 0
+        """)
+    if not _column_exists(cur, 'Record', 'ArchivedDataID'):
+        cur.execute("ALTER TABLE Record ADD COLUMN ArchivedDataID INT NULL")
+    _create_index(cur, 'Record', 'idx_record_archived_data', "CREATE INDEX idx_record_archived_data ON Record (ArchivedDataID)")
+
+
+def _v9_import_jobs(cur):
+    """后台导入任务的状态和进度（utils/import_jobs.py），多个工作进程共享查询和取消"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Import_Job (
+            JobID CHAR(32) PRIMARY KEY,
+            Status VARCHAR(16) NOT NULL,
+            Filename VARCHAR(255),
+            UserID INT NULL,
+            CommitPerChunk TINYINT NOT NULL DEFAULT 0,
+            OnDuplicate VARCHAR(16) NOT NULL DEFAULT 'insert',
+            TotalRows INT NOT NULL DEFAULT 0,
+            Imported INT NOT NULL DEFAULT 0,
+            Updated INT NOT NULL DEFAULT 0,
+            Skipped INT NOT NULL DEFAULT 0,
+            FailedCount INT NOT NULL DEFAULT 0,
+            Failed MEDIUMTEXT NULL,
+            Error VARCHAR(1024) NULL,
+            CancelRequested TINYINT NOT NULL DEFAULT 0,
+            CreatedAt DATETIME(3) NOT NULL,
+            StartedAt DATETIME(3) NULL,
+            FinishedAt DATETIME(3) NULL,
+            KEY idx_import_job_created (CreatedAt)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+# (版本号, 说明, 函数)，只能追加，不能修改已发布的版本
+MIGRATIONS = [
+    (1, 'base tables', _v1_base_tables),
+    (2, 'Data_u / Record query indexes', _v2_query_indexes),
+    (3, 'Data_u generated POINT column + SPATIAL index', _v3_spatial_index),
+    (4, 'environment rollup tables', _v4_rollup_tables),
+    (5, 'Ship dimension table', _v5_ship_table),
+    (6, 'Data_u natural key unique index', _v6_natural_key),
+    (7, 'Parquet archive partition catalog', _v7_archive_catalog),
+    (8, 'archived counts on Ship, archived DataID on Record', _v8_archive_links),
+    (9, 'shared import job status table', _v9_import_jobs),
+]
+
+
+def _ensure_version_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            Version INT PRIMARY KEY,
+            Description VARCHAR(255),
+            AppliedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """)
+
+
+def current_version():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        _ensure_version_table(cur)
+        cur.execute("SELECT COALESCE(MAX(Version), 0) FROM schema_version")
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def migrate(target=None):
+    """执行尚未执行的迁移，返回执行过的版本号列表"""
+    applied = []
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        _ensure_version_table(cur)
+        cur.execute("SELECT Version FROM schema_version")
+        done = {row[0] for row in cur.fetchall()}
+        for version, desc, fn in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            print(f'应用迁移 v{version}: {desc}')
+            # DDL 在 MySQL 中会隐式提交，每个版本执行完单独记录
+            fn(cur)
+            cur.execute("INSERT INTO schema_version (Version, Description) VALUES (%s, %s)", (version, desc))
+            conn.commit()
+            applied.append(version)
+    finally:
+        cur.close()
+        conn.close()
+    reset_capabilities()
+    return applied
+
+
+# ---------- 运行时能力检测 ----------
+
+_capabilities = {}  # name -> (是否可用, 检测时间)
+_cap_lock = threading.Lock()
+_NEGATIVE_TTL = 10  # 不可用的结果缓存秒数
+
+
+def _capability(name, check, recheck=False):
+    """
+    执行 check(cur) 并在进程内缓存结果。迁移只会增加表/列/索引，可用的结果一直缓存；
+    不可用的结果只缓存 _NEGATIVE_TTL 秒，服务运行中执行迁移后无需重启即可生效。
+    recheck=True 时不使用缓存的不可用结果：写路径据此决定是否维护汇总表/船舶维表，
+    不能因为过期的检测结果漏掉维护（之后读到迁移回填的旧汇总）。
+    数据库不可用时返回 False 且不缓存
+    """
+    with _cap_lock:
+        cached = _capabilities.get(name)
+    if cached is not None:
+        available, checked_at = cached
+        if available or (not recheck and time.monotonic() - checked_at < _NEGATIVE_TTL):
+            return available
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            available = check(cur)
+        finally:
+            cur.close()
+            conn.close()
+    except Exception:
+        return False
+    with _cap_lock:
+        _capabilities[name] = (available, time.monotonic())
+    return available
+
+
+def spatial_index_available(recheck=False):
+    """Data_u 是否已有 Geo 列及空间索引"""
+    return _capability('spatial', lambda cur: _column_exists(cur, 'Data_u', 'Geo') and _index_exists(cur, 'Data_u', 'idx_data_geo'), recheck)
+
+
+def rollups_available(recheck=False):
+    """汇总表是否已创建"""
+    return _capability('rollup', lambda cur: all(_table_exists(cur, t) for t in ('Rollup_ShipHour', 'Rollup_ShipDay', 'Rollup_CellDay')), recheck)
+
+
+def ships_available(recheck=False):
+    """Ship 维表是否已创建"""
+    return _capability('ship', lambda cur: _table_exists(cur, 'Ship'), recheck)
+
+
+def natural_key_available(recheck=False):
+    """Data_u 是否已有自然键唯一索引"""
+    return _capability('natural_key', lambda cur: _index_exists(cur, 'Data_u', 'uk_data_natural'), recheck)
+
+
+def archive_available(recheck=False):
+    """归档分区目录表是否已创建"""
+    return _capability('archive', lambda cur: _table_exists(cur, 'Archive_Partition'), recheck)
+
+
+def archive_links_available(recheck=False):
+    """Ship / Record 是否已有归档关联列（迁移 v8）"""
+    return _capability('archive_links', lambda cur: _column_exists(cur, 'Record', 'ArchivedDataID'), recheck)
+
+
+def import_jobs_available(recheck=False):
+    """后台导入任务状态表是否已创建（迁移 v9）"""
+    return _capability('import_jobs', lambda cur: _table_exists(cur, 'Import_Job'), recheck)
+
+
+def reset_capabilities():
+    with _cap_lock:
+        _capabilities.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库表结构迁移')
+    parser.add_argument('--status', action='store_true', help='仅显示当前版本')
+    parser.add_argument('--target', type=int, default=None, help='升级到指定版本（默认最新）')
+    args = parser.parse_args()
+
+    if args.status:
+        print(f'当前版本: v{current_version()}，最新版本: v{MIGRATIONS[-1][0]}')
+        return
+    try:
+        applied = migrate(args.target)
+    except RuntimeError as e:
+        print(f'迁移中止: {e}')
+        return
+    if applied:
+        print('已应用: ' + ', '.join(f'v{v}' for v in applied))
+    else:
+        print('已是最新版本')
+
+
+if __name__ == '__main__':
+    main()
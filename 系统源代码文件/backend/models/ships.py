@@ -0,0 +1,252 @@
+"""
+船舶维表 Ship 与呼号 ↔ ShipID 查询
+
+- 呼号分配以 Ship.CallSign 唯一约束为准，转换脚本和导入接口在不同进程中
+  分配同一个呼号时得到同一个 ShipID
+- ship_registry 在进程内缓存已解析的映射（映射分配后不再改变，缓存无需失效）
+- 导入/新增时在同一事务中累加首末观测时间和观测数；删除/修改后按
+  idx_data_ship_time 重算相关船舶
+- 归档（models/archive.py）时已归档观测计入 ArchivedFirst / ArchivedLast / ArchivedCount（迁移 v8），
+  列表中的首末时间和观测数包含归档部分；--rebuild 只按 Data_u 重算热数据部分
+- 修复统计：
+    cd backend
+    python -m models.ships --rebuild
+"""
+import argparse
+import threading
+
+from models.database import get_db_connection, savepoint, LOCK_ERRNOS
+from models.schema import ships_available, archive_links_available
+from utils.http_cache import bump_data_version
+
+_BATCH = 500
+
+
+class ShipRegistry:
+    """呼号 ↔ ShipID 的进程内缓存，未命中时查询或分配 Ship 表中的行"""
+
+    def __init__(self):
+        self._by_sign = {}
+        self._by_id = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, call_sign, ship_id):
+        with self._lock:
+            self._by_sign[call_sign] = ship_id
+            self._by_id[ship_id] = call_sign
+
+    def ship_id(self, call_sign, create=True):
+        """
+        返回呼号对应的 ShipID；create=True 时不存在则分配新的 ShipID。
+        使用独立连接并立即提交，分配结果不随调用方事务回滚。
+        """
+        call_sign = str(call_sign).strip()
+        if not call_sign:
+            return None
+        with self._lock:
+            if call_sign in self._by_sign:
+                return self._by_sign[call_sign]
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            if create:
+                # 已存在时 LAST_INSERT_ID(ShipID) 让 lastrowid 返回已有的 ShipID
+                cur.execute("INSERT INTO Ship (CallSign) VALUES (%s) ON DUPLICATE KEY UPDATE ShipID = LAST_INSERT_ID(ShipID)",
+                            (call_sign,))
+                ship_id = cur.lastrowid
+                conn.commit()
+            else:
+                cur.execute("SELECT ShipID FROM Ship WHERE CallSign = %s", (call_sign,))
+                row = cur.fetchone()
+                ship_id = row[0] if row else None
+        finally:
+            cur.close()
+            conn.close()
+        if ship_id is not None:
+            self._remember(call_sign, ship_id)
+        return ship_id
+
+    def call_sign(self, ship_id):
+        """返回 ShipID 对应的呼号，未登记呼号时返回 None"""
+        ship_id = int(ship_id)
+        with self._lock:
+            if ship_id in self._by_id:
+                return self._by_id[ship_id]
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT CallSign FROM Ship WHERE ShipID = %s", (ship_id,))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+            conn.close()
+        if row and row[0] is not None:
+            self._remember(row[0], ship_id)
+            return row[0]
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._by_sign.clear()
+            self._by_id.clear()
+
+
+ship_registry = ShipRegistry()
+
+
+def _id_filters(ids):
+    """DataID 列表 -> [(where, params)]；连续区间用 BETWEEN，否则分批 IN"""
+    ids = sorted(int(i) for i in ids)
+    if not ids:
+        return []
+    if ids[-1] - ids[0] + 1 == len(ids):
+        return [('DataID BETWEEN %s AND %s', (ids[0], ids[-1]))]
+    out = []
+    for i in range(0, len(ids), _BATCH):
+        part = ids[i:i + _BATCH]
+        out.append((f"DataID IN ({', '.join(['%s'] * len(part))})", tuple(part)))
+    return out
+
+
+def observe_ids(conn, data_ids):
+    """新插入的 Data_u 行计入 Ship 统计（不提交，由调用方控制事务）"""
+    cur = conn.cursor()
+    try:
+        for where, params in _id_filters(data_ids):
+            cur.execute(f"""
+                INSERT INTO Ship (ShipID, FirstSeen, LastSeen, ObsCount)
+                SELECT * FROM (
+                    SELECT ShipID AS sid, MIN(DateTime_u) AS f, MAX(DateTime_u) AS l, COUNT(*) AS c
+                    FROM Data_u WHERE {where} GROUP BY ShipID
+                ) AS s
+                ON DUPLICATE KEY UPDATE
+                    FirstSeen = LEAST(COALESCE(Ship.FirstSeen, s.f), s.f),
+                    LastSeen = GREATEST(COALESCE(Ship.LastSeen, s.l), s.l),
+                    ObsCount = Ship.ObsCount + s.c
+            """, params)
+    finally:
+        cur.close()
+
+
+def recount(conn, ship_ids):
+    """按 Data_u 重算指定船舶的统计（删除、修改后调用；不提交）"""
+    ship_ids = sorted({int(s) for s in ship_ids if s is not None})
+    if not ship_ids:
+        return
+    cur = conn.cursor()
+    try:
+        for i in range(0, len(ship_ids), _BATCH):
+            part = ship_ids[i:i + _BATCH]
+            marks = ', '.join(['%s'] * len(part))
+            cur.execute(f"UPDATE Ship SET FirstSeen = NULL, LastSeen = NULL, ObsCount = 0 WHERE ShipID IN ({marks})", part)
+            cur.execute(f"""
+                INSERT INTO Ship (ShipID, FirstSeen, LastSeen, ObsCount)
+                SELECT * FROM (
+                    SELECT ShipID AS sid, MIN(DateTime_u) AS f, MAX(DateTime_u) AS l, COUNT(*) AS c
+                    FROM Data_u WHERE ShipID IN ({marks}) GROUP BY ShipID
+                ) AS s
+                ON DUPLICATE KEY UPDATE FirstSeen = s.f, LastSeen = s.l, ObsCount = s.c
+            """, part)
+    finally:
+        cur.close()
+
+
+def maintain_safely(fn, conn, arg):
+    """
+    写入路径调用：Ship 统计维护失败时回滚到保存点，不影响主操作，可用 --rebuild 修复；
+    死锁/锁等待超时时主操作也已失效，原样抛出
+    """
+    if not arg:
+        return
+    try:
+        with savepoint(conn, 'ship_stats'):
+            fn(conn, arg)
+    except Exception as e:
+        if getattr(e, 'errno', None) in LOCK_ERRNOS:
+            raise
+        print(f"更新 Ship 统计失败（可运行 python -m models.ships --rebuild 修复）: {e}")
+
+
+def observe_archived(conn, where, params):
+    """把 Data_u 中满足 where 的行计入归档统计（在删除这些行之前、同一事务中调用；不提交）"""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            INSERT INTO Ship (ShipID, ArchivedFirst, ArchivedLast, ArchivedCount)
+            SELECT * FROM (
+                SELECT ShipID AS sid, MIN(DateTime_u) AS f, MAX(DateTime_u) AS l, COUNT(*) AS c
+                FROM Data_u WHERE {where} GROUP BY ShipID
+            ) AS s
+            ON DUPLICATE KEY UPDATE
+                ArchivedFirst = LEAST(COALESCE(Ship.ArchivedFirst, s.f), s.f),
+                ArchivedLast = GREATEST(COALESCE(Ship.ArchivedLast, s.l), s.l),
+                ArchivedCount = Ship.ArchivedCount + s.c
+        """, params)
+    finally:
+        cur.close()
+
+
+def list_ships():
+    """有观测数据（含已归档）的船舶，按 ShipID 排序"""
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    try:
+        if archive_links_available():
+            cur.execute("""
+                SELECT ShipID, CallSign,
+                       COALESCE(LEAST(FirstSeen, ArchivedFirst), FirstSeen, ArchivedFirst) AS FirstSeen,
+                       COALESCE(GREATEST(LastSeen, ArchivedLast), LastSeen, ArchivedLast) AS LastSeen,
+                       ObsCount + ArchivedCount AS ObsCount, ArchivedCount
+                FROM Ship WHERE ObsCount > 0 OR ArchivedCount > 0 ORDER BY ShipID
+            """)
+        else:
+            cur.execute("""
+                SELECT ShipID, CallSign, FirstSeen, LastSeen, ObsCount, 0 AS ArchivedCount
+                FROM Ship WHERE ObsCount > 0 ORDER BY ShipID
+            """)
+        return cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def rebuild():
+    """从 Data_u 重算全部船舶统计，返回有观测的船舶数"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE Ship SET FirstSeen = NULL, LastSeen = NULL, ObsCount = 0")
+        cur.execute("""
+            INSERT INTO Ship (ShipID, FirstSeen, LastSeen, ObsCount)
+            SELECT * FROM (
+                SELECT ShipID AS sid, MIN(DateTime_u) AS f, MAX(DateTime_u) AS l, COUNT(*) AS c
+                FROM Data_u GROUP BY ShipID
+            ) AS s
+            ON DUPLICATE KEY UPDATE FirstSeen = s.f, LastSeen = s.l, ObsCount = s.c
+        """)
+        conn.commit()
+        bump_data_version()
+        cur.execute("SELECT COUNT(*) FROM Ship WHERE ObsCount > 0")
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='船舶维表维护')
+    parser.add_argument('--rebuild', action='store_true', help='从 Data_u 重算首末观测时间和观测数')
+    args = parser.parse_args()
+
+    if not ships_available():
+        print('Ship 表不存在，请先运行: python -m models.schema')
+        return
+    if args.rebuild:
+        print(f'完成，共 {rebuild()} 艘船舶')
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
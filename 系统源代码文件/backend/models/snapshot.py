@@ -0,0 +1,311 @@
+"""
+只读分析快照（Config.READ_ENGINE = 'sqlite' / 'duckdb' 时读接口查询它，见 models/database.py）
+
+把 Data_u 复制到嵌入式数据库文件：默认从 MySQL 读取，--from-csv 时直接从转换后的 CSV 构建（不需要 MySQL 服务器，
+可在本地运行/测试读接口）：
+    cd backend
+    python -m models.snapshot [--engine sqlite|duckdb] [--from-csv ../data/converted] [--path xxx]
+
+先写入临时文件再原子替换，替换前已打开的连接继续读旧文件，不受影响。
+快照只在刷新时更新：Config.READ_SNAPSHOT_REFRESH > 0 时 API 进程在后台按间隔从 MySQL 重建，
+否则由外部定时任务执行本命令；管理员的写入要到下一次刷新后才会出现在读接口中。
+多个工作进程（以及本命令）通过 READ_SNAPSHOT_DIR 下的排他锁文件协调：同一时刻只有一个在重建，
+且快照在半个间隔内已被其他进程刷新过时跳过，每个间隔只导出一次 Data_u。
+"""
+import argparse
+import csv
+import glob
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from config import Config
+from models.database import get_db_connection, snapshot_path, read_engine, duckdb
+from utils.importer import parse_time
+
+COLUMNS = ('DataID', 'ShipID', 'DateTime_u', 'Lat', 'Long_u', 'SeaTemp', 'WaveHeight', 'WavePeriod',
+           'SurgeDirection', 'SurgeHeight')
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+_BATCH = 5000
+
+_SQLITE_DDL = """
+CREATE TABLE Data_u (
+    DataID INTEGER PRIMARY KEY,
+    ShipID INTEGER NOT NULL,
+    DateTime_u TEXT NOT NULL,
+    Lat REAL NOT NULL,
+    Long_u REAL NOT NULL,
+    SeaTemp REAL,
+    WaveHeight REAL,
+    WavePeriod REAL,
+    SurgeDirection TEXT,
+    SurgeHeight REAL
+)
+"""
+_SQLITE_INDEXES = (
+    "CREATE INDEX idx_data_ship_time ON Data_u (ShipID, DateTime_u)",
+    "CREATE INDEX idx_data_time ON Data_u (DateTime_u)",
+    "CREATE INDEX idx_data_lat_lng ON Data_u (Lat, Long_u)",
+)
+_DUCKDB_DDL = """
+CREATE TABLE staging (
+    DataID INTEGER,
+    ShipID INTEGER,
+    DateTime_u TIMESTAMP,
+    Lat DOUBLE,
+    Long_u DOUBLE,
+    SeaTemp DOUBLE,
+    WaveHeight DOUBLE,
+    WavePeriod DOUBLE,
+    SurgeDirection VARCHAR,
+    SurgeHeight DOUBLE
+)
+"""
+
+
+def _plain(v):
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, datetime):
+        return v.strftime(TIME_FORMAT)
+    return v
+
+
+def mysql_batches():
+    """按 DataID 顺序流式读取 MySQL 的 Data_u（非缓冲游标，不经过慢查询计时）"""
+    conn = get_db_connection()
+    cur = conn.plain_cursor(buffered=False)
+    try:
+        cur.execute(f"SELECT {', '.join(COLUMNS)} FROM Data_u ORDER BY DataID")
+        while True:
+            rows = cur.fetchmany(_BATCH)
+            if not rows:
+                break
+            yield [tuple(_plain(v) for v in r) for r in rows]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _csv_float(text):
+    return float(text) if text not in ('', None) else None
+
+
+def csv_batches(data_dir, skipped):
+    """读取导入格式的 CSV（utils/importer.py 的 REQUIRED_FIELDS），DataID 按读取顺序编号；无效行计入 skipped"""
+    data_id = 0
+    batch = []
+    for path in sorted(glob.glob(os.path.join(data_dir, '*.csv'))):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                try:
+                    item = (int(row['ship_id']), parse_time(row['datetime']).strftime(TIME_FORMAT),
+                            float(row['lat']), float(row['long']), _csv_float(row['sea_temp']),
+                            _csv_float(row['wave_height']), _csv_float(row['wave_period']),
+                            row['surge_direction'] or None, _csv_float(row['surge_height']))
+                except (KeyError, TypeError, ValueError):
+                    skipped[0] += 1
+                    continue
+                data_id += 1
+                batch.append((data_id,) + item)
+                if len(batch) >= _BATCH:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def _build_sqlite(path, batches):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(_SQLITE_DDL)
+        insert = f"INSERT INTO Data_u ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        n = 0
+        for rows in batches:
+            conn.executemany(insert, rows)
+            n += len(rows)
+        for ddl in _SQLITE_INDEXES:
+            conn.execute(ddl)
+        conn.execute("ANALYZE")
+        conn.commit()
+        return n
+    finally:
+        conn.close()
+
+
+def _build_duckdb(path, batches):
+    """先写中间 CSV 再 COPY（DuckDB 逐行插入很慢），按 (ShipID, DateTime_u) 排序存储以便按船舶/时间跳过数据块"""
+    if duckdb is None:
+        raise RuntimeError("构建 DuckDB 快照需要安装 duckdb（pip install duckdb）")
+    staging = path + '.csv'
+    n = 0
+    try:
+        with open(staging, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            for rows in batches:
+                writer.writerows(rows)
+                n += len(rows)
+        conn = duckdb.connect(path)
+        try:
+            conn.execute(_DUCKDB_DDL)
+            quoted = staging.replace("'", "''")
+            conn.execute(f"COPY staging FROM '{quoted}' (HEADER false)")
+            conn.execute("CREATE TABLE Data_u AS SELECT * FROM staging ORDER BY ShipID, DateTime_u")
+            conn.execute("DROP TABLE staging")
+            conn.execute("CHECKPOINT")
+        finally:
+            conn.close()
+        return n
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+
+
+def build(engine, batches, path=None):
+    """把 batches（行元组列表的迭代器，列顺序同 COLUMNS）写成快照，返回行数"""
+    path = path or snapshot_path(engine)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        n = (_build_sqlite if engine == 'sqlite' else _build_duckdb)(tmp, batches)
+        os.replace(tmp, path)
+        return n
+    finally:
+        for leftover in (tmp, tmp + '.wal'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def _try_lock(f):
+    """对已打开的锁文件加非阻塞排他锁，被占用时抛出 OSError（关闭文件即释放）"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+@contextmanager
+def refresh_lock(blocking=True):
+    """
+    快照重建的进程间排他锁（READ_SNAPSHOT_DIR/.refresh.lock），进程退出时由系统释放。
+    产出是否拿到锁：blocking=False 且锁被占用时产出 False，否则等到拿到锁为止
+    """
+    os.makedirs(Config.READ_SNAPSHOT_DIR, exist_ok=True)
+    f = open(os.path.join(Config.READ_SNAPSHOT_DIR, '.refresh.lock'), 'a+')
+    try:
+        while True:
+            try:
+                _try_lock(f)
+                break
+            except OSError:
+                if not blocking:
+                    yield False
+                    return
+                time.sleep(1)
+        yield True
+    finally:
+        f.close()
+
+
+def snapshot_age(engine=None):
+    """快照文件距上次重建的秒数，不存在时返回 None"""
+    try:
+        return time.time() - os.path.getmtime(snapshot_path(engine or read_engine()))
+    except OSError:
+        return None
+
+
+def refresh(engine=None):
+    """从 MySQL 重建当前引擎的快照"""
+    return build(engine or read_engine(), mysql_batches())
+
+
+class SnapshotRefresher:
+    """
+    按 Config.READ_SNAPSHOT_REFRESH 间隔在后台从 MySQL 重建快照。
+    每个工作进程都有一个，但只有拿到 refresh_lock 的那个执行重建；
+    快照在半个间隔内刚被其他进程（或命令行）重建过时也跳过
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='snapshot-refresh', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with refresh_lock(blocking=False) as locked:
+                    age = snapshot_age()
+                    if not locked or (age is not None and age < self.interval / 2):
+                        continue
+                    started = time.perf_counter()
+                    n = refresh()
+                    print(f"只读快照已刷新：{n} 行，用时 {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                print(f"刷新只读快照失败: {e}")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_refresher = None
+
+
+def init_snapshot_refresh():
+    """READ_ENGINE 为 sqlite/duckdb 且 READ_SNAPSHOT_REFRESH > 0 时启动后台刷新"""
+    global _refresher
+    if read_engine() != 'mysql' and Config.READ_SNAPSHOT_REFRESH > 0 and _refresher is None:
+        _refresher = SnapshotRefresher(Config.READ_SNAPSHOT_REFRESH)
+        _refresher.start()
+
+
+def shutdown_snapshot_refresh():
+    if _refresher is not None:
+        _refresher.stop()
+
+
+def main():
+    default_engine = Config.READ_ENGINE if Config.READ_ENGINE in ('sqlite', 'duckdb') else 'sqlite'
+    parser = argparse.ArgumentParser(description='生成只读分析快照')
+    parser.add_argument('--engine', choices=('sqlite', 'duckdb'), default=default_engine, help='快照格式')
+    parser.add_argument('--from-csv', default=None, metavar='DIR', help='从导入格式的 CSV 目录构建（不连接 MySQL）')
+    parser.add_argument('--path', default=None, help='快照文件路径（默认 Config.READ_SNAPSHOT_DIR 下）')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    skipped = [0]
+    batches = csv_batches(args.from_csv, skipped) if args.from_csv else mysql_batches()
+    path = args.path or snapshot_path(args.engine)
+    # 与 API 进程的后台刷新互斥
+    with refresh_lock():
+        n = build(args.engine, batches, path)
+    print(f"快照已写入 {path}：{n} 行，用时 {time.perf_counter() - started:.1f}s")
+    if skipped[0]:
+        print(f"跳过无效行 {skipped[0]} 行")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,537 +1,1121 @@
-"""
-data_u路由/API接口
-"""
-from flask import Blueprint, request, jsonify
-from models.database import get_db_connection
-import mysql.connector
-from datetime import datetime
-import traceback
-import io, csv
-
-data_bp = Blueprint('data', __name__)
-
-
-def _validate_user_id(user_id):
-    """验证提供的 user_id 是否存在于 User_u 表；存在返回 int，否则返回 None"""
-    try:
-        uid = int(user_id)
-    except Exception:
-        return None
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('SELECT UserID FROM User_u WHERE UserID = %s', (uid,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-        return uid if row is not None else None
-    except Exception:
-        return None
-
-# 查询船舶轨迹数据
-@data_bp.route('/vessel-tracks', methods=['GET'])
-def get_vessel_tracks():
-    """
-    查询船舶轨迹数据
-    参数: ship_id, start_time, end_time
-    """
-    try:
-        ship_id = request.args.get('ship_id', type=int)
-        start_time = request.args.get('start_time')
-        end_time = request.args.get('end_time')
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # 构建查询条件
-        query = """
-        SELECT ShipID, DateTime_u, Lat, Long_u, SeaTemp, WaveHeight, WavePeriod, SurgeDirection, SurgeHeight
-        FROM Data_u 
-        WHERE 1=1
-        """
-        params = []
-        
-        if ship_id:
-            query += " AND ShipID = %s"
-            params.append(ship_id)
-        if start_time:
-            query += " AND DateTime_u >= %s"
-            params.append(start_time)
-        if end_time:
-            query += " AND DateTime_u <= %s"
-            params.append(end_time)
-
-        query += " ORDER BY DateTime_u ASC"
-        
-        cursor.execute(query, params)
-        tracks = cursor.fetchall()
-        
-        # 格式化返回数据
-        formatted_tracks = []
-        for track in tracks:
-            formatted_tracks.append({
-                'ship_id': track['ShipID'],
-                'datetime': track['DateTime_u'].strftime('%Y-%m-%d %H:%M:%S') if track['DateTime_u'] else None,
-                'latitude': float(track['Lat']),
-                'longitude': float(track['Long_u']),
-                'sea_temperature': float(track['SeaTemp']) if track['SeaTemp'] is not None else None,
-                'wave_height': float(track['WaveHeight']),
-                'wave_period': float(track['WavePeriod']),
-                'surge_direction': track['SurgeDirection'],
-                'surge_height': float(track['SurgeHeight'])
-            })
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            "success": True,
-            "data": formatted_tracks,
-            "count": len(formatted_tracks)
-        })
-        
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
-
-# 查询海洋环境数据
-@data_bp.route('/ocean-environment', methods=['GET'])
-def get_ocean_environment():
-    """
-    查询特定区域的海洋环境数据
-    参数: min_lat, max_lat, min_lng, max_lng, start_time, end_time
-    """
-    try:
-        min_lat = request.args.get('min_lat', type=float)
-        max_lat = request.args.get('max_lat', type=float)
-        min_lng = request.args.get('min_lng', type=float)
-        max_lng = request.args.get('max_lng', type=float)
-        start_time = request.args.get('start_time')
-        end_time = request.args.get('end_time')
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        query = """
-        SELECT DateTime_u, Lat, Long_u, SeaTemp, WaveHeight, WavePeriod, 
-               SurgeDirection, SurgeHeight, ShipID
-        FROM Data_u 
-        WHERE 1=1
-        """
-        params = []
-        
-        if min_lat is not None and max_lat is not None:
-            query += " AND Lat BETWEEN %s AND %s"
-            params.extend([min_lat, max_lat])
-        if min_lng is not None and max_lng is not None:
-            query += " AND Long_u BETWEEN %s AND %s"
-            params.extend([min_lng, max_lng])
-        if start_time:
-            query += " AND DateTime_u >= %s"
-            params.append(start_time)
-        if end_time:
-            query += " AND DateTime_u <= %s"
-            params.append(end_time)
-
-        query += " ORDER BY DateTime_u DESC LIMIT 1000"  # 限制返回数量
-        
-        cursor.execute(query, params)
-        environment_data = cursor.fetchall()
-        
-        # 格式化数据
-        formatted_data = []
-        for data in environment_data:
-            formatted_data.append({
-                'datetime': data['DateTime_u'].strftime('%Y-%m-%d %H:%M:%S') if data['DateTime_u'] else None,
-                'latitude': float(data['Lat']),
-                'longitude': float(data['Long_u']),
-                'sea_temperature': float(data['SeaTemp']) if data['SeaTemp'] is not None else None,
-                'wave_height': float(data['WaveHeight']),
-                'wave_period': float(data['WavePeriod']),
-                'surge_direction': data['SurgeDirection'],
-                'surge_height': float(data['SurgeHeight']),
-                'ship_id': data['ShipID']
-            })
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            "success": True,
-            "data": formatted_data,
-            "count": len(formatted_data)
-        })
-        
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
-
-# 管理员添加数据
-@data_bp.route('/add', methods=['POST'])
-def add_data():
-    """
-    管理员添加船舶和环境数据
-    """
-    try:
-        # 检查用户权限（这里需要从session或token获取用户角色）
-        # 简化处理，实际项目中需要完整的认证机制
-        user_role = request.headers.get('User-Role')
-        if user_role != '1':  # 1表示管理员
-            return jsonify({"success": False, "error": "权限不足"}), 403
-        
-        data = request.json
-        
-        # 验证必需字段
-        required_fields = ['ship_id', 'datetime', 'lat', 'long', 'sea_temp', 
-                          'wave_height', 'wave_period', 'surge_direction', 'surge_height']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"success": False, "error": f"缺少必需字段: {field}"}), 400
-        
-        # 验证涌浪方向
-        if data['surge_direction'] not in ['E', 'S', 'W', 'N']:
-            return jsonify({"success": False, "error": "涌浪方向必须是 E, S, W, N 之一"}), 400
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        insert_query = """
-        INSERT INTO Data_u (ShipID, DateTime_u, Lat, Long_u, SeaTemp, WaveHeight, 
-                 WavePeriod, SurgeDirection, SurgeHeight)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        cursor.execute(insert_query, (
-            data['ship_id'],
-            data['datetime'],
-            data['lat'],
-            data['long'],
-            data['sea_temp'],
-            data['wave_height'],
-            data['wave_period'],
-            data['surge_direction'],
-            data['surge_height']
-        ))
-        
-        conn.commit()
-        new_data_id = cursor.lastrowid
-        
-        cursor.close()
-        conn.close()
-        
-        # 记录该操作到 Record（尝试记录 user id 如果提供）
-        try:
-            conn2 = get_db_connection()
-            cur2 = conn2.cursor()
-            user_id = request.headers.get('User-ID') or 0
-            valid_uid = _validate_user_id(user_id)
-            cur2.execute("INSERT INTO Record (OprateType, DateTime_u, UserID, DataID) VALUES (%s, %s, %s, %s)",
-                         ('INSERT', datetime.now(), valid_uid, int(new_data_id)))
-            conn2.commit()
-            cur2.close()
-            conn2.close()
-        except Exception as e:
-            print(f"记录操作到 Record 失败 (INSERT single add): {e}")
-
-        return jsonify({
-            "success": True,
-            "message": "数据添加成功",
-            "data_id": new_data_id
-        })
-        
-    except mysql.connector.Error as e:
-        return jsonify({"success": False, "error": f"数据库错误: {str(e)}"}), 500
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
-
-# 获取船舶列表
-@data_bp.route('/ships', methods=['GET'])
-def get_ships():
-    """
-    获取所有船舶ID列表
-    """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT DISTINCT ShipID FROM Data_u ORDER BY ShipID")
-        ships = [row[0] for row in cursor.fetchall()]
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            "success": True,
-            "ships": ships
-        })
-        
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-# 批量导入 CSV（管理员）
-@data_bp.route('/import', methods=['POST'])
-def import_csv():
-    """
-    管理员批量导入 CSV 文件（multipart/form-data, field name: file）
-    CSV 列名应包含: ship_id, datetime, lat, long, sea_temp, wave_height, wave_period, surge_direction, surge_height
-    返回: { success, imported, failed: [{row, reason}], error }
-    """
-    user_role = request.headers.get('User-Role')
-    if user_role != '1':
-        return jsonify({"success": False, "error": "权限不足"}), 403
-
-    if 'file' not in request.files:
-        return jsonify({"success": False, "error": "缺少文件参数 'file'"}), 400
-
-    f = request.files['file']
-    try:
-        text = f.stream.read().decode('utf-8')
-    except Exception:
-        return jsonify({"success": False, "error": "无法读取上传文件，需 utf-8 编码"}), 400
-
-    reader = csv.DictReader(io.StringIO(text))
-    # 将 reader 转为列表以便统计总行数并在遇到单行错误时继续处理后续行
-    rows = list(reader)
-    required_fields = ['ship_id', 'datetime', 'lat', 'long', 'sea_temp', 'wave_height', 'wave_period', 'surge_direction', 'surge_height']
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    imported = 0
-    failed = []
-    user_id = request.headers.get('User-ID') or 0
-
-    insert_query = """
-    INSERT INTO Data_u (ShipID, DateTime_u, Lat, Long_u, SeaTemp, WaveHeight, WavePeriod, SurgeDirection, SurgeHeight)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
-
-    conn.start_transaction()
-    for idx, row in enumerate(rows, start=1):
-            # 验证字段
-            missing = [f for f in required_fields if f not in row or row[f] == '']
-            if missing:
-                failed.append({"row": idx, "reason": f"缺少字段: {','.join(missing)}"})
-                continue
-
-            if row['surge_direction'] not in ['E', 'S', 'W', 'N']:
-                failed.append({"row": idx, "reason": "涌浪方向必须是 E/S/W/N 之一"})
-                continue
-
-            try:
-                params = (
-                    int(row['ship_id']),
-                    row['datetime'],
-                    float(row['lat']),
-                    float(row['long']),
-                    float(row['sea_temp']) if row['sea_temp'] != '' else None,
-                    float(row['wave_height']) if row['wave_height'] != '' else None,
-                    float(row['wave_period']) if row['wave_period'] != '' else None,
-                    row['surge_direction'],
-                    float(row['surge_height']) if row['surge_height'] != '' else None,
-                )
-                cursor.execute(insert_query, params)
-                new_id = cursor.lastrowid
-                # 写入操作记录（记录失败不应中断导入）
-                try:
-                    valid_uid = _validate_user_id(user_id)
-                    cursor.execute("INSERT INTO Record (OprateType, DateTime_u, UserID, DataID) VALUES (%s, %s, %s, %s)",
-                                   ('IMPORT', datetime.now(), valid_uid, new_id))
-                except Exception as rec_ex:
-                    # 打印日志以便排查，但继续导入其他行
-                    print(f"记录操作到 Record 失败 (IMPORT) row={idx}: {rec_ex}")
-                imported += 1
-            except Exception as ex:
-                failed.append({"row": idx, "reason": str(ex)})
-                # continue importing other rows
-    # 尝试提交事务；若提交失败则回滚并报告错误（此时已汇总导入和失败行）
-    try:
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        return jsonify({"success": False, "error": f"提交事务失败: {str(e)}", "imported": imported, "failed": failed}), 500
-
-    cursor.close()
-    conn.close()
-    total_rows = len(rows)
-    return jsonify({"success": True, "total_rows": total_rows, "imported": imported, "failed": failed})
-
-
-# 管理员：列出所有数据（分页）
-@data_bp.route('/list', methods=['GET'])
-def list_data():
-    try:
-        user_role = request.headers.get('User-Role')
-        if user_role != '1':
-            return jsonify({"success": False, "error": "权限不足"}), 403
-
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        count_q = "SELECT COUNT(*) as total FROM Data_u"
-        cursor.execute(count_q)
-        total = cursor.fetchone()['total']
-
-        q = "SELECT * FROM Data_u ORDER BY DateTime_u DESC LIMIT %s OFFSET %s"
-        cursor.execute(q, (per_page, (page - 1) * per_page))
-        rows = cursor.fetchall()
-
-        # 返回全部列（按 Data_u 表常用字段格式化日期和数值）
-        formatted = []
-        for r in rows:
-            formatted.append({
-                'DataID': r.get('DataID'),
-                'ShipID': r.get('ShipID'),
-                'DateTime_u': r['DateTime_u'].strftime('%Y-%m-%d %H:%M:%S') if r.get('DateTime_u') else None,
-                'Lat': float(r['Lat']) if r.get('Lat') is not None else None,
-                'Long_u': float(r['Long_u']) if r.get('Long_u') is not None else None,
-                'SeaTemp': float(r['SeaTemp']) if r.get('SeaTemp') is not None else None,
-                'WaveHeight': float(r['WaveHeight']) if r.get('WaveHeight') is not None else None,
-                'WavePeriod': float(r['WavePeriod']) if r.get('WavePeriod') is not None else None,
-                'SurgeDirection': r.get('SurgeDirection'),
-                'SurgeHeight': float(r['SurgeHeight']) if r.get('SurgeHeight') is not None else None
-            })
-
-        cursor.close()
-        conn.close()
-
-        return jsonify({
-            'success': True,
-            'data': formatted,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page
-            }
-        })
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-# 管理员：删除指定 DataID
-@data_bp.route('/delete', methods=['POST'])
-def delete_data():
-    try:
-        user_role = request.headers.get('User-Role')
-        if user_role != '1':
-            return jsonify({"success": False, "error": "权限不足"}), 403
-
-        data = request.json or {}
-        data_id = data.get('data_id')
-        if not data_id:
-            return jsonify({"success": False, "error": "缺少 data_id"}), 400
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # 可先检查是否存在
-        cursor.execute('SELECT DataID FROM Data_u WHERE DataID = %s', (data_id,))
-        if cursor.fetchone() is None:
-            cursor.close()
-            conn.close()
-            return jsonify({"success": False, "error": "数据不存在"}), 404
-
-        # 先在 Record 中记录删除操作（父记录仍存在时插入不会触发外键错误）
-        record_written = False
-        user_id = request.headers.get('User-ID') or 0
-        try:
-            conn2 = get_db_connection()
-            cur2 = conn2.cursor()
-            valid_uid = _validate_user_id(user_id)
-            cur2.execute("INSERT INTO Record (OprateType, DateTime_u, UserID, DataID) VALUES (%s, %s, %s, %s)",
-                         ('DELETE', datetime.now(), valid_uid, int(data_id)))
-            conn2.commit()
-            cur2.close()
-            conn2.close()
-            record_written = True
-        except Exception as e:
-            # 如果记录写入失败，打印错误但继续删除主记录
-            print(f"在删除前记录到 Record 失败 (DELETE) data_id={data_id}: {e}")
-
-        # 执行删除主记录
-        try:
-            cursor.execute('DELETE FROM Data_u WHERE DataID = %s', (data_id,))
-            conn.commit()
-        except Exception as del_ex:
-            # 若删除失败，尝试回滚并报告错误
-            conn.rollback()
-            cursor.close()
-            conn.close()
-            return jsonify({"success": False, "error": f"删除失败: {del_ex}"}), 500
-
-        cursor.close()
-        conn.close()
-        return jsonify({"success": True, "message": "删除成功", "data_id": data_id, "record_written": record_written})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
-
-
-# 管理员：更新指定 DataID 的字段
-@data_bp.route('/update', methods=['POST'])
-def update_data():
-    try:
-        user_role = request.headers.get('User-Role')
-        if user_role != '1':
-            return jsonify({"success": False, "error": "权限不足"}), 403
-
-        payload = request.json or {}
-        data_id = payload.get('data_id')
-        if not data_id:
-            return jsonify({"success": False, "error": "缺少 data_id"}), 400
-
-        # 允许更新的字段列表（根据 Data_u 表）
-        allowed = ['ShipID', 'DateTime_u', 'Lat', 'Long_u', 'SeaTemp', 'WaveHeight', 'WavePeriod', 'SurgeDirection', 'SurgeHeight']
-        updates = []
-        params = []
-        for k in allowed:
-            if k in payload:
-                updates.append(f"{k} = %s")
-                params.append(payload[k])
-
-        if not updates:
-            return jsonify({"success": False, "error": "没有要更新的字段"}), 400
-
-        params.append(data_id)
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        sql = f"UPDATE Data_u SET {', '.join(updates)} WHERE DataID = %s"
-        # debug: print constructed SQL and params
-        try:
-            print('DEBUG update payload:', payload)
-            print('DEBUG sql:', sql)
-            print('DEBUG params:', params)
-            cursor.execute(sql, tuple(params))
-        except Exception as exec_err:
-            print('Update execute failed:', exec_err)
-            traceback.print_exc()
-            raise
-        conn.commit()
-
-        # 记录操作（使用独立连接，保证与更新事务隔离）
-        record_written = False
-        user_id = request.headers.get('User-ID') or 0
-        try:
-            conn2 = get_db_connection()
-            cur2 = conn2.cursor()
-            valid_uid = _validate_user_id(user_id)
-            cur2.execute("INSERT INTO Record (OprateType, DateTime_u, UserID, DataID) VALUES (%s, %s, %s, %s)",
-                         ('UPDATE', datetime.now(), valid_uid, int(data_id)))
-            conn2.commit()
-            cur2.close()
-            conn2.close()
-            record_written = True
-        except Exception as e:
-            print(f"记录操作到 Record 失败 (UPDATE) data_id={data_id}: {e}")
-
-        cursor.close()
-        conn.close()
-
-        return jsonify({"success": True, "message": "更新成功", "data_id": data_id, "record_written": record_written})
-    except Exception as e:
+"""
+data_u路由/API接口
+"""
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context
+from models.database import get_db_connection, get_read_connection, read_engine
+from models.schema import spatial_index_available, ships_available, natural_key_available
+from models import rollup, ships, archive, nearby_index
+from utils.auth import admin_required
+from config import Config
+from utils.importer import import_stream, ImportDecodeError, SURGE_DIRECTIONS, ON_DUPLICATE_MODES
+from utils.audit import log_event
+from utils.import_jobs import import_jobs
+from utils.http_cache import etag_cached, bump_data_version
+from utils.pagination import keyset_clause, page_from_rows, cached_count, page_args
+from utils.simplify import simplify_track, simplify_mask, zoom_to_tolerance
+from utils.columnar import negotiate_format, columnar_response, ROWS
+import mysql.connector
+from datetime import datetime, timedelta
+from itertools import islice
+import heapq
+import math
+import time
+import traceback
+import json
+
+data_bp = Blueprint('data', __name__)
+
+# 网格聚合的统计字段: 返回键 -> Data_u 列
+GRID_METRICS = {
+    'sea_temperature': 'SeaTemp',
+    'wave_height': 'WaveHeight',
+    'wave_period': 'WavePeriod',
+    'surge_height': 'SurgeHeight'
+}
+MISSING_VALUE_THRESHOLD = -99  # 源数据用 -99.9 表示缺测
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 各只读引擎按小时/天取桶起点的表达式（models/database.py get_read_connection）
+_BUCKET_SQL = {
+    'mysql': {'hour': "TIMESTAMP(DATE(DateTime_u), MAKETIME(HOUR(DateTime_u), 0, 0))", 'day': "DATE(DateTime_u)"},
+    'sqlite': {'hour': "strftime('%Y-%m-%d %H:00:00', DateTime_u)", 'day': "date(DateTime_u)"},
+    'duckdb': {'hour': "date_trunc('hour', DateTime_u)", 'day': "CAST(DateTime_u AS DATE)"}
+}
+
+# 轨迹/区域环境查询读取的 Data_u 列（归档 Parquet 读取同样的列）
+_OBS_FIELDS = ('ShipID', 'DateTime_u', 'Lat', 'Long_u', 'SeaTemp', 'WaveHeight', 'WavePeriod', 'SurgeDirection', 'SurgeHeight')
+
+# 列式响应的列定义: (输出列名, Data_u 列, 类型)，列名与对象数组格式的键一致
+_OBS_COLUMNS = [
+    ('datetime', 'DateTime_u', 'epoch_s'),
+    ('latitude', 'Lat', 'f32'),
+    ('longitude', 'Long_u', 'f32'),
+    ('sea_temperature', 'SeaTemp', 'f32'),
+    ('wave_height', 'WaveHeight', 'f32'),
+    ('wave_period', 'WavePeriod', 'f32'),
+    ('surge_direction', 'SurgeDirection', 'dict'),
+    ('surge_height', 'SurgeHeight', 'f32'),
+    ('ship_id', 'ShipID', 'i32')
+]
+_LIST_COLUMNS = [
+    ('DataID', 'DataID', 'i32'),
+    ('ShipID', 'ShipID', 'i32'),
+    ('DateTime_u', 'DateTime_u', 'epoch_s'),
+    ('Lat', 'Lat', 'f32'),
+    ('Long_u', 'Long_u', 'f32'),
+    ('SeaTemp', 'SeaTemp', 'f32'),
+    ('WaveHeight', 'WaveHeight', 'f32'),
+    ('WavePeriod', 'WavePeriod', 'f32'),
+    ('SurgeDirection', 'SurgeDirection', 'dict'),
+    ('SurgeHeight', 'SurgeHeight', 'f32')
+]
+
+
+def _format_track(track):
+    return {
+        'ship_id': track['ShipID'],
+        'datetime': track['DateTime_u'].strftime('%Y-%m-%d %H:%M:%S') if track['DateTime_u'] else None,
+        'latitude': float(track['Lat']),
+        'longitude': float(track['Long_u']),
+        'sea_temperature': float(track['SeaTemp']) if track['SeaTemp'] is not None else None,
+        'wave_height': float(track['WaveHeight']),
+        'wave_period': float(track['WavePeriod']),
+        'surge_direction': track['SurgeDirection'],
+        'surge_height': float(track['SurgeHeight'])
+    }
+
+
+def _row_time(r):
+    return r['DateTime_u']
+
+
+def _fetch_iter(cursor):
+    while True:
+        rows = cursor.fetchmany(Config.STREAM_FETCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+
+def _stream_rows(query, params, formatter, fmt, merge_rows=None):
+    """
+    流式输出查询结果：非缓冲游标 + fetchmany 分批读取，内存占用与结果集大小无关。
+    fmt='ndjson' 每行一个 JSON 对象；fmt='json' 输出分块的 JSON 数组。
+    merge_rows 为按 DateTime_u 升序的额外行（归档数据），与按 DateTime_u 升序的查询结果归并输出。
+    连接在生成器结束（或客户端断开）时归还连接池。
+    """
+    # 先执行查询，SQL 错误仍能以普通 500 响应返回
+    conn = get_read_connection()
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(query, params)
+    except Exception:
+        conn.close()
+        raise
+
+    def generate():
+        try:
+            source = _fetch_iter(cursor)
+            if merge_rows:
+                source = heapq.merge(merge_rows, source, key=_row_time)
+            first = True
+            if fmt == 'json':
+                yield '['
+            while True:
+                rows = list(islice(source, Config.STREAM_FETCH_SIZE))
+                if not rows:
+                    break
+                parts = [json.dumps(formatter(r), ensure_ascii=False) for r in rows]
+                if fmt == 'json':
+                    yield ('' if first else ',') + ','.join(parts)
+                else:
+                    yield '\n'.join(parts) + '\n'
+                first = False
+            if fmt == 'json':
+                yield ']'
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            conn.close()
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+# 查询船舶轨迹数据
+@data_bp.route('/vessel-tracks', methods=['GET'])
+@etag_cached
+def get_vessel_tracks():
+    """
+    查询船舶轨迹数据
+    参数: ship_id, start_time, end_time
+    stream=ndjson|json 时流式返回（NDJSON 或分块 JSON 数组），不整体加载到内存
+    tolerance（度）或 zoom（地图缩放级别）时返回抽稀后的轨迹，并给出 original_count；
+    抽稀需要完整轨迹，因此与 stream 同时出现时忽略 stream
+    format=columnar|msgpack（或对应 Accept 头）时返回列式数据，同样忽略 stream
+    时间范围落入冷数据归档时合并归档中的观测（models/archive.py）
+    """
+    try:
+        fmt = negotiate_format()
+        if fmt is None:
+            return jsonify({"success": False, "error": "format 必须是 json、columnar 或 msgpack"}), 400
+        ship_id = request.args.get('ship_id', type=int)
+        start_time = request.args.get('start_time')
+        end_time = request.args.get('end_time')
+        stream = request.args.get('stream')
+        tolerance = request.args.get('tolerance', type=float)
+        zoom = request.args.get('zoom', type=int)
+        if tolerance is not None and not (math.isfinite(tolerance) and tolerance > 0):
+            return jsonify({"success": False, "error": "tolerance 必须是正数"}), 400
+        if tolerance is None and zoom is not None:
+            try:
+                tolerance = zoom_to_tolerance(zoom)
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+        
+        try:
+            archived = _archive_rows(ship_id, start_time, end_time)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        # 构建查询条件
+        query = f"""
+        SELECT {', '.join(_OBS_FIELDS)}
+        FROM Data_u 
+        WHERE 1=1
+        """
+        params = []
+        
+        if ship_id:
+            query += " AND ShipID = %s"
+            params.append(ship_id)
+        if start_time:
+            query += " AND DateTime_u >= %s"
+            params.append(start_time)
+        if end_time:
+            query += " AND DateTime_u <= %s"
+            params.append(end_time)
+
+        query += " ORDER BY DateTime_u ASC"
+
+        if stream in ('ndjson', 'json') and tolerance is None and fmt == ROWS:
+            return _stream_rows(query, params, _format_track, stream, archived)
+        
+        conn = get_read_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        tracks = cursor.fetchall()
+        
+        cursor.close()
+        conn.close()
+
+        if archived:
+            tracks = list(heapq.merge(archived, tracks, key=_row_time))
+
+        if fmt != ROWS:
+            meta = {}
+            if tolerance is not None:
+                keep = simplify_mask([_format_track(t) for t in tracks], tolerance)
+                meta = {"original_count": len(tracks), "simplified": True, "tolerance": tolerance}
+                tracks = [t for t, k in zip(tracks, keep) if k]
+            return columnar_response(tracks, _OBS_COLUMNS, fmt, **meta)
+
+        # 格式化返回数据
+        formatted_tracks = [_format_track(track) for track in tracks]
+
+        if tolerance is not None:
+            simplified = simplify_track(formatted_tracks, tolerance)
+            return jsonify({
+                "success": True,
+                "data": simplified,
+                "count": len(simplified),
+                "original_count": len(formatted_tracks),
+                "simplified": True,
+                "tolerance": tolerance
+            })
+        
+        return jsonify({
+            "success": True,
+            "data": formatted_tracks,
+            "count": len(formatted_tracks)
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+def _env_filters(min_lat, max_lat, min_lng, max_lng, start_time, end_time, ship_id=None):
+    """构建经纬度框/时间范围/船舶筛选条件，返回 (where 片段, 参数)"""
+    where = ""
+    params = []
+    has_lat = min_lat is not None and max_lat is not None
+    has_lng = min_lng is not None and max_lng is not None
+    if has_lat and has_lng and read_engine() == 'mysql' and spatial_index_available():
+        # 经纬度框走空间索引；MBRContains 不含边界，用 MBRCovers 与 BETWEEN 的闭区间保持一致
+        where += " AND MBRCovers(ST_MakeEnvelope(POINT(%s, %s), POINT(%s, %s)), Geo)"
+        params.extend([min_lng, min_lat, max_lng, max_lat])
+    else:
+        if has_lat:
+            where += " AND Lat BETWEEN %s AND %s"
+            params.extend([min_lat, max_lat])
+        if has_lng:
+            where += " AND Long_u BETWEEN %s AND %s"
+            params.extend([min_lng, max_lng])
+    if ship_id:
+        where += " AND ShipID = %s"
+        params.append(ship_id)
+    if start_time:
+        where += " AND DateTime_u >= %s"
+        params.append(start_time)
+    if end_time:
+        where += " AND DateTime_u <= %s"
+        params.append(end_time)
+    return where, params
+
+
+def _archive_rows(ship_id, start_time, end_time, bbox=None, newest_limit=None):
+    """
+    读取冷数据归档中满足条件的行（未启用归档或没有相交的分区时为空列表），
+    按 DateTime_u 升序；newest_limit 时为最新的若干行、降序。时间参数无法解析时抛出 ValueError
+    """
+    if not archive.enabled():
+        return []
+    start = _parse_time(start_time) if start_time else None
+    end = _parse_time(end_time) if end_time else None
+    if (start_time and start is None) or (end_time and end is None):
+        raise ValueError("start_time / end_time 格式应为 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS")
+    return archive.archived_rows(_OBS_FIELDS, ship_id, start, end, bbox, newest_limit)
+
+
+# 查询海洋环境数据
+@data_bp.route('/ocean-environment', methods=['GET'])
+@etag_cached
+def get_ocean_environment():
+    """
+    查询特定区域的海洋环境数据
+    参数: min_lat, max_lat, min_lng, max_lng, start_time, end_time,
+          format=json|columnar|msgpack（或对应 Accept 头）
+    返回最新的 1000 条；时间范围落入冷数据归档时与归档中的观测合并后再取
+    """
+    try:
+        fmt = negotiate_format()
+        if fmt is None:
+            return jsonify({"success": False, "error": "format 必须是 json、columnar 或 msgpack"}), 400
+        min_lat = request.args.get('min_lat', type=float)
+        max_lat = request.args.get('max_lat', type=float)
+        min_lng = request.args.get('min_lng', type=float)
+        max_lng = request.args.get('max_lng', type=float)
+        start_time = request.args.get('start_time')
+        end_time = request.args.get('end_time')
+
+        try:
+            archived = _archive_rows(None, start_time, end_time, (min_lat, max_lat, min_lng, max_lng), 1000)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        conn = get_read_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        query = f"""
+        SELECT {', '.join(_OBS_FIELDS)}
+        FROM Data_u 
+        WHERE 1=1
+        """
+        where, params = _env_filters(min_lat, max_lat, min_lng, max_lng, start_time, end_time)
+        query += where
+
+        query += " ORDER BY DateTime_u DESC LIMIT 1000"  # 限制返回数量
+        
+        cursor.execute(query, params)
+        environment_data = cursor.fetchall()
+        if archived:
+            environment_data = list(islice(heapq.merge(environment_data, archived, key=_row_time, reverse=True), 1000))
+
+        if fmt != ROWS:
+            cursor.close()
+            conn.close()
+            return columnar_response(environment_data, _OBS_COLUMNS, fmt)
+        
+        # 格式化数据
+        formatted_data = []
+        for data in environment_data:
+            formatted_data.append({
+                'datetime': data['DateTime_u'].strftime('%Y-%m-%d %H:%M:%S') if data['DateTime_u'] else None,
+                'latitude': float(data['Lat']),
+                'longitude': float(data['Long_u']),
+                'sea_temperature': float(data['SeaTemp']) if data['SeaTemp'] is not None else None,
+                'wave_height': float(data['WaveHeight']),
+                'wave_period': float(data['WavePeriod']),
+                'surge_direction': data['SurgeDirection'],
+                'surge_height': float(data['SurgeHeight']),
+                'ship_id': data['ShipID']
+            })
+        
+        cursor.close()
+        conn.close()
+        
+        return jsonify({
+            "success": True,
+            "data": formatted_data,
+            "count": len(formatted_data)
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+def _raw_stats_sql():
+    """直接扫描 Data_u 的统计列（缺测值如 -99.9 不参与统计），列名与 rollup.merged_aggregates() 一致"""
+    stats_sql = ["COUNT(*) AS cnt"]
+    for col in GRID_METRICS.values():
+        valid = f"CASE WHEN {col} > {MISSING_VALUE_THRESHOLD} THEN {col} END"
+        stats_sql.append(f"AVG({valid}) AS {col}_mean, MIN({valid}) AS {col}_min, MAX({valid}) AS {col}_max")
+    stats_sql += [f"SUM(CASE WHEN SurgeDirection = '{d}' THEN 1 ELSE 0 END) AS dir_{d}" for d in SURGE_DIRECTIONS]
+    return ', '.join(stats_sql)
+
+
+def _format_stats(r):
+    """统计行 -> 观测数、各指标 mean/min/max、主导涌浪方向"""
+    def _num(v):
+        return round(float(v), 3) if v is not None else None
+
+    out = {'count': int(r['cnt'])}
+    for key, col in GRID_METRICS.items():
+        out[key] = {
+            'mean': _num(r[f'{col}_mean']),
+            'min': _num(r[f'{col}_min']),
+            'max': _num(r[f'{col}_max'])
+        }
+    dir_counts = {d: int(r[f'dir_{d}'] or 0) for d in SURGE_DIRECTIONS}
+    best = max(dir_counts, key=dir_counts.get)
+    out['surge_direction'] = best if dir_counts[best] > 0 else None
+    return out
+
+
+def _parse_time(value):
+    for fmt in (TIME_FORMAT, '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def _bucket_aligned(start_time, end_time, hours):
+    """
+    时间范围是否与桶边界对齐（hours=1 按小时，24 按天），对齐时汇总表结果与扫描原始表一致。
+    起点须为桶起点，终点须为桶内最后一秒（如 23:59:59），缺省表示不限。
+    """
+    if start_time:
+        t = _parse_time(start_time)
+        if t is None or t.minute or t.second or (hours == 24 and t.hour):
+            return False
+    if end_time:
+        t = _parse_time(end_time)
+        if t is None or t.minute != 59 or t.second != 59 or (hours == 24 and t.hour != 23):
+            return False
+    return True
+
+
+def _cells_per_grid(resolution):
+    """resolution 为汇总网格边长的整数倍时返回倍数，否则返回 None"""
+    k = resolution / Config.ROLLUP_CELL_RESOLUTION
+    return int(round(k)) if round(k) >= 1 and abs(k - round(k)) < 1e-9 else None
+
+
+def _bbox_aligned(bbox):
+    """经纬度框的边都落在汇总网格边界上（或未指定）时才能用汇总表，否则边缘格会被整格计入"""
+    cell = Config.ROLLUP_CELL_RESOLUTION
+    for v in bbox:
+        if v is not None and abs(v / cell - round(v / cell)) > 1e-9:
+            return False
+    return True
+
+
+def _grid_cell_count(bbox, resolution):
+    """经纬度框（未指定的边取全球范围）按 resolution 分箱后最多可能的网格数"""
+    count = 1
+    for lo, hi, limit in ((bbox[0], bbox[1], 90.0), (bbox[2], bbox[3], 180.0)):
+        lo = -limit if lo is None else min(max(lo, -limit), limit)
+        hi = limit if hi is None else min(max(hi, -limit), limit)
+        count *= max(0, math.floor(hi / resolution) - math.floor(lo / resolution) + 1)
+    return count
+
+
+# 海洋环境网格聚合（热力图）
+@data_bp.route('/ocean-grid', methods=['GET'])
+@etag_cached
+def get_ocean_grid():
+    """
+    将观测按经纬度网格分箱，返回每个网格的统计值
+    参数: resolution（网格边长，度，默认 Config.GRID_DEFAULT_RESOLUTION）,
+          min_lat, max_lat, min_lng, max_lng, start_time, end_time, ship_id,
+          source=raw（强制扫描原始表）
+    经纬度范围按 resolution 划分后可能的网格数超过 Config.GRID_MAX_CELLS 时返回 400
+    返回每格: 中心点、观测数、海温/浪高/波周期/涌浪高度的 mean/min/max、主导涌浪方向
+    未指定船舶、网格为汇总网格整数倍、经纬度框与时间按汇总网格/天对齐时读取 Rollup_CellDay
+    """
+    try:
+        resolution = request.args.get('resolution', Config.GRID_DEFAULT_RESOLUTION, type=float)
+        if resolution is None or not resolution >= Config.GRID_MIN_RESOLUTION:
+            return jsonify({"success": False, "error": f"resolution 不能小于 {Config.GRID_MIN_RESOLUTION}"}), 400
+        bbox = (request.args.get('min_lat', type=float), request.args.get('max_lat', type=float),
+                request.args.get('min_lng', type=float), request.args.get('max_lng', type=float))
+        if any(v is not None and not math.isfinite(v) for v in bbox):
+            return jsonify({"success": False, "error": "经纬度范围必须是有限数值"}), 400
+        cells = _grid_cell_count(bbox, resolution)
+        if cells > Config.GRID_MAX_CELLS:
+            return jsonify({"success": False,
+                            "error": f"网格数 {cells} 超过上限 {Config.GRID_MAX_CELLS}，请增大 resolution 或缩小经纬度范围"}), 400
+        start_time = request.args.get('start_time')
+        end_time = request.args.get('end_time')
+        ship_id = request.args.get('ship_id', type=int)
+
+        k = _cells_per_grid(resolution)
+        # 汇总表只在 MySQL 中维护，只读快照引擎直接扫描原始观测
+        use_rollup = (request.args.get('source') != 'raw' and not ship_id and k is not None
+                      and _bbox_aligned(bbox) and _bucket_aligned(start_time, end_time, 24) and read_engine() == 'mysql' and rollup.enabled())
+
+        if use_rollup:
+            # 汇总网格再按 k×k 合并：FLOOR(FLOOR(lat / r) / k) = FLOOR(lat / (r * k))
+            cell = Config.ROLLUP_CELL_RESOLUTION
+            where = ""
+            params = []
+            for lo, hi, col in ((bbox[0], bbox[1], 'CellY'), (bbox[2], bbox[3], 'CellX')):
+                if lo is not None and hi is not None:
+                    # 按汇总网格取覆盖经纬度框的格子（恰好落在框外边界上的点会被归入相邻格）
+                    where += f" AND {col} BETWEEN FLOOR(%s / {cell!r}) AND CEIL(%s / {cell!r}) - 1"
+                    params.extend([lo, hi])
+            if start_time:
+                where += " AND Bucket >= DATE(%s)"
+                params.append(start_time)
+            if end_time:
+                where += " AND Bucket <= DATE(%s)"
+                params.append(end_time)
+            query = f"""
+            SELECT FLOOR(CellY / {k}) AS gy, FLOOR(CellX / {k}) AS gx, {rollup.merged_aggregates()}
+            FROM Rollup_CellDay
+            WHERE 1=1 {where}
+            GROUP BY gy, gx
+            """
+        else:
+            where, params = _env_filters(bbox[0], bbox[1], bbox[2], bbox[3], start_time, end_time, ship_id)
+            query = f"""
+            SELECT FLOOR(Lat / %s) AS gy, FLOOR(Long_u / %s) AS gx, {_raw_stats_sql()}
+            FROM Data_u
+            WHERE 1=1 {where}
+            GROUP BY gy, gx
+            """
+            params = [resolution, resolution] + params
+
+        conn = get_read_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        cells = []
+        for r in rows:
+            cell = {
+                'lat': round((int(r['gy']) + 0.5) * resolution, 6),
+                'lng': round((int(r['gx']) + 0.5) * resolution, 6)
+            }
+            cell.update(_format_stats(r))
+            cells.append(cell)
+
+        return jsonify({
+            "success": True,
+            "resolution": resolution,
+            "source": 'rollup' if use_rollup else 'raw',
+            "cells": cells,
+            "count": len(cells)
+        })
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# 单船按小时/天的环境统计
+@data_bp.route('/ship-stats', methods=['GET'])
+@etag_cached
+def get_ship_stats():
+    """
+    参数: ship_id（必填）, granularity=hour|day（默认 day）, start_time, end_time, source=raw
+    返回按时间排序的桶: 桶起点、观测数、各指标 mean/min/max、主导涌浪方向
+    时间范围与桶边界对齐时读取 Rollup_ShipHour / Rollup_ShipDay
+    """
+    try:
+        ship_id = request.args.get('ship_id', type=int)
+        if not ship_id:
+            return jsonify({"success": False, "error": "缺少 ship_id"}), 400
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in ('hour', 'day'):
+            return jsonify({"success": False, "error": "granularity 必须是 hour 或 day"}), 400
+        start_time = request.args.get('start_time')
+        end_time = request.args.get('end_time')
+        hours = 1 if granularity == 'hour' else 24
+
+        use_rollup = (request.args.get('source') != 'raw' and _bucket_aligned(start_time, end_time, hours)
+                      and read_engine() == 'mysql' and rollup.enabled())
+
+        params = [ship_id]
+        if use_rollup:
+            table = 'Rollup_ShipHour' if granularity == 'hour' else 'Rollup_ShipDay'
+            where = ""
+            if start_time:
+                where += " AND Bucket >= %s"
+                params.append(start_time)
+            if end_time:
+                where += " AND Bucket <= %s"
+                params.append(end_time)
+            query = f"""
+            SELECT Bucket AS bucket, {rollup.merged_aggregates()}
+            FROM {table}
+            WHERE ShipID = %s {where}
+            GROUP BY Bucket
+            ORDER BY Bucket
+            """
+        else:
+            bucket = _BUCKET_SQL[read_engine()][granularity]
+            where = ""
+            if start_time:
+                where += " AND DateTime_u >= %s"
+                params.append(start_time)
+            if end_time:
+                where += " AND DateTime_u <= %s"
+                params.append(end_time)
+            query = f"""
+            SELECT {bucket} AS bucket, {_raw_stats_sql()}
+            FROM Data_u
+            WHERE ShipID = %s {where}
+            GROUP BY bucket
+            ORDER BY bucket
+            """
+
+        conn = get_read_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        buckets = []
+        for r in rows:
+            b = r['bucket']
+            item = {'bucket': b.strftime(TIME_FORMAT if granularity == 'hour' else '%Y-%m-%d') if b else None}
+            item.update(_format_stats(r))
+            buckets.append(item)
+
+        return jsonify({
+            "success": True,
+            "ship_id": ship_id,
+            "granularity": granularity,
+            "source": 'rollup' if use_rollup else 'raw',
+            "buckets": buckets,
+            "count": len(buckets)
+        })
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# 某点附近、某时间窗内报告过位置的船舶
+@data_bp.route('/nearby', methods=['GET'])
+def get_nearby():
+    """
+    参数: lat, lng（必填）；时间窗为 time ± window_hours（默认 1 小时）或 start_time ~ end_time；
+          radius_km（半径查询）或 k（k 近邻，默认 10，二者给一个）；per_ship=0 时返回全部观测（默认每船一条最近观测）
+    返回按距离排序的观测: ship_id, data_id, datetime, latitude, longitude, distance_km
+    由进程内索引（models/nearby_index.py）回答，不包含已归档的观测；索引未启用或建立完成前返回 503
+    """
+    try:
+        if not Config.NEARBY_ENABLED:
+            return jsonify({"success": False, "error": "最近船舶索引未启用（设置环境变量 NEARBY_ENABLED=1）"}), 503
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        if lat is None or lng is None or not -90 <= lat <= 90 or not -180 <= lng <= 180:
+            return jsonify({"success": False, "error": "lat、lng 必填且须为有效经纬度"}), 400
+
+        if request.args.get('start_time') or request.args.get('end_time'):
+            start = _parse_time(request.args.get('start_time'))
+            end = _parse_time(request.args.get('end_time'))
+        else:
+            center = _parse_time(request.args.get('time')) if request.args.get('time') else datetime.now()
+            window = request.args.get('window_hours', 1, type=float)
+            if center is None or window is None or window < 0:
+                return jsonify({"success": False, "error": "time 或 window_hours 无效"}), 400
+            start, end = center - timedelta(hours=window), center + timedelta(hours=window)
+        if start is None or end is None or start > end:
+            return jsonify({"success": False, "error": "需要有效的 start_time 和 end_time（或 time）"}), 400
+        if (end - start).total_seconds() > Config.NEARBY_MAX_WINDOW_HOURS * 3600:
+            return jsonify({"success": False, "error": f"时间窗不能超过 {Config.NEARBY_MAX_WINDOW_HOURS} 小时"}), 400
+
+        radius_km = request.args.get('radius_km', type=float)
+        k = None
+        if radius_km is not None:
+            if not 0 < radius_km <= Config.NEARBY_MAX_RADIUS_KM:
+                return jsonify({"success": False, "error": f"radius_km 须在 0 ~ {Config.NEARBY_MAX_RADIUS_KM} 之间"}), 400
+        else:
+            k = request.args.get('k', 10, type=int)
+            if k is None or not 1 <= k <= Config.NEARBY_MAX_K:
+                return jsonify({"success": False, "error": f"k 须在 1 ~ {Config.NEARBY_MAX_K} 之间"}), 400
+        per_ship = request.args.get('per_ship', '1') != '0'
+
+        started = time.perf_counter()
+        results, searched = nearby_index.nearby_index.query(lat, lng, start, end, radius_km=radius_km, k=k,
+                                                            per_ship=per_ship, limit=Config.NEARBY_MAX_RESULTS)
+        if results is None:
+            return jsonify({"success": False, "error": "最近船舶索引尚未建立完成，请稍后再试"}), 503
+
+        return jsonify({
+            "success": True,
+            "start_time": start.strftime(TIME_FORMAT),
+            "end_time": end.strftime(TIME_FORMAT),
+            "radius_km": round(searched, 3),
+            "data": results,
+            "count": len(results),
+            "query_ms": round((time.perf_counter() - started) * 1000, 2)
+        })
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# 管理员添加数据
+@data_bp.route('/add', methods=['POST'])
+@admin_required
+def add_data():
+    """
+    管理员添加船舶和环境数据
+    """
+    try:
+        data = request.json
+        
+        # 验证必需字段
+        required_fields = ['ship_id', 'datetime', 'lat', 'long', 'sea_temp', 
+                          'wave_height', 'wave_period', 'surge_direction', 'surge_height']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({"success": False, "error": f"缺少必需字段: {field}"}), 400
+        
+        # 验证涌浪方向
+        if data['surge_direction'] not in ['E', 'S', 'W', 'N']:
+            return jsonify({"success": False, "error": "涌浪方向必须是 E, S, W, N 之一"}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        insert_query = """
+        INSERT INTO Data_u (ShipID, DateTime_u, Lat, Long_u, SeaTemp, WaveHeight, 
+                 WavePeriod, SurgeDirection, SurgeHeight)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        
+        cursor.execute(insert_query, (
+            data['ship_id'],
+            data['datetime'],
+            data['lat'],
+            data['long'],
+            data['sea_temp'],
+            data['wave_height'],
+            data['wave_period'],
+            data['surge_direction'],
+            data['surge_height']
+        ))
+        new_data_id = cursor.lastrowid
+
+        # 同一事务内更新受影响的汇总桶
+        if rollup.enabled(recheck=True):
+            rollup.refresh_safely(conn, rollup.keys_for_ids(conn, [new_data_id]))
+        if ships_available(recheck=True):
+            ships.maintain_safely(ships.observe_ids, conn, [new_data_id])
+        nearby_index.track(conn, [new_data_id])
+
+        conn.commit()
+        bump_data_version()
+        
+        cursor.close()
+        conn.close()
+        
+        # 记录该操作到 Record（异步批量写入，不占用请求路径）
+        log_event('INSERT', g.user_id, new_data_id)
+
+        return jsonify({
+            "success": True,
+            "message": "数据添加成功",
+            "data_id": new_data_id
+        })
+        
+    except mysql.connector.Error as e:
+        return jsonify({"success": False, "error": f"数据库错误: {str(e)}"}), 500
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# 获取船舶列表
+@data_bp.route('/ships', methods=['GET'])
+@etag_cached
+def get_ships():
+    """
+    获取所有船舶ID列表
+    Ship 维表存在时直接读取（O(船舶数)），并在 details 中附带呼号、首末观测时间和观测数
+    """
+    try:
+        if ships_available():
+            rows = ships.list_ships()
+            details = [{
+                'ship_id': r['ShipID'],
+                'call_sign': r['CallSign'],
+                'first_seen': r['FirstSeen'].strftime(TIME_FORMAT) if r['FirstSeen'] else None,
+                'last_seen': r['LastSeen'].strftime(TIME_FORMAT) if r['LastSeen'] else None,
+                'count': r['ObsCount'],
+                'archived_count': r['ArchivedCount']
+            } for r in rows]
+            return jsonify({
+                "success": True,
+                "ships": [d['ship_id'] for d in details],
+                "details": details
+            })
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT DISTINCT ShipID FROM Data_u ORDER BY ShipID")
+        ship_ids = [row[0] for row in cursor.fetchall()]
+        
+        cursor.close()
+        conn.close()
+        
+        return jsonify({
+            "success": True,
+            "ships": ship_ids
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# 批量导入 CSV（管理员）
+@data_bp.route('/import', methods=['POST'])
+@admin_required
+def import_csv():
+    """
+    管理员批量导入 CSV 文件（multipart/form-data, field name: file）
+    CSV 列名应包含: ship_id, datetime, lat, long, sea_temp, wave_height, wave_period, surge_direction, surge_height
+    可选参数: chunk_size（每批行数）, commit_per_chunk=1（每批提交一次）,
+             on_duplicate=insert|skip|update（按 ShipID+时间+经纬度判断重复观测，skip/update 需迁移 v6）
+    mode=job 时后台执行，立即返回 202 { success, job_id, status }，用 GET /import/<job_id> 查询进度
+    返回: { success, imported, updated, skipped, failed: [{row, reason}], error }
+    """
+    if 'file' not in request.files:
+        return jsonify({"success": False, "error": "缺少文件参数 'file'"}), 400
+
+    f = request.files['file']
+    chunk_size = request.args.get('chunk_size', Config.IMPORT_CHUNK_SIZE, type=int)
+    if chunk_size <= 0:
+        chunk_size = Config.IMPORT_CHUNK_SIZE
+    commit_per_chunk = request.args.get('commit_per_chunk', '1' if Config.IMPORT_COMMIT_PER_CHUNK else '0') == '1'
+    on_duplicate = request.args.get('on_duplicate', Config.IMPORT_ON_DUPLICATE)
+    if on_duplicate not in ON_DUPLICATE_MODES:
+        return jsonify({"success": False, "error": "on_duplicate 必须是 insert、skip 或 update"}), 400
+    if on_duplicate != 'insert' and not natural_key_available():
+        return jsonify({"success": False, "error": "缺少自然键唯一索引，请先运行 python -m models.dedupe 和 python -m models.schema"}), 400
+
+    if request.args.get('mode') == 'job':
+        try:
+            job = import_jobs.submit(f, g.user_id, chunk_size, commit_per_chunk, on_duplicate)
+        except Exception as e:
+            return jsonify({"success": False, "error": f"保存上传文件失败: {str(e)}"}), 500
+        if job is None:
+            return jsonify({"success": False, "error": f"导入任务已达上限（{Config.IMPORT_JOB_MAX_ACTIVE}），请稍后再试"}), 429
+        return jsonify({"success": True, "job_id": job.id, "status": job.status}), 202
+
+    conn = get_db_connection()
+    try:
+        result = import_stream(conn, f.stream, user_id=g.user_id, chunk_size=chunk_size,
+                               commit_per_chunk=commit_per_chunk,
+                               use_load_data=Config.IMPORT_USE_LOAD_DATA, on_duplicate=on_duplicate)
+    except ImportDecodeError:
+        conn.rollback()
+        conn.close()
+        return jsonify({"success": False, "error": "无法读取上传文件，需 utf-8 编码"}), 400
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        if commit_per_chunk:
+            # 失败前已提交的 chunk 仍然生效
+            bump_data_version()
+        return jsonify({"success": False, "error": f"导入失败: {str(e)}"}), 500
+
+    # 尝试提交事务；若提交失败则回滚并报告错误（此时已汇总导入和失败行）
+    try:
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        if commit_per_chunk:
+            bump_data_version()
+        return jsonify({"success": False, "error": f"提交事务失败: {str(e)}", "imported": result['imported'], "failed": result['failed']}), 500
+
+    conn.close()
+    bump_data_version()
+    return jsonify({"success": True, "total_rows": result['total_rows'], "imported": result['imported'],
+                    "updated": result['updated'], "skipped": result['skipped'], "failed": result['failed']})
+
+
+# 管理员：后台导入任务列表（不含失败行明细）
+@data_bp.route('/import/jobs', methods=['GET'])
+@admin_required
+def list_import_jobs():
+    return jsonify({"success": True, "jobs": [j.to_dict(with_failed=False) for j in import_jobs.list()]})
+
+
+# 管理员：查询后台导入任务的状态、进度和失败行
+@data_bp.route('/import/<job_id>', methods=['GET'])
+@admin_required
+def import_job_status(job_id):
+    job = import_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "导入任务不存在或已过期"}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
+
+# 管理员：取消后台导入任务
+@data_bp.route('/import/<job_id>/cancel', methods=['POST'])
+@admin_required
+def cancel_import_job(job_id):
+    job = import_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "导入任务不存在或已过期"}), 404
+    return jsonify({"success": True, "job": job.to_dict(with_failed=False)})
+
+
+def _format_data_row(r):
+    """返回全部列（按 Data_u 表常用字段格式化日期和数值）"""
+    return {
+        'DataID': r.get('DataID'),
+        'ShipID': r.get('ShipID'),
+        'DateTime_u': r['DateTime_u'].strftime('%Y-%m-%d %H:%M:%S') if r.get('DateTime_u') else None,
+        'Lat': float(r['Lat']) if r.get('Lat') is not None else None,
+        'Long_u': float(r['Long_u']) if r.get('Long_u') is not None else None,
+        'SeaTemp': float(r['SeaTemp']) if r.get('SeaTemp') is not None else None,
+        'WaveHeight': float(r['WaveHeight']) if r.get('WaveHeight') is not None else None,
+        'WavePeriod': float(r['WavePeriod']) if r.get('WavePeriod') is not None else None,
+        'SurgeDirection': r.get('SurgeDirection'),
+        'SurgeHeight': float(r['SurgeHeight']) if r.get('SurgeHeight') is not None else None
+    }
+
+
+def _count_data(cursor):
+    cursor.execute("SELECT COUNT(*) as total FROM Data_u")
+    return cursor.fetchone()['total']
+
+
+# 管理员：列出所有数据（分页）
+@data_bp.route('/list', methods=['GET'])
+@admin_required
+def list_data():
+    """
+    两种分页模式：
+    - 页码模式（默认，兼容旧前端）: page, per_page
+    - 游标模式: cursor（首页传空或 mode=cursor）, per_page, with_total=1 时附带缓存的总数
+    format=columnar|msgpack（或对应 Accept 头）时 data 以列式 columns 返回
+    """
+    try:
+        fmt = negotiate_format()
+        if fmt is None:
+            return jsonify({"success": False, "error": "format 必须是 json、columnar 或 msgpack"}), 400
+        try:
+            page, per_page = page_args(request.args)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        cursor_token = request.args.get('cursor')
+        if cursor_token is not None or request.args.get('mode') == 'cursor':
+            return _list_data_keyset(per_page, cursor_token or None, fmt)
+
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        total = _count_data(cursor)
+
+        q = "SELECT * FROM Data_u ORDER BY DateTime_u DESC LIMIT %s OFFSET %s"
+        cursor.execute(q, (per_page, (page - 1) * per_page))
+        rows = cursor.fetchall()
+
+        cursor.close()
+        conn.close()
+
+        pagination = {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page
+        }
+        if fmt != ROWS:
+            return columnar_response(rows, _LIST_COLUMNS, fmt, pagination=pagination)
+
+        return jsonify({
+            'success': True,
+            'data': [_format_data_row(r) for r in rows],
+            'pagination': pagination
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+def _list_data_keyset(per_page, cursor_token, fmt=ROWS):
+    """按 (DateTime_u, DataID) 游标分页"""
+    try:
+        where, params, order, direction = keyset_clause('DateTime_u', 'DataID', cursor_token)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    q = "SELECT * FROM Data_u WHERE 1=1" + where + order + " LIMIT %s"
+    cursor.execute(q, params + [per_page + 1])
+    rows, next_cursor, prev_cursor = page_from_rows(cursor.fetchall(), per_page, direction,
+                                                    cursor_token is not None, 'DateTime_u', 'DataID')
+
+    pagination = {
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    }
+    if request.args.get('with_total') == '1':
+        pagination['total'] = cached_count('Data_u', lambda: _count_data(cursor))
+
+    cursor.close()
+    conn.close()
+
+    if fmt != ROWS:
+        return columnar_response(rows, _LIST_COLUMNS, fmt, pagination=pagination)
+
+    return jsonify({
+        'success': True,
+        'data': [_format_data_row(r) for r in rows],
+        'pagination': pagination
+    })
+
+
+# 管理员：删除指定 DataID
+@data_bp.route('/delete', methods=['POST'])
+@admin_required
+def delete_data():
+    try:
+        data = request.json or {}
+        data_id = data.get('data_id')
+        if not data_id:
+            return jsonify({"success": False, "error": "缺少 data_id"}), 400
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # 可先检查是否存在
+        cursor.execute('SELECT ShipID FROM Data_u WHERE DataID = %s', (data_id,))
+        existing = cursor.fetchone()
+        if existing is None:
+            cursor.close()
+            conn.close()
+            return jsonify({"success": False, "error": "数据不存在"}), 404
+
+        # 在同一事务中先写 Record 再删除主记录（父记录仍存在时插入不会触发外键错误，
+        # 因此删除操作不走异步写入）
+        record_written = False
+        try:
+            cursor.execute("INSERT INTO Record (OprateType, DateTime_u, UserID, DataID) VALUES (%s, %s, %s, %s)",
+                           ('DELETE', datetime.now(), g.user_id, int(data_id)))
+            record_written = True
+        except Exception as e:
+            # 如果记录写入失败，打印错误但继续删除主记录
+            print(f"在删除前记录到 Record 失败 (DELETE) data_id={data_id}: {e}")
+
+        # 删除前记下所属的汇总桶，删除后按剩余数据重算
+        rollup_keys = rollup.keys_for_ids(conn, [data_id]) if rollup.enabled(recheck=True) else None
+
+        # 执行删除主记录
+        try:
+            cursor.execute('DELETE FROM Data_u WHERE DataID = %s', (data_id,))
+            rollup.refresh_safely(conn, rollup_keys)
+            if ships_available(recheck=True):
+                ships.maintain_safely(ships.recount, conn, [existing[0]])
+            nearby_index.track(conn, [int(data_id)])
+            conn.commit()
+            bump_data_version()
+        except Exception as del_ex:
+            # 若删除失败，尝试回滚并报告错误
+            conn.rollback()
+            cursor.close()
+            conn.close()
+            return jsonify({"success": False, "error": f"删除失败: {del_ex}"}), 500
+
+        cursor.close()
+        conn.close()
+        return jsonify({"success": True, "message": "删除成功", "data_id": data_id, "record_written": record_written})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# 管理员：更新指定 DataID 的字段
+@data_bp.route('/update', methods=['POST'])
+@admin_required
+def update_data():
+    try:
+        payload = request.json or {}
+        data_id = payload.get('data_id')
+        if not data_id:
+            return jsonify({"success": False, "error": "缺少 data_id"}), 400
+
+        # 允许更新的字段列表（根据 Data_u 表）
+        allowed = ['ShipID', 'DateTime_u', 'Lat', 'Long_u', 'SeaTemp', 'WaveHeight', 'WavePeriod', 'SurgeDirection', 'SurgeHeight']
+        updates = []
+        params = []
+        for k in allowed:
+            if k in payload:
+                updates.append(f"{k} = %s")
+                params.append(payload[k])
+
+        if not updates:
+            return jsonify({"success": False, "error": "没有要更新的字段"}), 400
+
+        params.append(data_id)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # 修改时间/位置/船舶会使记录换桶，新旧桶都需要重算
+        rollup_keys = rollup.keys_for_ids(conn, [data_id]) if rollup.enabled(recheck=True) else None
+        ship_before = None
+        if ships_available(recheck=True):
+            cursor.execute('SELECT ShipID FROM Data_u WHERE DataID = %s', (data_id,))
+            row = cursor.fetchone()
+            ship_before = row[0] if row else None
+
+        sql = f"UPDATE Data_u SET {', '.join(updates)} WHERE DataID = %s"
+        # debug: print constructed SQL and params
+        try:
+            print('DEBUG update payload:', payload)
+            print('DEBUG sql:', sql)
+            print('DEBUG params:', params)
+            cursor.execute(sql, tuple(params))
+        except Exception as exec_err:
+            print('Update execute failed:', exec_err)
+            traceback.print_exc()
+            raise
+        if rollup_keys is not None:
+            rollup.refresh_safely(conn, rollup.merge_keys(rollup_keys, rollup.keys_for_ids(conn, [data_id])))
+        if ship_before is not None:
+            ships.maintain_safely(ships.recount, conn, {ship_before, payload.get('ShipID', ship_before)})
+        nearby_index.track(conn, [int(data_id)])
+        conn.commit()
+        bump_data_version()
+
+        # 记录操作（异步批量写入，与更新事务隔离）
+        record_written = log_event('UPDATE', g.user_id, data_id)
+
+        cursor.close()
+        conn.close()
+
+        return jsonify({"success": True, "message": "更新成功", "data_id": data_id, "record_written": record_written})
+    except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
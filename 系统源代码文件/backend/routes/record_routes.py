@@ -1,222 +1,242 @@
-"""
-record路由/API接口
-"""
-from flask import Blueprint, request, jsonify
-from models.database import get_db_connection
-from datetime import datetime
-
-record_bp = Blueprint('record', __name__)
-
-# 记录用户操作
-def log_operation(user_id, data_id, operation_type):
-    """
-    记录用户操作的辅助函数
-    """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        insert_query = """
-        INSERT INTO Record (OprateType, DateTime_u, UserID, DataID)
-        VALUES (%s, %s, %s, %s)
-        """
-        
-        cursor.execute(insert_query, (
-            operation_type,
-            datetime.now(),
-            user_id,
-            data_id
-        ))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        print(f"记录操作失败: {e}")
-        return False
-
-# 查询操作记录
-@record_bp.route('/operations', methods=['GET'])
-def get_operations():
-    """
-    查询操作记录（管理员功能）
-    参数: user_id, operation_type, start_time, end_time
-    """
-    try:
-        # 检查管理员权限
-        user_role = request.headers.get('User-Role')
-        if user_role != '1':  # 1表示管理员
-            return jsonify({"success": False, "error": "权限不足"}), 403
-        
-        user_id = request.args.get('user_id', type=int)
-        operation_type = request.args.get('operation_type')
-        start_time = request.args.get('start_time')
-        end_time = request.args.get('end_time')
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # 构建查询
-        query = """
-        SELECT r.RecordID, r.OprateType, r.DateTime_u, r.UserID, r.DataID,
-               u.Name_u as UserName, u.Email as UserEmail,
-               d.ShipID, d.DateTime_u as DataTime
-        FROM Record r
-        LEFT JOIN User_u u ON r.UserID = u.UserID
-        LEFT JOIN Data_u d ON r.DataID = d.DataID
-        WHERE 1=1
-        """
-        params = []
-        
-        if user_id:
-            query += " AND r.UserID = %s"
-            params.append(user_id)
-        if operation_type:
-            query += " AND r.OprateType = %s"
-            params.append(operation_type)
-        if start_time:
-            query += " AND r.DateTime_u >= %s"
-            params.append(start_time)
-        if end_time:
-            query += " AND r.DateTime_u <= %s"
-            params.append(end_time)
-            
-        # 计算总数
-        count_query = "SELECT COUNT(*) as total FROM (" + query + ") as t"
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()['total']
-        
-        # 添加分页
-        query += " ORDER BY r.DateTime_u DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, (page - 1) * per_page])
-        
-        cursor.execute(query, params)
-        operations = cursor.fetchall()
-        
-        # 格式化返回数据
-        formatted_operations = []
-        for op in operations:
-            formatted_operations.append({
-                'record_id': op['RecordID'],
-                'operation_type': op['OprateType'],
-                'datetime': op['DateTime_u'].strftime('%Y-%m-%d %H:%M:%S') if op['DateTime_u'] else None,
-                'user_id': op['UserID'],
-                'user_name': op['UserName'],
-                'user_email': op['UserEmail'],
-                'data_id': op['DataID'],
-                'ship_id': op['ShipID'],
-                'data_time': op['DataTime'].strftime('%Y-%m-%d %H:%M:%S') if op['DataTime'] else None
-            })
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            "success": True,
-            "data": formatted_operations,
-            "pagination": {
-                "page": page,
-                "per_page": per_page,
-                "total": total,
-                "pages": (total + per_page - 1) // per_page
-            }
-        })
-        
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
-
-# 获取操作统计
-@record_bp.route('/stats', methods=['GET'])
-def get_operation_stats():
-    """
-    获取操作统计信息（管理员功能）
-    """
-    try:
-        # 检查管理员权限
-        user_role = request.headers.get('User-Role')
-        if user_role != '1':
-            return jsonify({"success": False, "error": "权限不足"}), 403
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # 按操作类型统计
-        cursor.execute("""
-            SELECT OprateType, COUNT(*) as count 
-            FROM Record 
-            GROUP BY OprateType
-        """)
-        type_stats = cursor.fetchall()
-        
-        # 按用户统计
-        cursor.execute("""
-            SELECT u.Name_u as Name, u.Email as Email, COUNT(*) as operation_count
-            FROM Record r
-            JOIN User_u u ON r.UserID = u.UserID
-            GROUP BY r.UserID
-            ORDER BY operation_count DESC
-            LIMIT 10
-        """)
-        user_stats = cursor.fetchall()
-        
-        # 最近活动
-        cursor.execute("""
-            SELECT COUNT(*) as recent_activity
-            FROM Record 
-            WHERE DateTime_u >= DATE_SUB(NOW(), INTERVAL 7 DAY)
-        """)
-        recent_activity = cursor.fetchone()['recent_activity']
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            "success": True,
-            "stats": {
-                "by_operation_type": type_stats,
-                "top_users": user_stats,
-                "recent_activity_7_days": recent_activity
-            }
-        })
-        
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
-
-# 清理旧记录
-@record_bp.route('/cleanup', methods=['POST'])
-def cleanup_old_records():
-    """
-    清理超过一定时间的操作记录（管理员功能）
-    """
-    try:
-        # 检查管理员权限
-        user_role = request.headers.get('User-Role')
-        if user_role != '1':
-            return jsonify({"success": False, "error": "权限不足"}), 403
-        
-        data = request.json
-        days_to_keep = data.get('days_to_keep', 90)  # 默认保留90天
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        delete_query = "DELETE FROM Record WHERE DateTime_u < DATE_SUB(NOW(), INTERVAL %s DAY)"
-        cursor.execute(delete_query, (days_to_keep,))
-        
-        deleted_count = cursor.rowcount
-        conn.commit()
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            "success": True,
-            "message": f"成功清理 {deleted_count} 条旧记录",
-            "deleted_count": deleted_count
-        })
-        
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
+"""
+record路由/API接口
+"""
+from flask import Blueprint, request, jsonify
+from models.database import get_db_connection
+from models.schema import archive_links_available
+from utils.auth import admin_required
+from utils.audit import log_event, get_audit_stats
+from utils.pagination import keyset_clause, page_from_rows, cached_count, page_args
+
+record_bp = Blueprint('record', __name__)
+
+# 记录用户操作
+def log_operation(user_id, data_id, operation_type):
+    """
+    记录用户操作的辅助函数（入队后由后台线程批量写入 Record）
+    """
+    return log_event(operation_type, user_id, data_id)
+
+def _operation_filters(user_id, operation_type, start_time, end_time):
+    """构建 Record 筛选条件，返回 (where 片段, 参数)"""
+    where = ""
+    params = []
+    if user_id:
+        where += " AND r.UserID = %s"
+        params.append(user_id)
+    if operation_type:
+        where += " AND r.OprateType = %s"
+        params.append(operation_type)
+    if start_time:
+        where += " AND r.DateTime_u >= %s"
+        params.append(start_time)
+    if end_time:
+        where += " AND r.DateTime_u <= %s"
+        params.append(end_time)
+    return where, params
+
+def _count_operations(cursor, filters, params):
+    """统计 Record 条数（LEFT JOIN 的都是主键，不影响行数，因此只统计 Record 本身）"""
+    cursor.execute("SELECT COUNT(*) as total FROM Record r WHERE 1=1" + filters, params)
+    return cursor.fetchone()['total']
+
+# 查询操作记录
+@record_bp.route('/operations', methods=['GET'])
+@admin_required
+def get_operations():
+    """
+    查询操作记录（管理员功能）
+    参数: user_id, operation_type, start_time, end_time
+    分页: page, per_page；或游标模式 cursor（首页传空或 mode=cursor）, with_total=1
+    """
+    try:
+        user_id = request.args.get('user_id', type=int)
+        operation_type = request.args.get('operation_type')
+        start_time = request.args.get('start_time')
+        end_time = request.args.get('end_time')
+        try:
+            page, per_page = page_args(request.args)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        # 构建查询
+        # 归档后 Record.DataID 被外键置空，原 DataID 在 ArchivedDataID 中（迁移 v8）
+        data_id_col = "COALESCE(r.DataID, r.ArchivedDataID)" if archive_links_available() else "r.DataID"
+        query = f"""
+        SELECT r.RecordID, r.OprateType, r.DateTime_u, r.UserID, {data_id_col} AS DataID, r.DataID IS NULL AS Archived,
+               u.Name_u as UserName, u.Email as UserEmail,
+               d.ShipID, d.DateTime_u as DataTime
+        FROM Record r
+        LEFT JOIN User_u u ON r.UserID = u.UserID
+        LEFT JOIN Data_u d ON r.DataID = d.DataID
+        WHERE 1=1
+        """
+        filters, params = _operation_filters(user_id, operation_type, start_time, end_time)
+        query += filters
+
+        cursor_token = request.args.get('cursor')
+        keyset = cursor_token is not None or request.args.get('mode') == 'cursor'
+        if keyset:
+            # 游标模式：按 (DateTime_u, RecordID) 翻页，总数可选且走缓存
+            try:
+                where, kparams, order, direction = keyset_clause('r.DateTime_u', 'r.RecordID', cursor_token or None)
+            except ValueError as e:
+                cursor.close()
+                conn.close()
+                return jsonify({"success": False, "error": str(e)}), 400
+            total = None
+            if request.args.get('with_total') == '1':
+                total = cached_count(('Record', filters, tuple(params)),
+                                     lambda: _count_operations(cursor, filters, params))
+            cursor.execute(query + where + order + " LIMIT %s", params + kparams + [per_page + 1])
+            operations, next_cursor, prev_cursor = page_from_rows(cursor.fetchall(), per_page, direction,
+                                                                  bool(cursor_token), 'DateTime_u', 'RecordID')
+        else:
+            # 页码模式（兼容旧前端）
+            total = _count_operations(cursor, filters, params)
+            query += " ORDER BY r.DateTime_u DESC LIMIT %s OFFSET %s"
+            params.extend([per_page, (page - 1) * per_page])
+            cursor.execute(query, params)
+            operations = cursor.fetchall()
+
+        # 格式化返回数据
+        formatted_operations = []
+        for op in operations:
+            formatted_operations.append({
+                'record_id': op['RecordID'],
+                'operation_type': op['OprateType'],
+                'datetime': op['DateTime_u'].strftime('%Y-%m-%d %H:%M:%S') if op['DateTime_u'] else None,
+                'user_id': op['UserID'],
+                'user_name': op['UserName'],
+                'user_email': op['UserEmail'],
+                'data_id': op['DataID'],
+                'archived': bool(op['Archived']) and op['DataID'] is not None,
+                'ship_id': op['ShipID'],
+                'data_time': op['DataTime'].strftime('%Y-%m-%d %H:%M:%S') if op['DataTime'] else None
+            })
+        
+        cursor.close()
+        conn.close()
+        
+        if keyset:
+            pagination = {
+                "per_page": per_page,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor
+            }
+            if total is not None:
+                pagination["total"] = total
+        else:
+            pagination = {
+                "page": page,
+                "per_page": per_page,
+                "total": total,
+                "pages": (total + per_page - 1) // per_page
+            }
+
+        return jsonify({
+            "success": True,
+            "data": formatted_operations,
+            "pagination": pagination
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# 获取操作统计
+@record_bp.route('/stats', methods=['GET'])
+@admin_required
+def get_operation_stats():
+    """
+    获取操作统计信息（管理员功能）
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        # 按操作类型统计
+        cursor.execute("""
+            SELECT OprateType, COUNT(*) as count 
+            FROM Record 
+            GROUP BY OprateType
+        """)
+        type_stats = cursor.fetchall()
+        
+        # 按用户统计
+        cursor.execute("""
+            SELECT u.Name_u as Name, u.Email as Email, COUNT(*) as operation_count
+            FROM Record r
+            JOIN User_u u ON r.UserID = u.UserID
+            GROUP BY r.UserID
+            ORDER BY operation_count DESC
+            LIMIT 10
+        """)
+        user_stats = cursor.fetchall()
+        
+        # 最近活动
+        cursor.execute("""
+            SELECT COUNT(*) as recent_activity
+            FROM Record 
+            WHERE DateTime_u >= DATE_SUB(NOW(), INTERVAL 7 DAY)
+        """)
+        recent_activity = cursor.fetchone()['recent_activity']
+        
+        cursor.close()
+        conn.close()
+        
+        return jsonify({
+            "success": True,
+            "stats": {
+                "by_operation_type": type_stats,
+                "top_users": user_stats,
+                "recent_activity_7_days": recent_activity
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# 清理旧记录
+@record_bp.route('/cleanup', methods=['POST'])
+@admin_required
+def cleanup_old_records():
+    """
+    清理超过一定时间的操作记录（管理员功能）
+    """
+    try:
+        data = request.json
+        days_to_keep = data.get('days_to_keep', 90)  # 默认保留90天
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        delete_query = "DELETE FROM Record WHERE DateTime_u < DATE_SUB(NOW(), INTERVAL %s DAY)"
+        cursor.execute(delete_query, (days_to_keep,))
+        
+        deleted_count = cursor.rowcount
+        conn.commit()
+        
+        cursor.close()
+        conn.close()
+        
+        return jsonify({
+            "success": True,
+            "message": f"成功清理 {deleted_count} 条旧记录",
+            "deleted_count": deleted_count
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# 操作记录异步写入状态
+@record_bp.route('/audit-stats', methods=['GET'])
+@admin_required
+def audit_stats():
+    """
+    异步写入队列的计数（管理员功能）
+    """
+    return jsonify({"success": True, "stats": get_audit_stats()})
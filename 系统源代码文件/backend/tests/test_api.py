@@ -1,30 +1,112 @@
-import requests
-
-BASE = 'http://127.0.0.1:5000'
-
-# Note: these tests are integration tests and assume the server is running.
-
-def test_health():
-    r = requests.get(BASE)
-    assert r.status_code == 200
-
-def test_ships():
-    r = requests.get(BASE + '/api/data/ships')
-    assert r.status_code == 200
-    j = r.json()
-    assert 'ships' in j
-
-def test_import_csv():
-    csv_path = 'tests/sample_import.csv'
-    with open(csv_path, 'rb') as fh:
-        files = {'file': ('sample_import.csv', fh, 'text/csv')}
-        headers = {'User-Role': '1'}
-        r = requests.post(BASE + '/api/data/import', files=files, headers=headers)
-        assert r.status_code == 200
-        j = r.json()
-        assert 'imported' in j
-
-if __name__ == '__main__':
-    test_health()
-    test_ships()
-    test_import_csv()
+import requests
+from utils.auth import issue_token
+
+BASE = 'http://127.0.0.1:5000'
+
+# Note: these tests are integration tests and assume the server is running.
+
+def admin_headers():
+    # tokens are stateless, so the test can sign an admin token with the shared secret
+    # (run the server and pytest with the same AUTH_SECRET_KEY environment variable)
+    return {'Authorization': 'Bearer ' + issue_token(1, 1)}
+
+def test_health():
+    r = requests.get(BASE)
+    assert r.status_code == 200
+
+def test_ships():
+    r = requests.get(BASE + '/api/data/ships')
+    assert r.status_code == 200
+    j = r.json()
+    assert 'ships' in j
+
+def test_ships_etag():
+    r = requests.get(BASE + '/api/data/ships')
+    tag = r.headers.get('ETag')
+    assert tag
+    r = requests.get(BASE + '/api/data/ships', headers={'If-None-Match': tag})
+    assert r.status_code == 304
+
+def test_admin_requires_token():
+    r = requests.get(BASE + '/api/data/list')
+    assert r.status_code == 401
+    r = requests.get(BASE + '/api/data/list', headers={'Authorization': 'Bearer ' + issue_token(1, 0)})
+    assert r.status_code == 403
+
+def test_list_rejects_bad_paging():
+    for params in ({'per_page': 0}, {'per_page': -5}, {'page': 0}, {'mode': 'cursor', 'per_page': -1}):
+        r = requests.get(BASE + '/api/data/list', params=params, headers=admin_headers())
+        assert r.status_code == 400
+    r = requests.get(BASE + '/api/record/operations', params={'per_page': 0}, headers=admin_headers())
+    assert r.status_code == 400
+
+def test_db_stats_require_admin():
+    for path in ('/api/db/pool', '/api/db/nearby-index'):
+        assert requests.get(BASE + path).status_code == 401
+        assert requests.get(BASE + path, headers={'Authorization': 'Bearer ' + issue_token(1, 0)}).status_code == 403
+    r = requests.get(BASE + '/api/db/pool', headers=admin_headers())
+    assert r.status_code == 200
+    assert 'pool' in r.json()
+
+def test_register_ignores_role():
+    import uuid
+    email = 'role-%s@example.com' % uuid.uuid4().hex[:12]
+    r = requests.post(BASE + '/api/user/register', json={'email': email, 'password': 'pw123456', 'name': 'x', 'role': 1})
+    assert r.status_code == 200
+    r = requests.post(BASE + '/api/user/login', json={'email': email, 'password': 'pw123456'})
+    assert r.status_code == 200
+    assert r.json()['user']['role'] == 0
+    r = requests.get(BASE + '/api/data/list', headers={'Authorization': 'Bearer ' + r.json()['token']})
+    assert r.status_code == 403
+
+def test_import_csv():
+    csv_path = 'tests/sample_import.csv'
+    with open(csv_path, 'rb') as fh:
+        files = {'file': ('sample_import.csv', fh, 'text/csv')}
+        r = requests.post(BASE + '/api/data/import', files=files, headers=admin_headers())
+        assert r.status_code == 200
+        j = r.json()
+        assert 'imported' in j
+
+def test_import_csv_job():
+    import time
+    with open('tests/sample_import.csv', 'rb') as fh:
+        files = {'file': ('sample_import.csv', fh, 'text/csv')}
+        r = requests.post(BASE + '/api/data/import', params={'mode': 'job'}, files=files, headers=admin_headers())
+    assert r.status_code == 202
+    job_id = r.json()['job_id']
+    for _ in range(50):
+        job = requests.get(BASE + '/api/data/import/' + job_id, headers=admin_headers()).json()['job']
+        if job['status'] in ('succeeded', 'failed', 'cancelled'):
+            break
+        time.sleep(0.2)
+    assert job['status'] == 'succeeded'
+    assert 'failed' in job
+
+def test_ocean_grid_rollup_matches_raw():
+    # rollup-backed and raw aggregates must agree on aligned requests
+    params = {'resolution': 1.0}
+    a = requests.get(BASE + '/api/data/ocean-grid', params=params).json()
+    b = requests.get(BASE + '/api/data/ocean-grid', params=dict(params, source='raw')).json()
+    assert b['source'] == 'raw'
+    key = lambda c: (c['lat'], c['lng'])
+    assert [(key(c), c['count']) for c in sorted(a['cells'], key=key)] == \
+           [(key(c), c['count']) for c in sorted(b['cells'], key=key)]
+
+def test_ocean_grid_unaligned_bbox_uses_raw():
+    # bbox edges inside a rollup cell would count partially covered edge cells in full
+    params = {'resolution': 1.0, 'min_lat': 20.05, 'max_lat': 25, 'min_lng': 110, 'max_lng': 125}
+    j = requests.get(BASE + '/api/data/ocean-grid', params=params).json()
+    assert j['source'] == 'raw'
+
+def test_ocean_grid_rejects_too_many_cells():
+    r = requests.get(BASE + '/api/data/ocean-grid', params={'resolution': 0.01})
+    assert r.status_code == 400
+    r = requests.get(BASE + '/api/data/ocean-grid',
+                     params={'resolution': 0.01, 'min_lat': 20, 'max_lat': 21, 'min_lng': 110, 'max_lng': 111})
+    assert r.status_code == 200
+
+if __name__ == '__main__':
+    test_health()
+    test_ships()
+    test_import_csv()
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('mysql.connector')
+
+# 以下用例不需要 MySQL：在独立的进程中计算 ETag，模拟多个工作进程和重启
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_ETAG = '''
+import sys
+from flask import Flask
+from config import Config
+Config.DATA_VERSION_FILE = sys.argv[1]
+from utils.http_cache import request_etag
+with Flask(__name__).test_request_context('/api/data/ships?b=2&a=1&empty='):
+    print(request_etag())
+'''
+
+_BUMP = '''
+import sys
+from config import Config
+Config.DATA_VERSION_FILE = sys.argv[1]
+from utils.http_cache import bump_data_version
+bump_data_version()
+'''
+
+
+def _run(script, path):
+    out = subprocess.run([sys.executable, '-c', script, path], cwd=BACKEND,
+                         capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1] if out.stdout.strip() else ''
+
+
+def test_etag_same_across_processes(tmp_path):
+    path = str(tmp_path / 'data_version')
+    # 还没有写入（版本文件不存在）
+    first = _run(_ETAG, path)
+    assert first and _run(_ETAG, path) == first
+
+    # 另一个进程（命令行工具）写入后，各进程签发同一个新的 ETag
+    _run(_BUMP, path)
+    second = _run(_ETAG, path)
+    assert second != first
+    assert _run(_ETAG, path) == second
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('mysql.connector')
+
+from utils.importer import convert_row, natural_key, dedupe_batch, parse_time
+
+# 以下用例不需要 MySQL：只检查 CSV 行的转换和自然键
+
+def _row(**kw):
+    row = {'ship_id': '1', 'datetime': '2003-9-22 6', 'lat': '21.8', 'long': '121.2', 'sea_temp': '29.4',
+           'wave_height': '1.5', 'wave_period': '7.0', 'surge_direction': 'N', 'surge_height': '2.0'}
+    row.update(kw)
+    return row
+
+def test_converted_csv_time():
+    # 转换后的 CSV 中的时间不补零、只有小时
+    params = convert_row(_row())
+    assert params[1] == datetime(2003, 9, 22, 6)
+    assert parse_time('2003-09-22 06:00') == parse_time('2003-9-22 6')
+    with pytest.raises(ValueError):
+        convert_row(_row(datetime='22/09/2003'))
+
+def test_natural_key_matches_db_row():
+    # 从 Data_u 读回的行（datetime、DECIMAL 转 float）与 CSV 行的自然键相同
+    params = convert_row(_row())
+    assert natural_key(params) == natural_key((1, datetime(2003, 9, 22, 6, 0, 0), 21.8, 121.2))
+
+def test_dedupe_batch_equal_times_written_differently():
+    good = [(1, convert_row(_row())), (2, convert_row(_row(datetime='2003-09-22 06:00:00', sea_temp='30')))]
+    rows, dropped = dedupe_batch(good, keep_last=True)
+    assert dropped == 1
+    assert [(idx, params[4]) for idx, params, _ in rows] == [(2, 30.0)]
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('mysql.connector')
+
+from models.nearby_index import NearbyIndex, _Points, haversine_km
+
+# 以下用例不需要 MySQL：_fetch 换成从内存中的 table（DataID -> 行）读取
+
+T0 = datetime(2025, 11, 19)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    rows = {}
+
+    def fetch(self, where='', params=()):
+        picked = [rows[i] for i in params if i in rows] if params else list(rows.values())
+        return _Points.from_rows(picked)
+
+    monkeypatch.setattr(NearbyIndex, '_fetch', fetch)
+    return rows
+
+
+def _add(table, data_id, ship_id, t, lat, lon):
+    table[data_id] = (data_id, ship_id, t, lat, lon)
+
+
+def _index(table, **kw):
+    idx = NearbyIndex(kw.get('cell_deg', 0.5), kw.get('slice_hours', 6), kw.get('delta_max', 1000))
+    idx.build()
+    return idx
+
+
+def _ids(idx, lat, lon, start, end, radius_km, per_ship=False):
+    results, _ = idx.query(lat, lon, start, end, radius_km=radius_km, per_ship=per_ship, limit=10 ** 6)
+    return sorted(r['data_id'] for r in results)
+
+
+def test_cell_boundaries(table):
+    # 恰好落在网格边界上的点和边界两侧的点都能查到
+    _add(table, 1, 1, T0, 30.0, 120.0)
+    _add(table, 2, 2, T0, 29.999, 119.999)
+    _add(table, 3, 3, T0, 30.5, 120.5)
+    idx = _index(table)
+    assert _ids(idx, 30.0, 120.0, T0, T0, 1) == [1, 2]
+    assert _ids(idx, 30.25, 120.25, T0, T0, 40) == [1, 2, 3]
+
+
+def test_time_slice_edges(table):
+    # 时间片边界（6 小时）两侧，时间窗两端为闭区间
+    edge = T0 + timedelta(hours=6)
+    _add(table, 1, 1, edge - timedelta(seconds=1), 30.0, 120.0)
+    _add(table, 2, 2, edge, 30.0, 120.0)
+    _add(table, 3, 3, edge + timedelta(hours=6), 30.0, 120.0)
+    idx = _index(table)
+    assert _ids(idx, 30.0, 120.0, T0, edge, 1) == [1, 2]
+    assert _ids(idx, 30.0, 120.0, edge, edge, 1) == [2]
+    assert _ids(idx, 30.0, 120.0, edge + timedelta(seconds=1), edge + timedelta(hours=6), 1) == [3]
+
+
+def test_antimeridian_and_poles(table):
+    _add(table, 1, 1, T0, 10.0, 179.99)
+    _add(table, 2, 2, T0, 10.0, -179.99)
+    _add(table, 3, 3, T0, 89.95, 0.0)
+    _add(table, 4, 4, T0, -90.0, 45.0)
+    idx = _index(table)
+    assert _ids(idx, 10.0, -179.995, T0, T0, 5) == [1, 2]
+    assert _ids(idx, 10.0, 179.995, T0, T0, 5) == [1, 2]
+    # 跨过北极点约 11 公里
+    assert _ids(idx, 89.95, 180.0, T0, T0, 15) == [3]
+    # 南极点（纬度格被夹到最后一行以内）
+    assert _ids(idx, -89.99, -135.0, T0, T0, 5) == [4]
+
+
+def test_matches_brute_force(table):
+    rng = np.random.default_rng(0)
+    for i in range(1, 3001):
+        _add(table, i, int(rng.integers(1, 50)), T0 + timedelta(minutes=int(rng.integers(0, 3 * 24 * 60))),
+             float(rng.uniform(-89, 89)), float(rng.uniform(-180, 180)))
+    idx = _index(table)
+    start, end = T0 + timedelta(hours=10), T0 + timedelta(hours=40)
+    points = _Points.from_rows(list(table.values()))
+    t0, t1 = (int(v) for v in np.array([start, end], dtype='datetime64[s]').astype(np.int64))
+    for lat, lon, radius in ((0, 0, 1500), (60, 179, 2000), (-80, -170, 2000)):
+        dist = haversine_km(lat, lon, points.lat, points.lon)
+        hit = (dist <= radius) & (points.t >= t0) & (points.t <= t1)
+        assert _ids(idx, lat, lon, start, end, radius) == sorted(int(i) for i in points.data_id[hit])
+
+
+def test_knn_expands_radius_and_dedupes_ships(table):
+    _add(table, 1, 7, T0, 30.0, 120.01)
+    _add(table, 2, 7, T0, 30.0, 120.02)
+    _add(table, 3, 8, T0, 35.0, 125.0)
+    idx = _index(table)
+    results, searched = idx.query(30.0, 120.0, T0, T0, k=2)
+    assert [r['data_id'] for r in results] == [1, 3]
+    assert searched > 500
+    results, _ = idx.query(30.0, 120.0, T0, T0, k=2, per_ship=False)
+    assert [r['data_id'] for r in results] == [1, 2]
+
+
+def test_pending_insert_then_delete(table):
+    _add(table, 1, 1, T0, 30.0, 120.0)
+    idx = _index(table, delta_max=1)
+    _add(table, 2, 2, T0, 30.001, 120.001)
+    idx.mark_changed([2])
+    assert _ids(idx, 30.0, 120.0, T0, T0, 1) == [1]      # 应用前不可见（查询不读库）
+    assert idx.apply_pending() == 1
+    assert _ids(idx, 30.0, 120.0, T0, T0, 1) == [1, 2]
+    del table[2]
+    table[1] = (1, 1, T0, 31.0, 121.0)                   # 修改位置
+    idx.mark_changed([1, 2])
+    idx.apply_pending()                                  # 超过 delta_max，合并进主数组
+    assert _ids(idx, 30.0, 120.0, T0, T0, 1) == []
+    assert _ids(idx, 31.0, 121.0, T0, T0, 1) == [1]
+    assert idx.get_stats()['points'] == 1
+    assert idx.get_stats()['delta'] == 0
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+pytest.importorskip('mysql.connector')
+pytest.importorskip('flask_cors')
+
+from config import Config
+from models import snapshot
+
+# 以下用例不需要运行中的服务和 MySQL（与 test_api.py 不同）：
+# 读接口查询由 tests/sample_import.csv 生成的 SQLite 快照
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    saved = (Config.READ_ENGINE, Config.READ_SNAPSHOT_DIR)
+    Config.READ_ENGINE = 'sqlite'
+    Config.READ_SNAPSHOT_DIR = str(tmp_path_factory.mktemp('snapshot'))
+    assert snapshot.build('sqlite', snapshot.csv_batches('tests', [0])) == 3
+    from app import app
+    yield app.test_client()
+    Config.READ_ENGINE, Config.READ_SNAPSHOT_DIR = saved
+
+def test_snapshot_vessel_tracks(client):
+    j = client.get('/api/data/vessel-tracks', query_string={'ship_id': 101}).get_json()
+    assert j['count'] == 2
+    assert j['data'][0]['datetime'] == '2025-11-19 08:00:00'
+
+def test_vessel_tracks_simplify_params(client):
+    for params in ({'zoom': 2000}, {'zoom': -1}, {'tolerance': -1}, {'tolerance': 0}, {'tolerance': 'nan'}, {'tolerance': 'inf'}):
+        r = client.get('/api/data/vessel-tracks', query_string=dict(params, ship_id=101))
+        assert r.status_code == 400
+    for params in ({'zoom': 0}, {'zoom': 22}, {'tolerance': 0.01}):
+        j = client.get('/api/data/vessel-tracks', query_string=dict(params, ship_id=101)).get_json()
+        assert j['success'] and j['original_count'] == 2
+
+def test_snapshot_ocean_environment(client):
+    params = {'min_lat': 30.15, 'max_lat': 30.35, 'min_lng': 120.15, 'max_lng': 120.35}
+    j = client.get('/api/data/ocean-environment', query_string=params).get_json()
+    assert j['count'] == 2
+
+def test_snapshot_aggregates(client):
+    j = client.get('/api/data/ship-stats', query_string={'ship_id': 101, 'granularity': 'hour'}).get_json()
+    assert j['source'] == 'raw'
+    assert [(b['bucket'], b['count']) for b in j['buckets']] == [('2025-11-19 08:00:00', 2)]
+    j = client.get('/api/data/ocean-grid', query_string={'resolution': 1.0}).get_json()
+    assert sum(c['count'] for c in j['cells']) == 3
+
+def test_snapshot_refresh_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'READ_SNAPSHOT_DIR', str(tmp_path))
+    with snapshot.refresh_lock() as locked:
+        assert locked
+        with snapshot.refresh_lock(blocking=False) as other:
+            assert not other
+    with snapshot.refresh_lock(blocking=False) as locked:
+        assert locked
+
+def test_snapshot_refreshers_do_not_overlap(tmp_path, monkeypatch):
+    # 多个工作进程各有一个后台刷新线程，同一时刻只能有一个在重建
+    import time
+    monkeypatch.setattr(Config, 'READ_SNAPSHOT_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'READ_ENGINE', 'sqlite')
+    runs = []
+
+    def fake_refresh(engine=None):
+        start = time.monotonic()
+        time.sleep(0.1)
+        open(os.path.join(str(tmp_path), 'vessel.sqlite'), 'w').close()
+        runs.append((start, time.monotonic()))
+        return 0
+
+    monkeypatch.setattr(snapshot, 'refresh', fake_refresh)
+    refreshers = [snapshot.SnapshotRefresher(0.05) for _ in range(4)]
+    for r in refreshers:
+        r.start()
+    time.sleep(0.8)
+    for r in refreshers:
+        r.stop()
+    runs.sort()
+    assert runs
+    assert all(prev[1] <= cur[0] for prev, cur in zip(runs, runs[1:]))
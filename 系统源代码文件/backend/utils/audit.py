@@ -0,0 +1,239 @@
+"""
+异步批量写入操作记录（Record 表）
+
+- log_event() 只把事件放入进程内队列，不访问数据库
+- 后台线程在攒够 Config.AUDIT_BATCH_SIZE 条或距首条超过 Config.AUDIT_FLUSH_INTERVAL 秒时，
+  用一条多行 INSERT 写入；UserID 在写入时批量校验，无效的置为 NULL
+- 数据库不可用时事件追加到本地溢出文件（JSON Lines），恢复后补写
+- shutdown() 在进程退出时停止线程并写完剩余事件
+- stats() 返回 queued / flushed / dropped / spilled / replayed 计数
+"""
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import mysql.connector
+from config import Config
+from models.database import get_db_connection
+
+INSERT_RECORD_SQL = "INSERT INTO Record (OprateType, DateTime_u, UserID, DataID) VALUES (%s, %s, %s, %s)"
+_DT_FMT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def _to_int(v):
+    try:
+        return int(v)
+    except Exception:
+        return None
+
+
+class AuditWriter:
+
+    def __init__(self, batch_size, flush_interval, queue_size, spill_file):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_file = spill_file
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._counters = {'queued': 0, 'flushed': 0, 'dropped': 0, 'spilled': 0, 'replayed': 0, 'failed_flushes': 0}
+
+    def _inc(self, key, n=1):
+        with self._counter_lock:
+            self._counters[key] += n
+
+    def start(self):
+        """启动后台线程（幂等）"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def log(self, op_type, user_id, data_id, when=None):
+        """入队一条操作记录；队列满时丢弃并返回 False"""
+        if self._thread is None:
+            self.start()
+        event = (op_type, when or datetime.now(), _to_int(user_id), _to_int(data_id))
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._inc('dropped')
+            print(f"操作记录队列已满，丢弃: {event}")
+            return False
+        self._inc('queued')
+        return True
+
+    def _run(self):
+        batch = []
+        first_at = None
+        while not self._stop.is_set():
+            timeout = self.flush_interval if first_at is None else max(0.0, first_at + self.flush_interval - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+                if first_at is None:
+                    first_at = time.monotonic()
+            except queue.Empty:
+                pass
+            if batch and (len(batch) >= self.batch_size or time.monotonic() - first_at >= self.flush_interval):
+                self._write(batch)
+                batch = []
+                first_at = None
+        if batch:
+            self._write(batch)
+
+    def _drain(self):
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def flush(self):
+        """同步写入当前队列中的全部事件"""
+        events = self._drain()
+        for i in range(0, len(events), self.batch_size):
+            self._write(events[i:i + self.batch_size])
+
+    def shutdown(self, timeout=5):
+        """停止后台线程并写完剩余事件（进程退出时调用）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _write(self, events):
+        """写入一批事件；数据库不可用则溢出到本地文件"""
+        with self._write_lock:
+            try:
+                conn = get_db_connection()
+            except Exception as e:
+                print(f"写入操作记录失败，转存本地文件: {e}")
+                self._inc('failed_flushes')
+                self._spill(events)
+                return
+            try:
+                cur = conn.cursor()
+                self._insert(conn, cur, events)
+                self._inc('flushed', len(events))
+                try:
+                    self._replay_spill(conn, cur)
+                except Exception as e:
+                    conn.rollback()
+                    print(f"补写溢出文件中的操作记录失败: {e}")
+                cur.close()
+            except Exception as e:
+                print(f"写入操作记录失败，转存本地文件: {e}")
+                self._inc('failed_flushes')
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                self._spill(events)
+            finally:
+                conn.close()
+
+    def _insert(self, conn, cur, events):
+        """
+        多行 INSERT 写入并提交。
+        违反约束（如 DataID 已被删除）时逐条重试，无法写入的事件计为 dropped。
+        """
+        rows = self._resolve_users(cur, events)
+        try:
+            cur.executemany(INSERT_RECORD_SQL, rows)
+            conn.commit()
+            return
+        except mysql.connector.IntegrityError:
+            conn.rollback()
+        for row in rows:
+            try:
+                cur.execute(INSERT_RECORD_SQL, row)
+            except mysql.connector.IntegrityError as e:
+                print(f"操作记录违反约束，丢弃 {row}: {e}")
+                self._inc('dropped')
+        conn.commit()
+
+    def _resolve_users(self, cur, events):
+        """一次查询校验本批全部 UserID，不存在的置为 NULL"""
+        uids = {e[2] for e in events if e[2] is not None}
+        valid = set()
+        if uids:
+            placeholders = ', '.join(['%s'] * len(uids))
+            cur.execute(f"SELECT UserID FROM User_u WHERE UserID IN ({placeholders})", tuple(uids))
+            valid = {row[0] for row in cur.fetchall()}
+        return [(op, when, uid if uid in valid else None, did) for op, when, uid, did in events]
+
+    def _spill(self, events):
+        """把事件追加到本地溢出文件"""
+        try:
+            d = os.path.dirname(self.spill_file)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            with open(self.spill_file, 'a', encoding='utf-8') as f:
+                for op, when, uid, did in events:
+                    f.write(json.dumps({'op': op, 'time': when.strftime(_DT_FMT), 'user_id': uid, 'data_id': did}) + '\n')
+            self._inc('spilled', len(events))
+        except Exception as e:
+            print(f"操作记录溢出文件写入失败，丢弃 {len(events)} 条: {e}")
+            self._inc('dropped', len(events))
+
+    def _replay_spill(self, conn, cur):
+        """补写溢出文件中的事件，全部写入后删除文件"""
+        if not os.path.exists(self.spill_file):
+            return
+        events = []
+        with open(self.spill_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    e = json.loads(line)
+                    events.append((e['op'], datetime.strptime(e['time'], _DT_FMT), e['user_id'], e['data_id']))
+                except Exception:
+                    self._inc('dropped')
+        os.remove(self.spill_file)
+        for i in range(0, len(events), self.batch_size):
+            try:
+                self._insert(conn, cur, events[i:i + self.batch_size])
+            except Exception:
+                # 未写入的部分重新落盘，下次再补
+                self._spill(events[i:])
+                self._inc('spilled', -len(events[i:]))
+                raise
+            self._inc('replayed', len(events[i:i + self.batch_size]))
+
+    def stats(self):
+        with self._counter_lock:
+            s = dict(self._counters)
+        s['pending'] = self._queue.qsize()
+        s['spill_file_exists'] = os.path.exists(self.spill_file)
+        return s
+
+
+audit_writer = AuditWriter(
+    batch_size=Config.AUDIT_BATCH_SIZE,
+    flush_interval=Config.AUDIT_FLUSH_INTERVAL,
+    queue_size=Config.AUDIT_QUEUE_SIZE,
+    spill_file=Config.AUDIT_SPILL_FILE
+)
+
+
+def log_event(op_type, user_id, data_id):
+    """记录一次用户操作（异步），返回是否成功入队"""
+    return audit_writer.log(op_type, user_id, data_id)
+
+
+def shutdown_audit():
+    audit_writer.shutdown()
+
+
+def get_audit_stats():
+    return audit_writer.stats()
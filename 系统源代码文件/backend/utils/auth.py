@@ -1,3 +1,97 @@
-"""
-工具函数
-"""
\ No newline at end of file
+"""
+工具函数
+
+无状态签名令牌：
+- 登录成功后 issue_token() 签发携带 UserID、Role 和过期时间的令牌（HMAC-SHA256 签名）
+- 请求头 Authorization: Bearer <token>
+- login_required / admin_required 装饰器在进程内校验签名与有效期，不访问数据库，
+  校验通过后将 user_id、role 写入 flask.g
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from functools import wraps
+
+from flask import g, request, jsonify
+from config import Config
+
+ROLE_ADMIN = 1
+
+
+class TokenError(Exception):
+    """令牌缺失、格式错误、签名不符或已过期"""
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(body):
+    if not Config.AUTH_SECRET_KEY:
+        raise RuntimeError('未设置 AUTH_SECRET_KEY')
+    return hmac.new(Config.AUTH_SECRET_KEY.encode('utf-8'), body.encode('ascii'), hashlib.sha256).digest()
+
+
+def issue_token(user_id, role, ttl=None):
+    """签发令牌"""
+    ttl = Config.AUTH_TOKEN_TTL if ttl is None else ttl
+    payload = {'uid': int(user_id), 'role': int(role), 'exp': int(time.time()) + int(ttl)}
+    body = _b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    return body + '.' + _b64encode(_sign(body))
+
+
+def verify_token(token):
+    """校验令牌，返回 payload；失败抛出 TokenError"""
+    try:
+        body, sig = token.split('.', 1)
+        ok = hmac.compare_digest(_b64decode(sig), _sign(body))
+    except Exception:
+        raise TokenError('令牌格式错误')
+    if not ok:
+        raise TokenError('令牌签名无效')
+    try:
+        payload = json.loads(_b64decode(body))
+    except Exception:
+        raise TokenError('令牌格式错误')
+    if payload.get('exp', 0) < time.time():
+        raise TokenError('登录已过期，请重新登录')
+    return payload
+
+
+def _token_from_request():
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        return auth[7:].strip()
+    return None
+
+
+def login_required(admin=False):
+    """
+    校验请求令牌的装饰器；admin=True 时还要求管理员角色
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _token_from_request()
+            if not token:
+                return jsonify({"success": False, "error": "未登录"}), 401
+            try:
+                payload = verify_token(token)
+            except TokenError as e:
+                return jsonify({"success": False, "error": str(e)}), 401
+            if admin and payload.get('role') != ROLE_ADMIN:
+                return jsonify({"success": False, "error": "权限不足"}), 403
+            g.user_id = payload['uid']
+            g.role = payload['role']
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+admin_required = login_required(admin=True)
@@ -0,0 +1,114 @@
+"""
+列式响应格式（可选）
+
+通过 format= 参数或 Accept 头选择：
+- format=columnar / Accept: application/vnd.columnar+json
+    列式 JSON：每个字段一个数组，时间为 epoch 秒，涌浪方向字典编码
+- format=msgpack / Accept: application/x-msgpack（需安装 msgpack）
+    与列式 JSON 结构相同，但数值列为小端序二进制（f32 / i32 / u32），
+    缺测或空值的 f32 为 NaN，字典编码为 int8（-1 表示空）
+默认（format=json）仍返回原来的对象数组。
+
+columns 中每列的类型见 types：epoch_s、f32、i32、dict。
+"""
+import calendar
+import sys
+from array import array
+
+from flask import request, jsonify, Response
+
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+ROWS = 'json'
+COLUMNAR = 'columnar'
+MSGPACK = 'msgpack'
+
+COLUMNAR_MIME = 'application/vnd.columnar+json'
+MSGPACK_MIMES = ('application/x-msgpack', 'application/msgpack')
+
+# 二进制列的 array 类型码（f/i/I 在主流平台均为 4 字节）
+_BINARY_CODES = {'f32': 'f', 'i32': 'i', 'epoch_s': 'I'}
+
+
+def negotiate_format():
+    """返回 ROWS / COLUMNAR / MSGPACK；format= 参数优先于 Accept 头，无法识别时返回 None"""
+    fmt = request.args.get('format')
+    if fmt:
+        return fmt if fmt in (ROWS, COLUMNAR, MSGPACK) else None
+    accept = request.headers.get('Accept', '')
+    if any(m in accept for m in MSGPACK_MIMES):
+        return MSGPACK
+    if COLUMNAR_MIME in accept:
+        return COLUMNAR
+    return ROWS
+
+
+def _epoch(dt):
+    return calendar.timegm(dt.timetuple()) if dt is not None else None
+
+
+def _float(v):
+    return float(v) if v is not None else None
+
+
+def to_columns(rows, spec):
+    """
+    rows 为数据库字典行，spec 为 [(输出列名, 行字段名, 类型)]。
+    返回 (columns, types)，columns 中的值为 Python 列表（字典编码列为 {dict, codes}）。
+    """
+    columns = {}
+    types = {}
+    for name, key, kind in spec:
+        values = [r[key] for r in rows]
+        if kind == 'epoch_s':
+            columns[name] = [_epoch(v) for v in values]
+        elif kind == 'f32':
+            columns[name] = [_float(v) for v in values]
+        elif kind == 'i32':
+            columns[name] = [int(v) if v is not None else None for v in values]
+        elif kind == 'dict':
+            dictionary = sorted({v for v in values if v is not None})
+            index = {v: i for i, v in enumerate(dictionary)}
+            columns[name] = {'dict': dictionary, 'codes': [index[v] if v is not None else -1 for v in values]}
+        else:
+            raise ValueError(f'未知的列类型: {kind}')
+        types[name] = kind
+    return columns, types
+
+
+def _pack(values, code, fill):
+    arr = array(code, [fill if v is None else v for v in values])
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _binary_columns(columns, types):
+    out = {}
+    for name, values in columns.items():
+        kind = types[name]
+        if kind == 'dict':
+            out[name] = {'dict': values['dict'], 'codes': _pack(values['codes'], 'b', -1)}
+        else:
+            out[name] = _pack(values, _BINARY_CODES[kind], float('nan') if kind == 'f32' else 0)
+    return out
+
+
+def columnar_response(rows, spec, fmt, **meta):
+    """按 fmt 输出列式 JSON 或 MessagePack；meta 为附加的顶层字段（count、pagination 等）"""
+    columns, types = to_columns(rows, spec)
+    body = {'success': True, 'format': fmt, 'count': len(rows)}
+    body.update(meta)
+    body['types'] = types
+    if fmt == MSGPACK:
+        if msgpack is None:
+            return jsonify({"success": False, "error": "服务器未安装 msgpack，请使用 format=columnar"}), 406
+        body['columns'] = _binary_columns(columns, types)
+        return Response(msgpack.packb(body, use_bin_type=True), mimetype=MSGPACK_MIMES[0])
+    body['columns'] = columns
+    resp = jsonify(body)
+    resp.mimetype = COLUMNAR_MIME
+    return resp
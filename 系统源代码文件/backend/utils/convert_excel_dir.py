@@ -1,249 +1,500 @@
-import os
-import sys
-import argparse
-import json
-
-try:
-    import pandas as pd
-except Exception:
-    pd = None
-
-# 目标字段
-TARGET_FIELDS = ['ship_id', 'datetime', 'lat', 'long', 'sea_temp', 'wave_height', 'wave_period', 'surge_direction', 'surge_height']
-
-# 可能的源字段名（包含英文和常见中文变体）
-SOURCE_CANDIDATES = {
-    'ship_id': ['SIGN_SHIP', 'ship_id', 'ship', '船舶', '船号', '编号'],
-    'datetime': ['YEAR-MONTH-DAY', 'datetime', 'date', 'time', '时间', '日期', '观测时间'],
-    'lat': ['LATITUDE', 'lat', '纬度'],
-    'long': ['LONGITUDE', 'long', 'lon', '经度'],
-    'sea_temp': ['SEA_TEMP', 'sea_temp', 'sea temperature', '海温', '海水温度'],
-    'wave_height': ['WAVE_HEIGHT', 'wave_height', 'wave height', '波高', '浪高'],
-    'wave_period': ['WAVE_PERIOD', 'wave_period', 'wave period', '波周期', '周期'],
-    'surge_direction': ['SURGE_DIRECTION', 'surge_direction', 'surge dir', '方向', '涌向'],
-    'surge_height': ['SURGE_HEIGHT', 'surge_height', 'surge', '涌高', '涌浪高度'],
-}
-
-# 年月日时列候选
-DATE_PART_CANDIDATES = {
-    'year': ['YEAR', 'year', '年', '年份'],
-    'month': ['MONTH', 'month', '月'],
-    'day': ['DAY', 'day', '日'],
-    'hour': ['HOUR', 'hour', '时', '小时'],
-}
-
-
-def find_best_column(df_cols, candidates):
-    cols_lower = {c.lower(): c for c in df_cols}
-    for cand in candidates:
-        if cand.lower() in cols_lower:
-            return cols_lower[cand.lower()]
-    # 尝试部分匹配
-    for cand in candidates:
-        for col in df_cols:
-            if cand.lower() in col.lower() or col.lower() in cand.lower():
-                return col
-    return None
-
-
-def process_file(path, out_dir, date_input_fmt=None, preview=False):
-    if pd is None:
-        raise RuntimeError('pandas 未安装，请先运行: pip install pandas openpyxl xlrd')
-
-    df = pd.read_excel(path)
-    if preview:
-        print(f'File: {path}')
-        print('Columns:', list(df.columns))
-        return
-
-    mapping = {}
-    for tgt in TARGET_FIELDS:
-        src = find_best_column(df.columns, SOURCE_CANDIDATES.get(tgt, []))
-        mapping[tgt] = src
-
-    # ship_id 映射持久化文件
-    map_file = os.path.join(out_dir, 'ship_id_map.json')
-    if os.path.exists(map_file):
-        try:
-            with open(map_file, 'r', encoding='utf-8') as mf:
-                ship_map = json.load(mf)
-        except Exception:
-            ship_map = {}
-    else:
-        ship_map = {}
-    # 计算下一个 id
-    try:
-        existing_ids = [int(v) for v in ship_map.values()]
-        next_id = max(existing_ids) + 1 if existing_ids else 1
-    except Exception:
-        next_id = 1
-
-    # 查找是否存在单独的 YEAR/MONTH/DAY/HOUR 列
-    date_parts_map = {}
-    for part, cands in DATE_PART_CANDIDATES.items():
-        date_parts_map[part] = find_best_column(df.columns, cands)
-
-    out_rows = []
-    for _, r in df.iterrows():
-        out_row = {}
-        # pre-get date parts columns
-        y_col = date_parts_map.get('year')
-        m_col = date_parts_map.get('month')
-        d_col = date_parts_map.get('day')
-        h_col = date_parts_map.get('hour')
-
-        for tgt in TARGET_FIELDS:
-            if tgt == 'datetime':
-                src = mapping.get(tgt)
-                # 如果直接映射到列，但该列恰好是 YEAR/MONTH/DAY/HOUR 其中之一，则优先合成完整 datetime
-                parts_set = {c for c in (y_col, m_col, d_col) if c}
-                if src and src in df.columns and src not in parts_set:
-                    val = r[src]
-                    out_row[tgt] = val
-                else:
-                    # 尝试使用 YEAR/MONTH/DAY[/HOUR] 合成
-                    if y_col and m_col and d_col:
-                        try:
-                            y = r[y_col]
-                            mo = r[m_col]
-                            da = r[d_col]
-                            hr = r[h_col] if (h_col and h_col in df.columns) else 0
-
-                            def to_int(v):
-                                if pd.isna(v):
-                                    return 0
-                                if isinstance(v, int):
-                                    return int(v)
-                                try:
-                                    return int(float(v))
-                                except Exception:
-                                    # 尝试从字符串中提取数字
-                                    s = str(v)
-                                    digits = ''.join(ch for ch in s if ch.isdigit())
-                                    return int(digits) if digits else 0
-
-                            yi = to_int(y)
-                            mi = to_int(mo)
-                            di = to_int(da)
-                            hi = to_int(hr)
-                            val = f"{yi:04d}-{mi}-{di} {hi}"
-                        except Exception:
-                            val = ''
-                    else:
-                        val = ''
-
-                    out_row[tgt] = val
-            else:
-                src = mapping.get(tgt)
-                val = r[src] if (src and src in df.columns) else ''
-
-                # 将 SURGE_DIRECTION 数值映射为 N/S/E/W
-                if tgt == 'surge_direction':
-                    out_val = ''
-                    try:
-                        if isinstance(val, str) and val.strip():
-                            s = val.strip().upper()
-                            if s and s[0] in ('N', 'S', 'E', 'W'):
-                                out_val = s[0]
-                            else:
-                                deg = float(s)
-                                deg = deg % 360
-                                if (deg >= 315 or deg < 45):
-                                    out_val = 'N'
-                                elif deg >= 45 and deg < 135:
-                                    out_val = 'E'
-                                elif deg >= 135 and deg < 225:
-                                    out_val = 'S'
-                                else:
-                                    out_val = 'W'
-                        else:
-                            if pd.isna(val):
-                                out_val = ''
-                            else:
-                                deg = float(val)
-                                if deg <= -90 or deg == -99.9:
-                                    out_val = ''
-                                else:
-                                    deg = deg % 360
-                                    if (deg >= 315 or deg < 45):
-                                        out_val = 'N'
-                                    elif deg >= 45 and deg < 135:
-                                        out_val = 'E'
-                                    elif deg >= 135 and deg < 225:
-                                        out_val = 'S'
-                                    else:
-                                        out_val = 'W'
-                    except Exception:
-                        out_val = ''
-
-                    out_row[tgt] = out_val
-                elif tgt == 'ship_id':
-                    # 将字符 ship_id 映射为整数（持久化到 ship_id_map.json）
-                    orig = ''
-                    try:
-                        if pd.isna(val):
-                            orig = ''
-                        else:
-                            orig = str(val).strip()
-                    except Exception:
-                        orig = str(val).strip() if val is not None else ''
-
-                    if not orig:
-                        out_row[tgt] = ''
-                    else:
-                        if orig in ship_map:
-                            out_row[tgt] = ship_map[orig]
-                        else:
-                            ship_map[orig] = next_id
-                            out_row[tgt] = next_id
-                            next_id += 1
-                else:
-                    out_row[tgt] = val
-
-        out_rows.append(out_row)
-
-    import csv
-    base = os.path.splitext(os.path.basename(path))[0]
-    out_path = os.path.join(out_dir, base + '.csv')
-    with open(out_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=TARGET_FIELDS)
-        writer.writeheader()
-        for row in out_rows:
-            writer.writerow(row)
-
-    print(f'Converted {path} -> {out_path}')
-
-    # 写回 ship_map
-    try:
-        with open(map_file, 'w', encoding='utf-8') as mf:
-            json.dump(ship_map, mf, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
-
-
-def main():
-    parser = argparse.ArgumentParser(description='批量将 data 目录下的 Excel 文件转换为符合导入格式的 CSV')
-    parser.add_argument('data_dir', help='包含 Excel 文件的目录')
-    parser.add_argument('--out', '-o', help='输出目录（默认覆盖 data_dir 下的 converted）', default=None)
-    parser.add_argument('--preview', action='store_true', help='仅预览每个文件的列名')
-    parser.add_argument('--date-input-fmt', help='如果需要，指定输入日期格式，例如 "%Y/%m/%d %H:%M:%S"')
-    args = parser.parse_args()
-
-    data_dir = args.data_dir
-    out_dir = args.out or os.path.join(data_dir, 'converted')
-    os.makedirs(out_dir, exist_ok=True)
-
-    files = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.lower().endswith(('.xls', '.xlsx'))]
-    if not files:
-        print('未找到 Excel 文件。')
-        return
-
-    for f in files:
-        try:
-            process_file(f, out_dir, date_input_fmt=args.date_input_fmt, preview=args.preview)
-        except Exception as e:
-            print(f'处理 {f} 失败: {e}')
-
-
-if __name__ == '__main__':
-    main()
+import os
+import sys
+import argparse
+import hashlib
+import json
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pandas as pd
+except Exception:
+    pd = None
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+# 以 python utils/convert_excel_dir.py 运行时把 backend 加入搜索路径，以便使用 Ship 维表
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from models.ships import ship_registry
+except Exception:
+    ship_registry = None
+
+# 目标字段
+TARGET_FIELDS = ['ship_id', 'datetime', 'lat', 'long', 'sea_temp', 'wave_height', 'wave_period', 'surge_direction', 'surge_height']
+
+# 可能的源字段名（包含英文和常见中文变体）
+SOURCE_CANDIDATES = {
+    'ship_id': ['SIGN_SHIP', 'ship_id', 'ship', '船舶', '船号', '编号'],
+    'datetime': ['YEAR-MONTH-DAY', 'datetime', 'date', 'time', '时间', '日期', '观测时间'],
+    'lat': ['LATITUDE', 'lat', '纬度'],
+    'long': ['LONGITUDE', 'long', 'lon', '经度'],
+    'sea_temp': ['SEA_TEMP', 'sea_temp', 'sea temperature', '海温', '海水温度'],
+    'wave_height': ['WAVE_HEIGHT', 'wave_height', 'wave height', '波高', '浪高'],
+    'wave_period': ['WAVE_PERIOD', 'wave_period', 'wave period', '波周期', '周期'],
+    'surge_direction': ['SURGE_DIRECTION', 'surge_direction', 'surge dir', '方向', '涌向'],
+    'surge_height': ['SURGE_HEIGHT', 'surge_height', 'surge', '涌高', '涌浪高度'],
+}
+
+# 年月日时列候选
+DATE_PART_CANDIDATES = {
+    'year': ['YEAR', 'year', '年', '年份'],
+    'month': ['MONTH', 'month', '月'],
+    'day': ['DAY', 'day', '日'],
+    'hour': ['HOUR', 'hour', '时', '小时'],
+}
+
+
+def find_best_column(df_cols, candidates):
+    cols_lower = {c.lower(): c for c in df_cols}
+    for cand in candidates:
+        if cand.lower() in cols_lower:
+            return cols_lower[cand.lower()]
+    # 尝试部分匹配
+    for cand in candidates:
+        for col in df_cols:
+            if cand.lower() in col.lower() or col.lower() in cand.lower():
+                return col
+    return None
+
+
+def db_ship_lookup():
+    """返回使用 Ship 维表分配 ShipID 的查询函数；数据库或 Ship 表不可用时返回 None"""
+    if ship_registry is None:
+        return None
+    try:
+        from models.schema import ships_available
+        if not ships_available():
+            return None
+    except Exception:
+        return None
+    return ship_registry.ship_id
+
+
+def _to_int(v):
+    """年/月/日/时取整：空值为 0，无法转换时提取其中的数字"""
+    if pd.isna(v):
+        return 0
+    if isinstance(v, int):
+        return int(v)
+    try:
+        return int(float(v))
+    except Exception:
+        # 尝试从字符串中提取数字
+        s = str(v)
+        digits = ''.join(ch for ch in s if ch.isdigit())
+        return int(digits) if digits else 0
+
+
+def _to_int_column(col):
+    """_to_int 的列版本：数值列整体截断，对象列中无法按数值解析的元素回退到 _to_int"""
+    if col.dtype.kind in 'iu':
+        return col.astype(np.int64)
+    if col.dtype.kind == 'f':
+        out = np.zeros(len(col), dtype=np.int64)
+        ok = np.isfinite(col)
+        out[ok] = np.trunc(col[ok]).astype(np.int64)
+        return out
+    num = pd.to_numeric(pd.Series(col, dtype=object), errors='coerce').to_numpy(dtype=float)
+    out = np.zeros(len(col), dtype=np.int64)
+    ok = np.isfinite(num)
+    out[ok] = np.trunc(num[ok]).astype(np.int64)
+    # 字符串等非数值元素（如 '2006年'）以及 inf 沿用逐个转换的规则
+    for i in np.flatnonzero(~ok & ~pd.isna(col)):
+        out[i] = _to_int(col[i])
+    return out
+
+
+# 涌浪方向分箱: [0, 45) N, [45, 135) E, [135, 225) S, [225, 315) W, [315, 360) N
+DIRECTION_EDGES = [45, 135, 225, 315]
+DIRECTION_LABELS = np.array(['N', 'E', 'S', 'W', 'N'], dtype=object) if np is not None else None
+
+
+def _bin_degrees(deg, sentinel):
+    """角度数组 -> N/E/S/W；sentinel=True 时 NaN、<= -90 和 -99.9（缺测）输出空串"""
+    out = np.full(len(deg), '', dtype=object)
+    valid = ~np.isnan(deg)
+    if sentinel:
+        valid &= ~((deg <= -90) | (deg == -99.9))
+    with np.errstate(invalid='ignore'):
+        d = np.mod(deg, 360)
+    out[valid] = DIRECTION_LABELS[np.digitize(d[valid], DIRECTION_EDGES)]
+    # inf 取模得到 NaN，不落入任何区间，按原规则归为 W
+    out[valid & np.isnan(d)] = 'W'
+    return out
+
+
+def _direction_from_text(text):
+    """字符串形式的涌浪方向：首字母为 N/S/E/W 时直接取用，否则按角度分箱（不判断缺测值）"""
+    s = text.strip().upper()
+    if s[0] in ('N', 'S', 'E', 'W'):
+        return s[0]
+    try:
+        return _bin_degrees(np.array([float(s)]), sentinel=False)[0]
+    except Exception:
+        return ''
+
+
+def _as_float(v):
+    try:
+        return np.nan if pd.isna(v) else float(v)
+    except Exception:
+        return np.nan
+
+
+def _surge_direction_column(col):
+    if col.dtype.kind in 'iuf':
+        return _bin_degrees(col.astype(float), sentinel=True)
+    out = np.full(len(col), '', dtype=object)
+    is_text = np.array([isinstance(v, str) and bool(v.strip()) for v in col], dtype=bool)
+    if (~is_text).any():
+        out[~is_text] = _bin_degrees(np.array([_as_float(v) for v in col[~is_text]], dtype=float), sentinel=True)
+    for i in np.flatnonzero(is_text):
+        out[i] = _direction_from_text(col[i])
+    return out
+
+
+def _ship_sign_column(col):
+    """船舶呼号：空值为 ''，其余为 str(值).strip()"""
+    s = pd.Series(col, dtype=object)
+    missing = s.isna().to_numpy()
+    signs = np.full(len(col), '', dtype=object)
+    if (~missing).any():
+        signs[~missing] = s[~missing].map(str).str.strip().to_numpy(dtype=object)
+    return signs
+
+
+def convert_frame(path):
+    """
+    读取并按列转换一个 Excel 文件（不访问 ship_id 映射，可在子进程中执行）。
+    返回 (各目标字段的列, ship_id 列的呼号数组)；呼号数组为 None 表示没有 ship_id 列。
+
+    按列整体转换（不逐行 iterrows）。取值与逐行实现一致：iterrows 的每一行来自
+    df.values，因此这里同样从 df.values 取列，保证输出 CSV 逐字节相同。
+    """
+    if pd is None or np is None:
+        raise RuntimeError('pandas 未安装，请先运行: pip install pandas openpyxl xlrd')
+
+    df = pd.read_excel(path)
+
+    mapping = {}
+    for tgt in TARGET_FIELDS:
+        src = find_best_column(df.columns, SOURCE_CANDIDATES.get(tgt, []))
+        mapping[tgt] = src
+
+    # 查找是否存在单独的 YEAR/MONTH/DAY/HOUR 列
+    date_parts_map = {}
+    for part, cands in DATE_PART_CANDIDATES.items():
+        date_parts_map[part] = find_best_column(df.columns, cands)
+    y_col = date_parts_map.get('year')
+    m_col = date_parts_map.get('month')
+    d_col = date_parts_map.get('day')
+    h_col = date_parts_map.get('hour')
+
+    n = len(df)
+    values = df.values
+
+    def column(col):
+        return values[:, df.columns.get_loc(col)]
+
+    empty = np.full(n, '', dtype=object)
+    out_cols = {}
+    signs = None
+    for tgt in TARGET_FIELDS:
+        src = mapping.get(tgt)
+        has_src = bool(src) and src in df.columns
+        if tgt == 'datetime':
+            # 如果直接映射到列，但该列恰好是 YEAR/MONTH/DAY/HOUR 其中之一，则优先合成完整 datetime
+            parts_set = {c for c in (y_col, m_col, d_col) if c}
+            if has_src and src not in parts_set:
+                out_cols[tgt] = column(src)
+            elif y_col and m_col and d_col:
+                # 使用 YEAR/MONTH/DAY[/HOUR] 合成 "YYYY-M-D H"
+                y = _to_int_column(column(y_col))
+                mo = _to_int_column(column(m_col))
+                da = _to_int_column(column(d_col))
+                hr = _to_int_column(column(h_col)) if h_col else np.zeros(n, dtype=np.int64)
+                text = (pd.Series(y).astype(str).str.zfill(4) + '-' + pd.Series(mo).astype(str) + '-'
+                        + pd.Series(da).astype(str) + ' ' + pd.Series(hr).astype(str))
+                out_cols[tgt] = text.to_numpy(dtype=object)
+            else:
+                out_cols[tgt] = empty
+        elif not has_src:
+            out_cols[tgt] = empty
+        elif tgt == 'surge_direction':
+            # 将 SURGE_DIRECTION 数值映射为 N/S/E/W
+            out_cols[tgt] = _surge_direction_column(column(src))
+        elif tgt == 'ship_id':
+            # 呼号在 assign_ship_ids() 中统一映射为整数
+            signs = _ship_sign_column(column(src))
+            out_cols[tgt] = empty
+        else:
+            out_cols[tgt] = column(src)
+    return out_cols, signs
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _convert_worker(path):
+    """进程池任务：异常转为返回值，避免一个文件失败影响其余结果的顺序"""
+    try:
+        return path, convert_frame(path), None, file_hash(path)
+    except Exception as e:
+        return path, None, str(e), None
+
+
+def _write_json_atomic(target, obj):
+    """写入临时文件后原子替换，避免中断时留下不完整的文件"""
+    tmp_file = target + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as mf:
+        json.dump(obj, mf, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, target)
+
+
+# ---------- 增量转换清单 ----------
+# convert_manifest.json 与输出 CSV 放在同一目录：
+# { 源文件名: {size, mtime, sha256, output, rows, converted_at} }
+
+MANIFEST_FILE = 'convert_manifest.json'
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as mf:
+            return json.load(mf).get('files', {})
+    except Exception:
+        return {}
+
+
+def save_manifest(out_dir, manifest):
+    _write_json_atomic(os.path.join(out_dir, MANIFEST_FILE), {'version': 1, 'files': manifest})
+
+
+def select_changed(files, out_dir, manifest, force=False, since=None):
+    """
+    返回需要转换的文件（保持原顺序）。
+    - since（时间戳）: 修改时间早于它的文件直接跳过
+    - 大小和修改时间与清单一致且输出存在: 跳过，不读取文件
+    - 仅修改时间变化: 计算内容哈希，相同则只更新清单中的修改时间
+    - force: 除 since 外全部重新转换
+    """
+    selected = []
+    for path in files:
+        st = os.stat(path)
+        if since is not None and st.st_mtime < since:
+            continue
+        entry = manifest.get(os.path.basename(path))
+        if force or not entry or not os.path.exists(os.path.join(out_dir, entry.get('output', ''))):
+            selected.append(path)
+            continue
+        if entry.get('size') != st.st_size:
+            selected.append(path)
+        elif entry.get('mtime') != st.st_mtime:
+            if file_hash(path) == entry.get('sha256'):
+                entry['mtime'] = st.st_mtime
+            else:
+                selected.append(path)
+    return selected
+
+
+def load_ship_map(out_dir):
+    map_file = os.path.join(out_dir, 'ship_id_map.json')
+    if os.path.exists(map_file):
+        try:
+            with open(map_file, 'r', encoding='utf-8') as mf:
+                return json.load(mf)
+        except Exception:
+            return {}
+    return {}
+
+
+def save_ship_map(out_dir, ship_map):
+    try:
+        _write_json_atomic(os.path.join(out_dir, 'ship_id_map.json'), ship_map)
+    except Exception:
+        pass
+
+
+def assign_ship_ids(signs, ship_map, ship_lookup=None):
+    """
+    按首次出现的顺序为新呼号分配 ShipID（ship_map 原地更新），返回 呼号 -> ShipID。
+    ship_lookup 不为 None 时改为调用 ship_lookup(呼号)。
+    """
+    sign_ids = {}
+    if signs is None:
+        return sign_ids
+    # 计算下一个 id
+    try:
+        existing_ids = [int(v) for v in ship_map.values()]
+        next_id = max(existing_ids) + 1 if existing_ids else 1
+    except Exception:
+        next_id = 1
+    for sign in pd.unique(signs[signs != '']):
+        if ship_lookup is not None:
+            sign_ids[sign] = ship_lookup(sign)
+        elif sign in ship_map:
+            sign_ids[sign] = ship_map[sign]
+        else:
+            ship_map[sign] = next_id
+            sign_ids[sign] = next_id
+            next_id += 1
+    return sign_ids
+
+
+def write_csv(path, out_dir, out_cols, signs, sign_ids):
+    import csv
+    if signs is not None:
+        present = signs != ''
+        ids = np.full(len(signs), '', dtype=object)
+        ids[present] = pd.Series(signs[present], dtype=object).map(sign_ids).to_numpy(dtype=object)
+        out_cols = dict(out_cols, ship_id=ids)
+    base = os.path.splitext(os.path.basename(path))[0]
+    out_path = os.path.join(out_dir, base + '.csv')
+    with open(out_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(TARGET_FIELDS)
+        writer.writerows(zip(*(out_cols[t] for t in TARGET_FIELDS)))
+    print(f'Converted {path} -> {out_path}')
+    return out_path
+
+
+def process_file(path, out_dir, date_input_fmt=None, preview=False, ship_lookup=None):
+    """
+    转换单个文件。
+    ship_lookup 为 呼号 -> ShipID 的函数（如 db_ship_lookup()）；
+    为 None 时使用 out_dir 下的 ship_id_map.json 分配 ShipID
+    """
+    if preview:
+        if pd is None:
+            raise RuntimeError('pandas 未安装，请先运行: pip install pandas openpyxl xlrd')
+        df = pd.read_excel(path)
+        print(f'File: {path}')
+        print('Columns:', list(df.columns))
+        return
+
+    out_cols, signs = convert_frame(path)
+    ship_map = {} if ship_lookup is not None else load_ship_map(out_dir)
+    sign_ids = assign_ship_ids(signs, ship_map, ship_lookup)
+    write_csv(path, out_dir, out_cols, signs, sign_ids)
+    if ship_lookup is None:
+        save_ship_map(out_dir, ship_map)
+
+
+def convert_files(files, out_dir, jobs=1, ship_lookup=None, manifest=None):
+    """
+    转换多个文件。jobs > 1 时在进程池中并行读取和转换，结果按文件顺序依次合并：
+    新呼号按 (文件顺序, 文件内首次出现) 分配 ShipID，与并行度无关；
+    ship_id_map.json 在全部完成后一次性原子写入。
+    manifest 不为 None 时记录每个成功转换的文件（由调用方保存）。
+    返回失败的文件数。
+    """
+    ship_map = {} if ship_lookup is not None else load_ship_map(out_dir)
+    failed = 0
+
+    def merge(results):
+        nonlocal failed
+        for path, converted, error, digest in results:
+            if error is not None:
+                print(f'处理 {path} 失败: {error}')
+                failed += 1
+                continue
+            out_cols, signs = converted
+            try:
+                out_path = write_csv(path, out_dir, out_cols, signs, assign_ship_ids(signs, ship_map, ship_lookup))
+            except Exception as e:
+                print(f'处理 {path} 失败: {e}')
+                failed += 1
+                continue
+            if manifest is not None:
+                st = os.stat(path)
+                manifest[os.path.basename(path)] = {
+                    'size': st.st_size,
+                    'mtime': st.st_mtime,
+                    'sha256': digest,
+                    'output': os.path.basename(out_path),
+                    'rows': len(out_cols['datetime']),
+                    'converted_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+
+    if jobs > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # map 按提交顺序返回结果，合并顺序与串行一致
+            merge(pool.map(_convert_worker, files))
+    else:
+        merge(_convert_worker(f) for f in files)
+
+    if ship_lookup is None:
+        save_ship_map(out_dir, ship_map)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量将 data 目录下的 Excel 文件转换为符合导入格式的 CSV')
+    parser.add_argument('data_dir', help='包含 Excel 文件的目录')
+    parser.add_argument('--out', '-o', help='输出目录（默认覆盖 data_dir 下的 converted）', default=None)
+    parser.add_argument('--preview', action='store_true', help='仅预览每个文件的列名')
+    parser.add_argument('--date-input-fmt', help='如果需要，指定输入日期格式，例如 "%Y/%m/%d %H:%M:%S"')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='并行转换的进程数（默认 1）')
+    parser.add_argument('--force', action='store_true', help='忽略转换清单，重新转换全部文件')
+    parser.add_argument('--since', help='只处理修改时间不早于该时间的文件，例如 2024-05-01 或 "2024-05-01 08:00"')
+    parser.add_argument('--ship-ids', choices=['auto', 'db', 'file'], default='auto',
+                        help='ShipID 分配方式: db 使用数据库 Ship 维表，file 使用 ship_id_map.json，auto 优先 db')
+    args = parser.parse_args()
+
+    ship_lookup = None
+    if args.ship_ids != 'file' and not args.preview:
+        ship_lookup = db_ship_lookup()
+        if ship_lookup is None:
+            if args.ship_ids == 'db':
+                print('Ship 维表不可用，请先运行: python -m models.schema')
+                return
+            print('Ship 维表不可用，使用 ship_id_map.json 分配 ShipID')
+
+    data_dir = args.data_dir
+    out_dir = args.out or os.path.join(data_dir, 'converted')
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 按文件名排序，保证新 ShipID 的分配顺序可复现
+    files = sorted(os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.lower().endswith(('.xls', '.xlsx')))
+    if not files:
+        print('未找到 Excel 文件。')
+        return
+
+    if args.preview:
+        for f in files:
+            try:
+                process_file(f, out_dir, preview=True)
+            except Exception as e:
+                print(f'处理 {f} 失败: {e}')
+        return
+
+    since = None
+    if args.since:
+        try:
+            since = datetime.strptime(args.since, '%Y-%m-%d %H:%M' if ' ' in args.since else '%Y-%m-%d').timestamp()
+        except ValueError:
+            print('--since 格式应为 YYYY-MM-DD 或 "YYYY-MM-DD HH:MM"')
+            return
+
+    manifest = load_manifest(out_dir)
+    todo = select_changed(files, out_dir, manifest, force=args.force, since=since)
+    print(f'共 {len(files)} 个文件，需转换 {len(todo)} 个，跳过 {len(files) - len(todo)} 个')
+    if todo:
+        convert_files(todo, out_dir, jobs=max(1, args.jobs), ship_lookup=ship_lookup, manifest=manifest)
+    save_manifest(out_dir, manifest)
+
+
+if __name__ == '__main__':
+    main()
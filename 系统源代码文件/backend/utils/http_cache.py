@@ -0,0 +1,81 @@
+"""
+基于数据版本号的 HTTP 缓存（ETag / If-None-Match）
+
+- Data_u 只在管理员写操作时变化；每个写路径提交后调用 bump_data_version()
+- ETag = hash(数据版本, 路径, Accept 头, 规范化后的查询参数)，版本不变则同一查询的 ETag 不变
+- 客户端带回匹配的 If-None-Match 时直接返回 304，不访问数据库
+- 响应附带 Cache-Control，反向代理可据此缓存并用 ETag 重新验证
+- 版本号只取自共享的版本文件 Config.DATA_VERSION_FILE（inode 和 mtime）和发布标识 Config.DEPLOY_ID，
+  不含任何进程内状态：各工作进程、重启前后对同一数据签发相同的 ETag，重新验证可以落到任意进程。
+  bump_data_version() 替换版本文件，API 进程和命令行工具（导入、去重、归档、重建）的写入都会使 ETag 失效；
+  每次计算 ETag 只需 stat 一次该文件。API 进程与命令行工具须在同一台机器上、使用同一个版本文件
+  （相对路径时从 backend 目录运行）；响应格式变化时修改 DEPLOY_ID 使旧 ETag 失效
+- 读接口查询只读快照（Config.READ_ENGINE 为 sqlite/duckdb）时，快照文件的版本也参与计算，刷新快照后 ETag 随之变化
+"""
+import hashlib
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import request, make_response
+from config import Config
+from models.database import read_snapshot_version
+
+def bump_data_version():
+    """
+    Data_u 发生变化（提交）后调用，使之前签发的 ETag 全部失效；命令行工具写库后同样调用。
+    写临时文件再替换：每次都是新的 inode，不依赖文件系统的时间精度
+    """
+    path = Config.DATA_VERSION_FILE
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(f'{os.getpid()} {time.time()}')
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"更新数据版本文件失败: {e}")
+
+
+def data_version():
+    """版本文件不存在（还没有任何写入）时所有进程都取 '0'"""
+    try:
+        st = os.stat(Config.DATA_VERSION_FILE)
+    except OSError:
+        return f'{Config.DEPLOY_ID}-0'
+    return f'{Config.DEPLOY_ID}-{st.st_ino}.{st.st_mtime_ns}'
+
+
+def request_etag():
+    """由数据版本、路径和规范化的查询参数（去掉空值并排序）计算 ETag"""
+    args = sorted((k, v) for k, v in request.args.items(multi=True) if v != '')
+    # Accept 头可以选择响应格式（见 utils/columnar.py），也参与计算
+    raw = '|'.join([data_version(), read_snapshot_version(), request.path, request.headers.get('Accept', '')] + [f'{k}={v}' for k, v in args])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def cache_control():
+    return f'public, max-age={Config.HTTP_CACHE_MAX_AGE}, must-revalidate'
+
+
+def etag_cached(fn):
+    """
+    读接口装饰器：If-None-Match 命中时返回 304，否则为 200 响应附加 ETag 和 Cache-Control
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not Config.HTTP_CACHE_ENABLED:
+            return fn(*args, **kwargs)
+        tag = request_etag()
+        if request.if_none_match.contains(tag):
+            resp = make_response('', 304)
+        else:
+            resp = make_response(fn(*args, **kwargs))
+            if resp.status_code != 200:
+                return resp
+        resp.set_etag(tag)
+        resp.headers['Cache-Control'] = cache_control()
+        resp.vary.add('Accept')
+        return resp
+    return wrapper
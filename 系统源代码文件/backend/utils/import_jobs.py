@@ -0,0 +1,416 @@
+"""
+后台 CSV 导入任务
+
+- submit() 把上传文件落到临时文件后立即返回任务 ID，由固定大小的线程池执行 import_stream
+- 同时运行的任务数为 Config.IMPORT_JOB_WORKERS（每个任务占用一个连接池连接），
+  排队加运行中的任务超过 Config.IMPORT_JOB_MAX_ACTIVE 时拒绝新任务，避免导入挤占查询
+- 每个 chunk 之后更新进度（已处理行数、已导入行数、失败行、行/秒），并检查取消标记
+- 取消：排队中的任务直接取消；运行中的任务在下一个 chunk 边界回滚当前事务并停止
+  （commit_per_chunk 时已提交的 chunk 保留）
+- 结束的任务保留 Config.IMPORT_JOB_TTL 秒供查询，临时文件在任务结束后删除
+- 已执行迁移 v9 时任务状态同步写入 Import_Job 表（进度最多每 Config.IMPORT_JOB_SYNC_INTERVAL 秒一次）：
+  轮询落到其他工作进程时从表中读取；取消请求写入 CancelRequested，由执行任务的进程在同步时读到后停止。
+  未迁移时任务只存在于提交它的进程内
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config import Config
+from models.database import get_db_connection
+from models.schema import import_jobs_available
+from utils.importer import import_stream, ImportDecodeError, ImportCancelled
+from utils.http_cache import bump_data_version
+
+QUEUED = 'queued'
+RUNNING = 'running'
+CANCELLING = 'cancelling'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+_STORED_FAILED = 1000  # Import_Job 中最多保存的失败行数（本进程内的任务返回全部失败行）
+
+
+class ImportJob:
+
+    def __init__(self, path, filename, user_id, chunk_size, commit_per_chunk, on_duplicate='insert'):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.filename = filename
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.commit_per_chunk = commit_per_chunk
+        self.on_duplicate = on_duplicate
+        self.status = QUEUED
+        self.error = None
+        self.total_rows = 0
+        self.imported = 0
+        self.updated = 0
+        self.skipped = 0
+        self.failed = []
+        self.failed_count = None  # 从 Import_Job 读出的任务：失败总数（failed 可能被截断）
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.cancel_event = threading.Event()
+        self.synced_at = 0.0
+
+    @classmethod
+    def from_row(cls, row):
+        """由 Import_Job 的一行构造（其他进程执行的任务，只用于查询）"""
+        (job_id, status, filename, user_id, commit_per_chunk, on_duplicate, total_rows, imported, updated,
+         skipped, failed_count, failed, error, created_at, started_at, finished_at) = row
+        job = cls(None, filename, user_id, None, bool(commit_per_chunk), on_duplicate)
+        job.id = job_id
+        job.status = status
+        job.total_rows = total_rows
+        job.imported = imported
+        job.updated = updated
+        job.skipped = skipped
+        job.failed_count = failed_count
+        job.failed = json.loads(failed) if failed else []
+        job.error = error
+        job.created_at = _ts(created_at)
+        job.started_at = _ts(started_at)
+        job.finished_at = _ts(finished_at)
+        return job
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self, with_failed=True):
+        elapsed = self.elapsed()
+        d = {
+            'job_id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'total_rows': self.total_rows,
+            'imported': self.imported,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'failed_count': len(self.failed) if self.failed_count is None else self.failed_count,
+            'elapsed': round(elapsed, 3),
+            'rows_per_sec': round(self.total_rows / elapsed, 1) if elapsed > 0 else 0,
+            'commit_per_chunk': self.commit_per_chunk,
+            'on_duplicate': self.on_duplicate,
+            'created_at': _fmt(self.created_at),
+            'started_at': _fmt(self.started_at),
+            'finished_at': _fmt(self.finished_at),
+            'error': self.error,
+        }
+        if with_failed:
+            d['failed'] = list(self.failed)
+        return d
+
+
+def _fmt(ts):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)) if ts else None
+
+
+def _dt(ts):
+    return datetime.fromtimestamp(ts) if ts else None
+
+
+def _ts(dt):
+    return dt.timestamp() if dt else None
+
+
+_JOB_COLUMNS = ('JobID, Status, Filename, UserID, CommitPerChunk, OnDuplicate, TotalRows, Imported, Updated, '
+                'Skipped, FailedCount, Failed, Error, CreatedAt, StartedAt, FinishedAt')
+
+
+class JobStore:
+    """
+    Import_Job 表的读写。每次借用一条连接并立即提交，
+    与导入任务自己的（可能整文件一个事务的）连接无关；数据库出错只打印提示，不影响导入
+    """
+
+    def available(self):
+        return import_jobs_available()
+
+    def _execute(self, sql, params=(), fetch=False):
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params)
+            rows = cur.fetchall() if fetch else cur.rowcount
+            conn.commit()
+            return rows
+        finally:
+            cur.close()
+            conn.close()
+
+    def _safely(self, what, sql, params=(), fetch=False):
+        if not self.available():
+            return None
+        try:
+            return self._execute(sql, params, fetch)
+        except Exception as e:
+            print(f"{what}失败: {e}")
+            return None
+
+    def insert(self, job):
+        self._safely('保存导入任务状态', """
+            INSERT INTO Import_Job (JobID, Status, Filename, UserID, CommitPerChunk, OnDuplicate, CreatedAt)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (job.id, job.status, (job.filename or '')[:255], job.user_id, int(job.commit_per_chunk),
+              job.on_duplicate, _dt(job.created_at)))
+
+    def save(self, job, with_failed=False):
+        """
+        写入状态和进度，返回是否有其他进程请求取消
+        with_failed 时同时写入失败行（任务结束时），进度更新只写失败数
+        """
+        sets = ('Status = %s, TotalRows = %s, Imported = %s, Updated = %s, Skipped = %s, FailedCount = %s, '
+                'Error = %s, StartedAt = %s, FinishedAt = %s')
+        params = [job.status, job.total_rows, job.imported, job.updated, job.skipped, len(job.failed),
+                  (job.error or '')[:1024] or None, _dt(job.started_at), _dt(job.finished_at)]
+        if with_failed:
+            sets += ', Failed = %s'
+            params.append(json.dumps(job.failed[:_STORED_FAILED], ensure_ascii=False))
+        self._safely('保存导入任务状态', f"UPDATE Import_Job SET {sets} WHERE JobID = %s", params + [job.id])
+        rows = self._safely('读取导入任务取消标记', "SELECT CancelRequested FROM Import_Job WHERE JobID = %s",
+                            (job.id,), fetch=True)
+        return bool(rows and rows[0][0])
+
+    def get(self, job_id):
+        rows = self._safely('读取导入任务', f"SELECT {_JOB_COLUMNS} FROM Import_Job WHERE JobID = %s", (job_id,), fetch=True)
+        return ImportJob.from_row(rows[0]) if rows else None
+
+    def recent(self, ttl):
+        """未结束的任务和结束不超过 ttl 秒的任务"""
+        rows = self._safely('读取导入任务', f"""
+            SELECT {_JOB_COLUMNS} FROM Import_Job
+            WHERE FinishedAt IS NULL OR FinishedAt >= NOW(3) - INTERVAL %s SECOND
+            ORDER BY CreatedAt DESC
+        """, (ttl,), fetch=True)
+        return [ImportJob.from_row(r) for r in rows or ()]
+
+    def request_cancel(self, job_id):
+        """为其他进程执行的任务设置取消标记，返回是否找到未结束的任务"""
+        changed = self._safely('写入导入任务取消标记', """
+            UPDATE Import_Job
+            SET CancelRequested = 1, Status = IF(Status = %s, %s, Status)
+            WHERE JobID = %s AND Status IN (%s, %s, %s)
+        """, (RUNNING, CANCELLING, job_id, QUEUED, RUNNING, CANCELLING))
+        return bool(changed)
+
+    def prune(self, ttl):
+        self._safely('清理导入任务', "DELETE FROM Import_Job WHERE FinishedAt < NOW(3) - INTERVAL %s SECOND", (ttl,))
+
+
+class ImportJobManager:
+
+    def __init__(self, workers, max_active, ttl, sync_interval, store=None):
+        self.workers = workers
+        self.max_active = max_active
+        self.ttl = ttl
+        self.sync_interval = sync_interval
+        self.store = store or JobStore()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='import-job')
+        return self._executor
+
+    def _prune(self):
+        """删除结束超过 ttl 秒的任务（调用方持有锁）"""
+        now = time.time()
+        for job_id in [j.id for j in self._jobs.values()
+                       if j.status in FINISHED_STATES and now - j.finished_at > self.ttl]:
+            del self._jobs[job_id]
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status not in FINISHED_STATES)
+
+    def submit(self, upload, user_id, chunk_size, commit_per_chunk, on_duplicate='insert'):
+        """
+        保存上传文件并排队执行；活动任务已达上限时返回 None
+        upload 为 werkzeug FileStorage
+        """
+        with self._lock:
+            self._prune()
+            if sum(1 for j in self._jobs.values() if j.status not in FINISHED_STATES) >= self.max_active:
+                return None
+            fd, path = tempfile.mkstemp(prefix='import_', suffix='.csv')
+            os.close(fd)
+            job = ImportJob(path, upload.filename, user_id, chunk_size, commit_per_chunk, on_duplicate)
+            self._jobs[job.id] = job
+        try:
+            upload.save(path)
+        except Exception:
+            with self._lock:
+                del self._jobs[job.id]
+            _remove(path)
+            raise
+        self.store.prune(self.ttl)
+        self.store.insert(job)
+        job.future = self._pool().submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """本进程的任务直接返回，否则从 Import_Job 读取（其他工作进程提交的任务）"""
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+        return job if job is not None else self.store.get(job_id)
+
+    def list(self):
+        with self._lock:
+            self._prune()
+            jobs = dict(self._jobs)
+        for job in self.store.recent(self.ttl):
+            jobs.setdefault(job.id, job)
+        return sorted(jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def cancel(self, job_id):
+        """请求取消任务，返回任务（不存在时返回 None）；其他进程的任务只写入取消标记"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            self.store.request_cancel(job_id)
+            return self.store.get(job_id)
+        with self._lock:
+            if job.status in FINISHED_STATES:
+                return job
+            job.cancel_event.set()
+            if job.status == QUEUED and job.future is not None and job.future.cancel():
+                job.status = CANCELLED
+                job.finished_at = time.time()
+                _remove(job.path)
+            elif job.status == RUNNING:
+                job.status = CANCELLING
+        self._sync(job, force=True, with_failed=job.status in FINISHED_STATES)
+        return job
+
+    def _sync(self, job, force=False, with_failed=False):
+        """把状态写入 Import_Job（非 force 时按 sync_interval 节流）；读到其他进程的取消请求时设置取消标记"""
+        now = time.time()
+        if not force and now - job.synced_at < self.sync_interval:
+            return
+        job.synced_at = now
+        if self.store.save(job, with_failed):
+            with self._lock:
+                if job.status not in FINISHED_STATES:
+                    job.cancel_event.set()
+                    if job.status == RUNNING:
+                        job.status = CANCELLING
+
+    def _finish(self, job, status, error=None):
+        with self._lock:
+            job.status = status
+            job.error = error
+            job.finished_at = time.time()
+        self._sync(job, force=True, with_failed=True)
+
+    def _run(self, job):
+        with self._lock:
+            if not job.cancel_event.is_set():
+                job.status = RUNNING
+                job.started_at = time.time()
+        # 排队期间其他进程可能已请求取消
+        self._sync(job, force=True)
+        if job.cancel_event.is_set():
+            _remove(job.path)
+            self._finish(job, CANCELLED, '已取消')
+            return
+
+        def progress(total_rows, imported, failed, counts):
+            job.total_rows = total_rows
+            job.imported = imported
+            job.updated = counts['updated']
+            job.skipped = counts['skipped']
+            job.failed = sorted(failed, key=lambda x: x['row'])
+            self._sync(job)
+            if job.cancel_event.is_set():
+                raise ImportCancelled()
+
+        conn = None
+        try:
+            conn = get_db_connection()
+            with open(job.path, 'rb') as stream:
+                result = import_stream(conn, stream, user_id=job.user_id, chunk_size=job.chunk_size,
+                                       commit_per_chunk=job.commit_per_chunk,
+                                       use_load_data=Config.IMPORT_USE_LOAD_DATA, progress=progress,
+                                       on_duplicate=job.on_duplicate)
+            conn.commit()
+            job.total_rows = result['total_rows']
+            job.imported = result['imported']
+            job.updated = result['updated']
+            job.skipped = result['skipped']
+            job.failed = result['failed']
+            bump_data_version()
+            self._finish(job, SUCCEEDED)
+        except ImportCancelled:
+            self._rollback(job, conn)
+            self._finish(job, CANCELLED, '已取消' + ('，已提交的批次保留' if job.commit_per_chunk else '，已回滚'))
+        except ImportDecodeError:
+            self._rollback(job, conn)
+            self._finish(job, FAILED, '无法读取上传文件，需 utf-8 编码')
+        except Exception as e:
+            self._rollback(job, conn)
+            self._finish(job, FAILED, f'导入失败: {str(e)}')
+        finally:
+            if conn is not None:
+                conn.close()
+            _remove(job.path)
+
+    def _rollback(self, job, conn):
+        """回滚未提交的部分；整文件单事务时已导入数清零"""
+        if conn is not None:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        if job.commit_per_chunk:
+            # 失败前已提交的 chunk 仍然生效
+            bump_data_version()
+        else:
+            job.imported = job.updated = 0
+
+    def shutdown(self):
+        """进程退出时取消排队任务，并让运行中的任务在下一个 chunk 边界停止"""
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel_event.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        # 被 cancel_futures 取消的排队任务没有执行 _run，状态表中仍是 queued
+        with self._lock:
+            pending = [j for j in self._jobs.values() if j.status not in FINISHED_STATES]
+        for job in pending:
+            _remove(job.path)
+            self._finish(job, CANCELLED, '服务停止，任务已取消')
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+import_jobs = ImportJobManager(
+    workers=Config.IMPORT_JOB_WORKERS,
+    max_active=Config.IMPORT_JOB_MAX_ACTIVE,
+    ttl=Config.IMPORT_JOB_TTL,
+    sync_interval=Config.IMPORT_JOB_SYNC_INTERVAL
+)
+
+
+def shutdown_import_jobs():
+    import_jobs.shutdown()
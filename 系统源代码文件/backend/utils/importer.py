@@ -0,0 +1,340 @@
+"""
+CSV 流式批量导入
+
+- 上传文件按行增量解码/解析，不整体读入内存
+- 每 chunk_size 行做一次校验与类型转换，使用 executemany（驱动会改写为多行 INSERT）写入
+- 可选 LOAD DATA LOCAL INFILE（Config.IMPORT_USE_LOAD_DATA，需服务端开启 local_infile）
+- 可选每个 chunk 提交一次事务
+- 每个 chunk 在同一事务内增量更新汇总表（models/rollup.py）和 Ship 统计（models/ships.py），
+  提交后通知最近船舶索引（models/nearby_index.py）
+- ship_id 列可以是整数 ShipID，也可以是呼号（经 ship_registry 解析/分配）
+- 返回与原接口一致的逐行失败报告
+- progress 回调在每个 chunk 写入（及提交）后调用，可在回调中抛出 ImportCancelled 中止导入
+- on_duplicate 按自然键 (ShipID, DateTime_u, Lat, Long_u) 处理重复观测（需迁移 v6 的唯一索引）：
+    insert  原有行为，逐行插入，重复行由唯一索引报错并计入失败
+    skip    已存在的观测跳过
+    update  已存在的观测用新值覆盖（记录 UPDATE 操作）
+  skip/update 时先在批内按自然键去重，再用唯一索引一次查出已存在的行，新行仍走多行 INSERT；
+  不支持 LOAD DATA，此时改用 INSERT
+"""
+import codecs
+import csv
+import os
+import tempfile
+from datetime import datetime
+
+from models import rollup, ships, nearby_index
+from models.ships import ship_registry
+from models.schema import ships_available
+
+REQUIRED_FIELDS = ['ship_id', 'datetime', 'lat', 'long', 'sea_temp', 'wave_height', 'wave_period', 'surge_direction', 'surge_height']
+SURGE_DIRECTIONS = ('E', 'S', 'W', 'N')
+# 转换后的 CSV 中时间可能不补零、省略分秒（如 2003-9-22 6），与 MySQL 宽松解析的结果一致
+TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d %H', '%Y-%m-%d')
+
+INSERT_DATA_SQL = """
+INSERT INTO Data_u (ShipID, DateTime_u, Lat, Long_u, SeaTemp, WaveHeight, WavePeriod, SurgeDirection, SurgeHeight)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+UPDATE_DATA_SQL = """
+UPDATE Data_u SET SeaTemp = %s, WaveHeight = %s, WavePeriod = %s, SurgeDirection = %s, SurgeHeight = %s
+WHERE DataID = %s
+"""
+INSERT_RECORD_SQL = "INSERT INTO Record (OprateType, DateTime_u, UserID, DataID) VALUES (%s, %s, %s, %s)"
+LOAD_DATA_SQL = """
+LOAD DATA LOCAL INFILE %s INTO TABLE Data_u
+CHARACTER SET utf8mb4
+FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+LINES TERMINATED BY '\\n'
+(ShipID, DateTime_u, Lat, Long_u, @SeaTemp, @WaveHeight, @WavePeriod, SurgeDirection, @SurgeHeight)
+SET SeaTemp = NULLIF(@SeaTemp, ''), WaveHeight = NULLIF(@WaveHeight, ''),
+    WavePeriod = NULLIF(@WavePeriod, ''), SurgeHeight = NULLIF(@SurgeHeight, '')
+"""
+
+ON_DUPLICATE_MODES = ('insert', 'skip', 'update')
+_DUP_KEY_ERRNO = 1062   # ER_DUP_ENTRY
+_LOOKUP_BATCH = 500
+
+
+class ImportDecodeError(Exception):
+    """上传文件无法按 utf-8 解码"""
+
+
+class ImportCancelled(Exception):
+    """导入被取消（由 progress 回调抛出）"""
+
+
+def iter_csv_rows(stream, encoding='utf-8-sig'):
+    """
+    从二进制流中增量解码并逐行产出 (行号, dict)，行号从 1 开始（不含表头）
+    """
+    lines = codecs.iterdecode(stream, encoding)
+    reader = csv.DictReader(lines)
+    idx = 0
+    try:
+        for row in reader:
+            idx += 1
+            yield idx, row
+    except UnicodeDecodeError as e:
+        raise ImportDecodeError(str(e))
+
+
+def iter_chunks(rows, size):
+    """把行迭代器切成长度不超过 size 的列表"""
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _ship_id(v):
+    text = str(v).strip()
+    if text.lstrip('-').isdigit():
+        return int(text)
+    ship_id = ship_registry.ship_id(text) if ships_available() else None
+    if ship_id is None:
+        raise ValueError(f"无法识别的船舶: {text}")
+    return ship_id
+
+
+def _opt_float(v):
+    return float(v) if v != '' else None
+
+
+def parse_time(v):
+    """解析观测时间，返回 datetime；格式无效时抛出 ValueError"""
+    if isinstance(v, datetime):
+        return v.replace(microsecond=0)
+    text = str(v).strip()
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"时间格式无效: {text}")
+
+
+def convert_row(row):
+    """
+    校验并转换一行；成功返回参数元组，失败抛出 ValueError（消息即失败原因）
+    """
+    missing = [f for f in REQUIRED_FIELDS if f not in row or row[f] == '' or row[f] is None]
+    if missing:
+        raise ValueError(f"缺少字段: {','.join(missing)}")
+    if row['surge_direction'] not in SURGE_DIRECTIONS:
+        raise ValueError("涌浪方向必须是 E/S/W/N 之一")
+    return (
+        _ship_id(row['ship_id']),
+        parse_time(row['datetime']),
+        float(row['lat']),
+        float(row['long']),
+        _opt_float(row['sea_temp']),
+        _opt_float(row['wave_height']),
+        _opt_float(row['wave_period']),
+        row['surge_direction'],
+        _opt_float(row['surge_height']),
+    )
+
+
+def convert_chunk(chunk, failed):
+    """转换一个 chunk，返回 [(行号, 参数)]，失败行追加到 failed"""
+    good = []
+    for idx, row in chunk:
+        try:
+            good.append((idx, convert_row(row)))
+        except Exception as ex:
+            failed.append({"row": idx, "reason": str(ex)})
+    return good
+
+
+def _write_records(cursor, data_ids, user_id, op_type):
+    """批量写入导入操作记录（记录失败不中断导入）"""
+    if not data_ids:
+        return
+    now = datetime.now()
+    try:
+        cursor.executemany(INSERT_RECORD_SQL, [(op_type, now, user_id, did) for did in data_ids])
+    except Exception as rec_ex:
+        print(f"记录操作到 Record 失败 ({op_type}) {len(data_ids)} 行: {rec_ex}")
+
+
+def _insert_rows(cursor, good, failed, skip_duplicates=False):
+    """
+    多行 INSERT 写入一个 chunk，返回新插入的 DataID 列表。
+    整批失败时逐行重试以定位失败行（MySQL 语句级原子性，失败语句不影响事务中已写入的行）；
+    skip_duplicates=True 时违反唯一索引的行直接跳过，不计入 failed。
+    """
+    if not good:
+        return []
+    try:
+        cursor.executemany(INSERT_DATA_SQL, [p for _, p in good])
+        # 单条多行 INSERT 的自增值是连续的
+        first_id = cursor.lastrowid
+        return list(range(first_id, first_id + len(good)))
+    except Exception:
+        pass
+
+    new_ids = []
+    for idx, params in good:
+        try:
+            cursor.execute(INSERT_DATA_SQL, params)
+            new_ids.append(cursor.lastrowid)
+        except Exception as ex:
+            if skip_duplicates and getattr(ex, 'errno', None) == _DUP_KEY_ERRNO:
+                continue
+            failed.append({"row": idx, "reason": str(ex)})
+    return new_ids
+
+
+def natural_key(params):
+    """参数元组（或查询行）的自然键 (ShipID, DateTime_u, Lat, Long_u)，经纬度按 DECIMAL(9,6) 取整"""
+    return (int(params[0]), parse_time(params[1]), round(float(params[2]), 6), round(float(params[3]), 6))
+
+
+def dedupe_batch(good, keep_last=False):
+    """
+    批内按自然键去重，返回 ([(行号, 参数, 键)], 去掉的行数)。
+    keep_last=False 保留首次出现的行，否则保留最后一次（位置仍为首次出现处）。
+    """
+    seen = {}
+    for idx, params in good:
+        key = natural_key(params)
+        if key in seen and not keep_last:
+            continue
+        seen[key] = (idx, params, key)
+    return list(seen.values()), len(good) - len(seen)
+
+
+def _existing_ids(cursor, keys):
+    """用唯一索引 uk_data_natural 查出已存在的自然键，返回 {键: DataID}"""
+    out = {}
+    for i in range(0, len(keys), _LOOKUP_BATCH):
+        part = keys[i:i + _LOOKUP_BATCH]
+        marks = ', '.join(['(%s, %s, %s, %s)'] * len(part))
+        cursor.execute(f"SELECT ShipID, DateTime_u, Lat, Long_u, DataID FROM Data_u "
+                       f"WHERE (ShipID, DateTime_u, Lat, Long_u) IN ({marks})",
+                       [v for k in part for v in k])
+        for row in cursor.fetchall():
+            out[natural_key(row)] = row[4]
+    return out
+
+
+def _upsert_rows(cursor, good, failed, on_duplicate, counts):
+    """
+    skip/update 模式写入一个 chunk，返回 (新插入的 DataID, 被覆盖的 DataID)。
+    counts 中累加 updated / skipped。
+    """
+    rows, dropped = dedupe_batch(good, keep_last=(on_duplicate == 'update'))
+    counts['skipped'] += dropped
+    existing = _existing_ids(cursor, [key for _, _, key in rows])
+
+    fresh = []
+    updates = []
+    for idx, params, key in rows:
+        data_id = existing.get(key)
+        if data_id is None:
+            fresh.append((idx, params))
+        elif on_duplicate == 'update':
+            updates.append((data_id, params))
+        else:
+            counts['skipped'] += 1
+
+    updated_ids = []
+    if updates:
+        cursor.executemany(UPDATE_DATA_SQL, [tuple(p[4:]) + (data_id,) for data_id, p in updates])
+        updated_ids = [data_id for data_id, _ in updates]
+        counts['updated'] += len(updated_ids)
+
+    failed_before = len(failed)
+    new_ids = _insert_rows(cursor, fresh, failed, skip_duplicates=True)
+    # 查询之后被并发写入的同键行在逐行重试时跳过
+    counts['skipped'] += len(fresh) - len(new_ids) - (len(failed) - failed_before)
+    return new_ids, updated_ids
+
+
+def _load_rows(cursor, good):
+    """
+    LOAD DATA LOCAL INFILE 写入一个 chunk，返回新插入的 DataID 列表。
+    DataID 依据 LAST_INSERT_ID() 推算，要求 innodb_autoinc_lock_mode <= 1。
+    """
+    if not good:
+        return []
+    fd, tmp_path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as tmp:
+            writer = csv.writer(tmp, lineterminator='\n')
+            for _, p in good:
+                writer.writerow(['' if v is None else v for v in p])
+        cursor.execute(LOAD_DATA_SQL, (tmp_path,))
+        loaded = cursor.rowcount
+        cursor.execute("SELECT LAST_INSERT_ID()")
+        first_id = cursor.fetchone()[0]
+        return list(range(first_id, first_id + loaded))
+    finally:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def write_chunk(conn, cursor, good, failed, user_id=None, op_type='IMPORT', use_load_data=False,
+                update_rollups=False, update_ships=False, on_duplicate='insert', counts=None):
+    """
+    写入一批已转换的行 [(行号, 参数)] 及其操作记录，并在同一事务中更新汇总表和 Ship 统计。
+    返回新插入的 DataID 列表；失败行追加到 failed，counts 中累加 updated / skipped。
+    """
+    updated_ids = []
+    if on_duplicate != 'insert':
+        new_ids, updated_ids = _upsert_rows(cursor, good, failed, on_duplicate,
+                                            counts if counts is not None else {'updated': 0, 'skipped': 0})
+    elif use_load_data:
+        new_ids = _load_rows(cursor, good)
+    else:
+        new_ids = _insert_rows(cursor, good, failed)
+    _write_records(cursor, new_ids, user_id, op_type)
+    _write_records(cursor, updated_ids, user_id, 'UPDATE')
+    if update_rollups:
+        rollup.refresh_safely(conn, rollup.keys_for_ids(conn, new_ids + updated_ids))
+    if update_ships:
+        ships.maintain_safely(ships.observe_ids, conn, new_ids)
+    nearby_index.track(conn, new_ids + updated_ids)
+    return new_ids
+
+
+def import_stream(conn, stream, user_id=None, chunk_size=1000, commit_per_chunk=False,
+                  use_load_data=False, op_type='IMPORT', progress=None, on_duplicate='insert'):
+    """
+    将 CSV 二进制流导入 Data_u。
+    返回 {total_rows, imported, updated, skipped, failed}（imported 为新插入的行数）；解码失败抛出 ImportDecodeError，提交失败抛出原异常。
+    commit_per_chunk=False 时整个文件一个事务，由调用方 commit。
+    progress(total_rows, imported, failed, counts) 在每个 chunk 之后调用（commit_per_chunk 时在提交之后）。
+    """
+    update_rollups = rollup.enabled(recheck=True)
+    update_ships = ships_available(recheck=True)
+    cursor = conn.cursor()
+    total_rows = 0
+    imported = 0
+    counts = {'updated': 0, 'skipped': 0}
+    failed = []
+    try:
+        conn.start_transaction()
+        for chunk in iter_chunks(iter_csv_rows(stream), chunk_size):
+            total_rows += len(chunk)
+            good = convert_chunk(chunk, failed)
+            new_ids = write_chunk(conn, cursor, good, failed, user_id, op_type, use_load_data,
+                                  update_rollups, update_ships, on_duplicate, counts)
+            imported += len(new_ids)
+            if commit_per_chunk:
+                conn.commit()
+                conn.start_transaction()
+            if progress is not None:
+                progress(total_rows, imported, failed, counts)
+    finally:
+        cursor.close()
+    failed.sort(key=lambda x: x['row'])
+    return {"total_rows": total_rows, "imported": imported, "updated": counts['updated'],
+            "skipped": counts['skipped'], "failed": failed}
@@ -0,0 +1,277 @@
+"""
+Excel 直接入库（不经过中间 CSV）
+
+与 convert_excel_dir.py 使用相同的字段映射（SOURCE_CANDIDATES / DATE_PART_CANDIDATES），
+转换后的列直接按批写入 Data_u，呼号经 Ship 维表分配 ShipID：
+    cd backend
+    python -m utils.ingest_excel ../data [--chunk-size 1000] [--user-id 1] [--rejects-dir rejects] [--on-duplicate skip]
+    python -m utils.ingest_excel ../data --resume          # 从上次中断处继续
+
+- 每批一个事务（同时写 Record、更新汇总表和 Ship 统计），内存占用为单个工作表加一批参数
+- 每批提交后把该文件已提交的行数写入 --state-file；文件中途失败时报告已导入的行数和续传位置，
+  --resume 时跳过已完成的文件和已提交的行（文件大小或修改时间变化后从头导入）
+- 行校验与 /api/data/import 一致：9 个字段均不能为空，涌浪方向须为 E/S/W/N
+- 每个文件输出 导入数/拒绝数/耗时/行每秒，拒绝原因可写入 --rejects-dir
+- 每批提交后更新共享的数据版本（utils/http_cache.py），运行中的服务的 ETag 随之失效
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from models.database import get_db_connection
+from models import rollup
+from models.schema import ships_available, natural_key_available
+from models.ships import ship_registry
+from utils.convert_excel_dir import convert_frame, assign_ship_ids
+from utils.importer import REQUIRED_FIELDS, SURGE_DIRECTIONS, ON_DUPLICATE_MODES, write_chunk
+from utils.http_cache import bump_data_version
+
+FLOAT_FIELDS = ('lat', 'long', 'sea_temp', 'wave_height', 'wave_period', 'surge_height')
+SYNTH_DATETIME_FORMAT = '%Y-%m-%d %H'  # convert_frame 由 YEAR/MONTH/DAY/HOUR 合成的格式
+DEFAULT_STATE_FILE = 'logs/ingest_state.json'
+
+
+class IngestFailed(Exception):
+    """文件中途失败；committed_rows 之前的行（及其中导入的 imported 行）已提交"""
+
+    def __init__(self, cause, committed_rows, imported):
+        super().__init__(str(cause))
+        self.committed_rows = committed_rows
+        self.imported = imported
+
+
+def _missing(col):
+    """空串或空值"""
+    s = pd.Series(col, dtype=object)
+    return (s.isna() | (s == '')).to_numpy()
+
+
+def _datetimes(col):
+    """时间列 -> datetime64；先按合成格式解析，其余再按任意格式解析，无法解析为 NaT"""
+    s = pd.Series(col, dtype=object)
+    dt = pd.to_datetime(s, format=SYNTH_DATETIME_FORMAT, errors='coerce')
+    rest = dt.isna() & ~_missing(col)
+    if rest.any():
+        dt[rest] = pd.to_datetime(s[rest].astype(str), format='mixed', errors='coerce')
+    return dt
+
+
+def frame_params(out_cols, ship_ids, first_row=1):
+    """
+    按列校验并生成 INSERT 参数。
+    返回 (good [(行号, 参数)], failed [{row, reason}])，行号从 first_row 开始（不含表头，与 CSV 导入一致）
+    """
+    n = len(ship_ids)
+    rows = np.arange(first_row, first_row + n)
+    reasons = np.full(n, None, dtype=object)
+    rejected = np.zeros(n, dtype=bool)
+
+    missing = {f: _missing(ship_ids if f == 'ship_id' else out_cols[f]) for f in REQUIRED_FIELDS}
+    any_missing = np.zeros(n, dtype=bool)
+    for f in REQUIRED_FIELDS:
+        any_missing |= missing[f]
+    for i in np.flatnonzero(any_missing):
+        reasons[i] = f"缺少字段: {','.join(f for f in REQUIRED_FIELDS if missing[f][i])}"
+    rejected |= any_missing
+
+    def reject(mask, reason):
+        for i in np.flatnonzero(mask & ~rejected):
+            reasons[i] = reason(i)
+        rejected[mask] = True
+
+    floats = {}
+    for f in FLOAT_FIELDS:
+        num = pd.to_numeric(pd.Series(out_cols[f], dtype=object), errors='coerce').to_numpy(dtype=float)
+        reject(~np.isfinite(num) & ~missing[f], lambda i: f"{f} 不是有效数值: {out_cols[f][i]}")
+        floats[f] = num
+
+    directions = pd.Series(out_cols['surge_direction'], dtype=object)
+    reject(~directions.isin(SURGE_DIRECTIONS).to_numpy() & ~missing['surge_direction'],
+           lambda i: "涌浪方向必须是 E/S/W/N 之一")
+
+    dt = _datetimes(out_cols['datetime'])
+    reject(dt.isna().to_numpy() & ~missing['datetime'], lambda i: f"时间格式无效: {out_cols['datetime'][i]}")
+
+    idx = np.flatnonzero(~rejected)
+    columns = [
+        [int(v) for v in ship_ids[idx]],
+        [t.to_pydatetime() for t in dt.iloc[idx]],
+        floats['lat'][idx].tolist(),
+        floats['long'][idx].tolist(),
+        floats['sea_temp'][idx].tolist(),
+        floats['wave_height'][idx].tolist(),
+        floats['wave_period'][idx].tolist(),
+        directions.to_numpy()[idx].tolist(),
+        floats['surge_height'][idx].tolist(),
+    ]
+    good = list(zip(rows[idx].tolist(), zip(*columns)))
+    failed = [{"row": int(rows[i]), "reason": reasons[i]} for i in np.flatnonzero(rejected)]
+    return good, failed
+
+
+def ingest_file(conn, path, chunk_size, user_id=None, use_load_data=False, on_duplicate='insert',
+                start_row=0, on_progress=None):
+    """
+    读取并转换一个 Excel 文件，从第 start_row 行（0 起）开始按 chunk_size 行一批写入，每批提交一次，
+    提交后调用 on_progress(已提交的行数)。
+    返回 {rows, imported, updated, skipped, failed, seconds}；中途失败抛出 IngestFailed
+    """
+    started = time.perf_counter()
+    out_cols, signs = convert_frame(path)
+    n = len(out_cols['datetime'])
+    if signs is None:
+        ship_ids = np.full(n, '', dtype=object)
+    else:
+        sign_ids = assign_ship_ids(signs, {}, ship_registry.ship_id)
+        ship_ids = pd.Series(signs, dtype=object).map(sign_ids).fillna('').to_numpy(dtype=object)
+
+    update_rollups = rollup.enabled()
+    imported = 0
+    counts = {'updated': 0, 'skipped': 0}
+    failed = []
+    cursor = conn.cursor()
+    try:
+        for start in range(start_row, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            part = {k: v[start:stop] for k, v in out_cols.items()}
+            good, bad = frame_params(part, ship_ids[start:stop], first_row=start + 1)
+            failed.extend(bad)
+            conn.start_transaction()
+            try:
+                new_ids = write_chunk(conn, cursor, good, failed, user_id, 'IMPORT', use_load_data,
+                                      update_rollups, True, on_duplicate, counts)
+                conn.commit()
+                bump_data_version()
+            except Exception as e:
+                conn.rollback()
+                raise IngestFailed(e, start, imported) from e
+            imported += len(new_ids)
+            if on_progress is not None:
+                on_progress(stop)
+    finally:
+        cursor.close()
+    failed.sort(key=lambda x: x['row'])
+    return {"rows": n - min(start_row, n), "imported": imported, "updated": counts['updated'],
+            "skipped": counts['skipped'], "failed": failed, "seconds": time.perf_counter() - started}
+
+
+def _file_signature(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime': int(st.st_mtime)}
+
+
+def _load_state(state_file):
+    try:
+        with open(state_file, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state_file, state):
+    os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+    tmp = state_file + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, state_file)
+
+
+def _resume_row(state, path):
+    """上次已提交的行数；文件变化过或没有记录时为 0"""
+    entry = state.get(os.path.abspath(path))
+    if not entry or {k: entry.get(k) for k in ('size', 'mtime')} != _file_signature(path):
+        return 0
+    return entry['committed_rows']
+
+
+def _write_rejects(rejects_dir, path, failed):
+    os.makedirs(rejects_dir, exist_ok=True)
+    out_path = os.path.join(rejects_dir, os.path.splitext(os.path.basename(path))[0] + '.rejects.csv')
+    with open(out_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['row', 'reason'])
+        writer.writerows((r['row'], r['reason']) for r in failed)
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='将目录下的 Excel 文件直接导入 Data_u')
+    parser.add_argument('data_dir', help='包含 Excel 文件的目录')
+    parser.add_argument('--chunk-size', type=int, default=Config.IMPORT_CHUNK_SIZE, help='每批（每个事务）写入的行数')
+    parser.add_argument('--user-id', type=int, default=None, help='写入 Record 的操作用户')
+    parser.add_argument('--rejects-dir', default=None, help='将每个文件的拒绝行写入该目录下的 <文件名>.rejects.csv')
+    parser.add_argument('--on-duplicate', choices=ON_DUPLICATE_MODES, default=Config.IMPORT_ON_DUPLICATE,
+                        help='已存在的观测（ShipID+时间+经纬度相同）：insert 照常插入，skip 跳过，update 覆盖')
+    parser.add_argument('--state-file', default=DEFAULT_STATE_FILE, help='记录每个文件已提交行数的进度文件')
+    parser.add_argument('--resume', action='store_true', help='跳过进度文件中已提交的行')
+    args = parser.parse_args()
+
+    if not ships_available():
+        print('Ship 表不存在，请先运行: python -m models.schema')
+        return
+    if args.on_duplicate != 'insert' and not natural_key_available():
+        print('缺少自然键唯一索引，请先运行: python -m models.dedupe 和 python -m models.schema')
+        return
+    files = sorted(os.path.join(args.data_dir, f) for f in os.listdir(args.data_dir)
+                   if f.lower().endswith(('.xls', '.xlsx')))
+    if not files:
+        print('未找到 Excel 文件。')
+        return
+
+    chunk_size = max(1, args.chunk_size)
+    totals = {"rows": 0, "imported": 0, "updated": 0, "skipped": 0, "failed": 0, "seconds": 0.0}
+    conn = get_db_connection()
+    try:
+        state = _load_state(args.state_file)
+        for path in files:
+            key = os.path.abspath(path)
+            start_row = _resume_row(state, path) if args.resume else 0
+            if start_row:
+                print(f'{os.path.basename(path)}: 从第 {start_row + 1} 行继续')
+
+            def progress(committed_rows, key=key, path=path):
+                state[key] = dict(_file_signature(path), committed_rows=committed_rows)
+                _save_state(args.state_file, state)
+
+            try:
+                result = ingest_file(conn, path, chunk_size, args.user_id, Config.IMPORT_USE_LOAD_DATA,
+                                     args.on_duplicate, start_row, progress)
+            except IngestFailed as e:
+                print(f'处理 {path} 失败: {e}')
+                print(f'    已提交前 {e.committed_rows} 行（本次导入 {e.imported} 行），'
+                      f'修复后可用 --resume 从第 {e.committed_rows + 1} 行继续')
+                totals['imported'] += e.imported
+                continue
+            except Exception as e:
+                print(f'处理 {path} 失败: {e}')
+                continue
+            rate = result['rows'] / result['seconds'] if result['seconds'] > 0 else 0
+            print(f"{os.path.basename(path)}: {result['rows']} 行，导入 {result['imported']}，"
+                  f"覆盖 {result['updated']}，跳过 {result['skipped']}，拒绝 {len(result['failed'])}，{result['seconds']:.2f}s，{rate:.0f} 行/秒")
+            for r in result['failed'][:5]:
+                print(f"    第 {r['row']} 行: {r['reason']}")
+            if result['failed'] and args.rejects_dir:
+                print(f"    拒绝明细: {_write_rejects(args.rejects_dir, path, result['failed'])}")
+            totals['rows'] += result['rows']
+            totals['imported'] += result['imported']
+            totals['updated'] += result['updated']
+            totals['skipped'] += result['skipped']
+            totals['failed'] += len(result['failed'])
+            totals['seconds'] += result['seconds']
+    finally:
+        conn.close()
+
+    rate = totals['rows'] / totals['seconds'] if totals['seconds'] > 0 else 0
+    print(f"合计 {len(files)} 个文件，{totals['rows']} 行，导入 {totals['imported']}，"
+          f"覆盖 {totals['updated']}，跳过 {totals['skipped']}，拒绝 {totals['failed']}，"
+          f"{totals['seconds']:.2f}s，{rate:.0f} 行/秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+请求与数据库查询指标（Prometheus 文本格式，GET /metrics）
+
+- 按 Flask endpoint（蓝图.视图函数）统计：请求数、请求耗时直方图、
+  每个请求的查询次数/查询耗时直方图、返回的数据库行数、响应字节数直方图
+- 数据库计时通过 models.database.add_cursor_wrapper() 包装连接池借出的游标，
+  覆盖所有路由模块和后台线程（后台线程的查询只计入全局计数，不属于任何请求）
+- Config.METRICS_ENABLED 为 False 时不注册钩子、不包装游标，/metrics 返回 404，没有额外开销
+"""
+import threading
+import time
+
+from flask import request, Response
+
+from config import Config
+from models.database import add_cursor_wrapper, get_pool_stats
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_local = threading.local()
+
+
+def _label_str(names, values):
+    if not names:
+        return ''
+    parts = []
+    for n, v in zip(names, values):
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{n}="{v}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _num(v):
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), n=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + n
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for lv, v in items:
+            lines.append(f'{self.name}{_label_str(self.labels, lv)} {_num(v)}')
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+        self._values = {}  # label_values -> [各桶计数..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_values=()):
+        with self._lock:
+            v = self._values.get(label_values)
+            if v is None:
+                v = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    v[i] += 1
+                    break
+            v[-2] += value
+            v[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((lv, list(v)) for lv, v in self._values.items())
+        names = self.labels + ('le',)
+        for lv, v in items:
+            cumulative = 0
+            for i, b in enumerate(self.buckets):
+                cumulative += v[i]
+                lines.append(f'{self.name}_bucket{_label_str(names, lv + (_num(b),))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_label_str(names, lv + ("+Inf",))} {v[-1]}')
+            lines.append(f'{self.name}_sum{_label_str(self.labels, lv)} {_num(v[-2])}')
+            lines.append(f'{self.name}_count{_label_str(self.labels, lv)} {v[-1]}')
+        return lines
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+requests_total = Counter('http_requests_total', '请求数', ('endpoint', 'method', 'status'))
+request_seconds = Histogram('http_request_duration_seconds', '请求耗时（秒）', LATENCY_BUCKETS, ('endpoint',))
+response_bytes = Histogram('http_response_bytes', '响应体字节数（流式响应不计）', BYTES_BUCKETS, ('endpoint',))
+request_queries = Histogram('db_queries_per_request', '每个请求执行的查询数', COUNT_BUCKETS, ('endpoint',))
+request_db_seconds = Histogram('db_time_per_request_seconds', '每个请求的查询耗时（秒）', LATENCY_BUCKETS, ('endpoint',))
+rows_total = Counter('db_rows_returned_total', '查询返回给应用的行数', ('endpoint',))
+queries_total = Counter('db_queries_total', '全部查询数（含后台线程）')
+query_seconds = Histogram('db_query_duration_seconds', '单条查询耗时（秒，含后台线程）', LATENCY_BUCKETS)
+
+_REGISTRY = [requests_total, request_seconds, response_bytes, request_queries, request_db_seconds,
+             rows_total, queries_total, query_seconds]
+
+
+class _RequestStats:
+    __slots__ = ('start', 'queries', 'db_seconds', 'rows')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+def _record_query(seconds):
+    queries_total.inc()
+    query_seconds.observe(seconds)
+    stats = getattr(_local, 'request', None)
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+
+
+def _record_rows(n):
+    stats = getattr(_local, 'request', None)
+    if stats is not None and n:
+        stats.rows += n
+
+
+class InstrumentedCursor:
+    """计时 execute/executemany，统计 fetch* 返回的行数；其余属性透传"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(*args, **kwargs)
+        finally:
+            _record_query(time.perf_counter() - start)
+
+    def executemany(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(*args, **kwargs)
+        finally:
+            _record_query(time.perf_counter() - start)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            _record_rows(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        _record_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        _record_rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            _record_rows(1)
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _before_request():
+    _local.request = _RequestStats()
+
+
+def _after_request(resp):
+    stats = getattr(_local, 'request', None)
+    if stats is None:
+        return resp
+    _local.request = None
+    endpoint = request.endpoint or 'unmatched'
+    label = (endpoint,)
+    requests_total.inc((endpoint, request.method, str(resp.status_code)))
+    request_seconds.observe(time.perf_counter() - stats.start, label)
+    request_queries.observe(stats.queries, label)
+    request_db_seconds.observe(stats.db_seconds, label)
+    rows_total.inc(label, stats.rows)
+    if not resp.is_streamed and resp.content_length is not None:
+        response_bytes.observe(resp.content_length, label)
+    return resp
+
+
+def _pool_lines():
+    lines = []
+    try:
+        stats = get_pool_stats()
+    except Exception:
+        return lines
+    for key in ('size', 'created', 'in_use', 'idle'):
+        lines += [f'# TYPE db_pool_{key} gauge', f'db_pool_{key} {stats[key]}']
+    for key in ('checkouts', 'waits', 'timeouts', 'reconnects', 'discarded'):
+        lines += [f'# TYPE db_pool_{key}_total counter', f'db_pool_{key}_total {stats[key]}']
+    return lines
+
+
+def render():
+    lines = []
+    for metric in _REGISTRY:
+        lines += metric.render()
+    lines += _pool_lines()
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """注册请求钩子、包装数据库游标并添加 /metrics；METRICS_ENABLED 为 False 时什么都不做"""
+    if not Config.METRICS_ENABLED:
+        return
+    add_cursor_wrapper(InstrumentedCursor)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,106 @@
+"""
+游标（keyset）分页
+
+按 (时间列, 主键) 倒序翻页，不再使用 OFFSET：
+- 游标是不透明字符串，编码了翻页方向和边界行的 (时间, 主键)
+- 'n' 向后（更旧的数据），'p' 向前（更新的数据）
+- 总数可选，由带过期时间的进程内缓存提供，避免每页一次 COUNT(*)
+"""
+import base64
+import json
+import threading
+import time
+
+from config import Config
+
+NEXT = 'n'
+PREV = 'p'
+
+
+def encode_cursor(direction, dt, row_id):
+    raw = json.dumps([direction, str(dt), int(row_id)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(token):
+    """解析游标，返回 (direction, dt_str, row_id)；格式错误抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, dt, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError('无效的分页游标')
+    if direction not in (NEXT, PREV):
+        raise ValueError('无效的分页游标')
+    return direction, dt, int(row_id)
+
+
+def page_args(args, default_per_page=50):
+    """从请求参数读取 (page, per_page)；小于 1 时抛出 ValueError（否则 LIMIT/OFFSET 为负）"""
+    page = args.get('page', 1, type=int)
+    per_page = args.get('per_page', default_per_page, type=int)
+    if page < 1:
+        raise ValueError('page 必须是正整数')
+    if per_page < 1:
+        raise ValueError('per_page 必须是正整数')
+    return page, per_page
+
+
+def keyset_clause(dt_col, id_col, cursor):
+    """
+    根据游标生成 WHERE 片段、参数和 ORDER BY。
+    cursor 为 None 时从最新一页开始。
+    返回 (where_sql, params, order_sql, direction)
+    """
+    if cursor is None:
+        return '', [], f" ORDER BY {dt_col} DESC, {id_col} DESC", NEXT
+    direction, dt, row_id = decode_cursor(cursor)
+    if direction == NEXT:
+        where = f" AND ({dt_col} < %s OR ({dt_col} = %s AND {id_col} < %s))"
+        order = f" ORDER BY {dt_col} DESC, {id_col} DESC"
+    else:
+        where = f" AND ({dt_col} > %s OR ({dt_col} = %s AND {id_col} > %s))"
+        order = f" ORDER BY {dt_col} ASC, {id_col} ASC"
+    return where, [dt, dt, row_id], order, direction
+
+
+def page_from_rows(rows, per_page, direction, has_cursor, dt_key, id_key):
+    """
+    rows 为按 LIMIT per_page + 1 取回的结果。
+    返回 (当前页按时间倒序的行, next_cursor, prev_cursor)
+    """
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == PREV:
+        rows = list(reversed(rows))
+    if not rows:
+        return rows, None, None
+    first, last = rows[0], rows[-1]
+    if direction == NEXT:
+        next_cursor = encode_cursor(NEXT, last[dt_key], last[id_key]) if has_more else None
+        prev_cursor = encode_cursor(PREV, first[dt_key], first[id_key]) if has_cursor else None
+    else:
+        next_cursor = encode_cursor(NEXT, last[dt_key], last[id_key])
+        prev_cursor = encode_cursor(PREV, first[dt_key], first[id_key]) if has_more else None
+    return rows, next_cursor, prev_cursor
+
+
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+def cached_count(key, compute):
+    """
+    带过期时间的计数缓存（Config.PAGINATION_COUNT_TTL 秒）。
+    compute 为实际执行 COUNT 的无参函数。
+    """
+    now = time.monotonic()
+    with _count_lock:
+        hit = _count_cache.get(key)
+        if hit and now - hit[1] < Config.PAGINATION_COUNT_TTL:
+            return hit[0]
+    value = compute()
+    with _count_lock:
+        if len(_count_cache) >= 1024:
+            _count_cache.clear()
+        _count_cache[key] = (value, now)
+    return value
@@ -0,0 +1,118 @@
+"""
+轨迹抽稀（Douglas-Peucker，NumPy 向量化计算点到线段的距离）
+
+- 多艘船的点（未指定 ship_id）按 ship_id 分组，每条轨迹单独抽稀，互不影响
+- 始终保留每条轨迹的首尾点
+- 海温/浪高/涌浪高度变化超过阈值、或涌浪方向改变的点强制保留
+- zoom_to_tolerance() 把地图缩放级别换算为以度为单位的容差
+"""
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+from config import Config
+
+# 数据中的缺测标记（如 -99.9）
+MISSING_THRESHOLD = -99
+
+
+MAX_ZOOM = 22  # 常见瓦片地图的最大缩放级别
+
+
+def zoom_to_tolerance(zoom):
+    """Web Mercator 下每像素约 360 / (256 * 2^zoom) 度，乘以允许的像素误差；zoom 超出 0~MAX_ZOOM 时抛出 ValueError"""
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f'zoom 必须在 0 到 {MAX_ZOOM} 之间')
+    return Config.SIMPLIFY_PIXEL_TOLERANCE * 360.0 / (256 * 2 ** zoom)
+
+
+def _as_array(values):
+    arr = np.array([np.nan if v is None else v for v in values], dtype=float)
+    arr[arr <= MISSING_THRESHOLD] = np.nan
+    return arr
+
+
+def douglas_peucker(lat, lon, tolerance):
+    """返回需要保留的点的布尔掩码"""
+    n = len(lat)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    # 经度按平均纬度缩放，近似等距投影
+    x = lon * np.cos(np.radians(np.nanmean(lat)))
+    y = lat
+    stack = [(0, n - 1)]
+    while stack:
+        s, e = stack.pop()
+        if e - s < 2:
+            continue
+        xs, ys = x[s + 1:e], y[s + 1:e]
+        dx, dy = x[e] - x[s], y[e] - y[s]
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            d = np.hypot(xs - x[s], ys - y[s])
+        else:
+            d = np.abs(dy * (xs - x[s]) - dx * (ys - y[s])) / norm
+        i = int(np.argmax(d))
+        if d[i] > tolerance:
+            k = s + 1 + i
+            keep[k] = True
+            stack.append((s, k))
+            stack.append((k, e))
+    return keep
+
+
+def significant_changes(points):
+    """环境值显著变化的点（与前一点相比）"""
+    n = len(points)
+    mask = np.zeros(n, dtype=bool)
+    if n < 2:
+        return mask
+    thresholds = {
+        'sea_temperature': Config.SIMPLIFY_TEMP_DELTA,
+        'wave_height': Config.SIMPLIFY_WAVE_DELTA,
+        'surge_height': Config.SIMPLIFY_WAVE_DELTA,
+    }
+    for key, delta in thresholds.items():
+        arr = _as_array([p[key] for p in points])
+        with np.errstate(invalid='ignore'):
+            mask[1:] |= np.abs(np.diff(arr)) > delta
+    directions = np.array([p['surge_direction'] or '' for p in points])
+    mask[1:] |= directions[1:] != directions[:-1]
+    return mask
+
+
+def _track_mask(points, tolerance):
+    """单条轨迹的保留掩码"""
+    if len(points) <= 2:
+        return np.ones(len(points), dtype=bool)
+    lat = np.array([p['latitude'] for p in points], dtype=float)
+    lon = np.array([p['longitude'] for p in points], dtype=float)
+    return douglas_peucker(lat, lon, tolerance) | significant_changes(points)
+
+
+def simplify_mask(points, tolerance):
+    """
+    points 为 _format_track 格式的字典列表（按时间排序，可含多艘船），返回需要保留的点的布尔掩码
+    """
+    if np is None:
+        raise RuntimeError('numpy 未安装，请先运行: pip install numpy')
+    if len(points) <= 2 or tolerance <= 0:
+        return np.ones(len(points), dtype=bool)
+    groups = {}
+    for i, p in enumerate(points):
+        groups.setdefault(p.get('ship_id'), []).append(i)
+    if len(groups) == 1:
+        return _track_mask(points, tolerance)
+    keep = np.zeros(len(points), dtype=bool)
+    for idx in groups.values():
+        keep[idx] = _track_mask([points[i] for i in idx], tolerance)
+    return keep
+
+
+def simplify_track(points, tolerance):
+    """返回抽稀后的点列表"""
+    keep = simplify_mask(points, tolerance)
+    return [p for p, k in zip(points, keep) if k]
@@ -0,0 +1,336 @@
+"""
+慢查询日志
+
+- SlowQueryCursor 包装连接池借出的游标（models.database.add_cursor_wrapper），
+  耗时只累计 execute 和 fetch 调用本身（非缓冲游标的耗时主要在 fetch），两次 fetch 之间应用代码的时间不计入；
+  缓冲游标和没有结果集的语句在 execute 返回时即结束计时，非缓冲游标在结果取完、游标关闭或下一次 execute 时结束
+- 超过 Config.SLOW_QUERY_THRESHOLD_MS 的语句放入队列，由后台线程处理，不阻塞请求：
+  用另一条连接执行 EXPLAIN（原连接上可能还有未读完的结果），
+  把 归一化 SQL、参数、耗时、返回行数、EXPLAIN 估算扫描行数和执行计划
+  以 JSON Lines 写入按大小轮转的 Config.SLOW_QUERY_LOG_FILE
+- 归一化：字面量和占位符替换为 ?，IN (...) 列表和多行 VALUES 折叠，空白合并；
+  可选条件拼出的不同 SQL 形状各自汇总
+- summary() 按总耗时返回前 N 个形状（进程内统计），供 GET /api/db/slow-queries 使用
+- MySQL 不向客户端报告单条语句的 Rows_examined，这里的扫描行数取自 EXPLAIN 的 rows 估算
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from config import Config
+from models.database import get_db_connection, add_cursor_wrapper
+
+_EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+_MAX_SHAPES = 500           # 进程内汇总的形状数上限，超出后新形状只写日志
+_MAX_PARAM_CHARS = 2000     # 日志中参数的最大长度
+
+_RE_COMMENT = re.compile(r'/\*.*?\*/|--[^\n]*', re.S)
+_RE_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_RE_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])')
+_RE_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+_RE_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+_RE_ROW_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+')
+_RE_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """把 SQL 归一化为形状：去注释、字面量/占位符 -> ?、折叠 IN 列表和多行 VALUES、合并空白"""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    s = _RE_COMMENT.sub(' ', sql)
+    s = _RE_STRING.sub('?', s)
+    s = _RE_PLACEHOLDER.sub('?', s)
+    s = _RE_NUMBER.sub('?', s)
+    s = _RE_IN_LIST.sub('IN (...)', s)
+    s = _RE_ROW_LIST.sub('(...)', s)
+    return _RE_SPACE.sub(' ', s).strip()
+
+
+def shape_id(shape):
+    return hashlib.sha1(shape.encode('utf-8')).hexdigest()[:12]
+
+
+def _jsonable(v):
+    if isinstance(v, datetime):
+        return v.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(v, (int, float, str)) or v is None:
+        return v
+    if isinstance(v, (list, tuple)):
+        return [_jsonable(x) for x in v]
+    if isinstance(v, dict):
+        return {k: _jsonable(x) for k, x in v.items()}
+    return str(v)
+
+
+class SlowQueryCursor:
+    """慢查询计时包装；其余属性透传"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._buffered = 'Buffered' in type(cursor).__name__
+        self._pending = None   # [sql, params, 已计入的秒数, 返回行数, many]
+
+    def _start(self, sql, params, many):
+        self._finish()
+        self._pending = [sql, params, 0.0, 0, many]
+
+    def _add(self, seconds):
+        if self._pending is not None:
+            self._pending[2] += seconds
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        elapsed_ms = pending[2] * 1000
+        if elapsed_ms >= Config.SLOW_QUERY_THRESHOLD_MS:
+            slow_query_log.submit(pending[0], pending[1], elapsed_ms, pending[3], pending[4])
+
+    def _fetched(self, n, seconds, done=False):
+        if self._pending is not None:
+            self._pending[2] += seconds
+            self._pending[3] += n
+            if done:
+                self._finish()
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._start(operation, params, False)
+        started = time.perf_counter()
+        try:
+            result = self._cursor.execute(operation, params, *args, **kwargs)
+        except Exception:
+            self._pending = None
+            raise
+        self._add(time.perf_counter() - started)
+        # 缓冲游标在 execute 内已取回全部结果；没有结果集的语句（DML/DDL）也已执行完
+        if self._buffered or self._cursor.description is None:
+            self._fetched(max(self._cursor.rowcount or 0, 0), 0.0, done=True)
+        return result
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._start(operation, seq_params, True)
+        started = time.perf_counter()
+        try:
+            result = self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        except Exception:
+            self._pending = None
+            raise
+        self._add(time.perf_counter() - started)
+        self._finish()
+        return result
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(0 if row is None else 1, time.perf_counter() - started, done=row is None)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._fetched(len(rows), time.perf_counter() - started, done=not rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(len(rows), time.perf_counter() - started, done=True)
+        return rows
+
+    def __iter__(self):
+        it = iter(self._cursor)
+        while True:
+            started = time.perf_counter()
+            try:
+                row = next(it)
+            except StopIteration:
+                break
+            self._fetched(1, time.perf_counter() - started)
+            yield row
+        self._finish()
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class SlowQueryLog:
+
+    def __init__(self, log_file, max_bytes, backups, queue_size):
+        self.log_file = log_file
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._logger = None
+        self._shapes = {}
+        self._shapes_lock = threading.Lock()
+        self._dropped = 0
+
+    def start(self):
+        """启动后台线程（幂等）"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='slow-query-log', daemon=True)
+                self._thread.start()
+
+    def submit(self, sql, params, elapsed_ms, rows, many=False):
+        """入队一条慢查询；队列满时丢弃"""
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait((sql, params, elapsed_ms, rows, many, datetime.now()))
+        except queue.Full:
+            with self._shapes_lock:
+                self._dropped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._handle(*item)
+            except Exception as e:
+                print(f"写入慢查询日志失败: {e}")
+
+    def _get_logger(self):
+        if self._logger is None:
+            d = os.path.dirname(self.log_file)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            logger = logging.getLogger('slow_query')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            handler = RotatingFileHandler(self.log_file, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def _explain(self, sql, params):
+        """在单独的连接上执行 EXPLAIN，返回 (计划行列表, 估算扫描行数)"""
+        conn = get_db_connection()
+        cur = conn.plain_cursor(dictionary=True)
+        try:
+            cur.execute('EXPLAIN ' + sql, params)
+            plan = cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+        examined = sum(int(r.get('rows') or 0) for r in plan)
+        keep = ('id', 'select_type', 'table', 'type', 'possible_keys', 'key', 'key_len', 'rows', 'filtered', 'Extra')
+        return [{k: _jsonable(r.get(k)) for k in keep} for r in plan], examined
+
+    def _handle(self, sql, params, elapsed_ms, rows, many, when):
+        if isinstance(sql, (bytes, bytearray)):
+            sql = sql.decode('utf-8', 'replace')
+        shape = normalize_sql(sql)
+        sid = shape_id(shape)
+        plan, examined, explain_error = None, None, None
+        if Config.SLOW_QUERY_EXPLAIN and not many and shape.split(' ', 1)[0].upper() in _EXPLAINABLE:
+            try:
+                plan, examined = self._explain(sql, params)
+            except Exception as e:
+                explain_error = str(e)
+        if many:
+            params = {'batches': len(params) if params is not None else 0}
+        param_text = json.dumps(_jsonable(params), ensure_ascii=False)
+        if len(param_text) > _MAX_PARAM_CHARS:
+            param_text = param_text[:_MAX_PARAM_CHARS] + '...'
+        entry = {
+            'time': when.strftime('%Y-%m-%d %H:%M:%S'),
+            'shape_id': sid,
+            'shape': shape,
+            'elapsed_ms': round(elapsed_ms, 3),
+            'rows_sent': rows,
+            'rows_examined_est': examined,
+            'params': param_text,
+            'explain': plan,
+        }
+        if explain_error:
+            entry['explain_error'] = explain_error
+        self._get_logger().info(json.dumps(entry, ensure_ascii=False))
+        self._aggregate(sid, shape, entry)
+
+    def _aggregate(self, sid, shape, entry):
+        with self._shapes_lock:
+            s = self._shapes.get(sid)
+            if s is None:
+                if len(self._shapes) >= _MAX_SHAPES:
+                    return
+                s = self._shapes[sid] = {'shape_id': sid, 'shape': shape, 'count': 0, 'total_ms': 0.0,
+                                         'max_ms': 0.0, 'rows_sent': 0, 'rows_examined_est': 0}
+            s['count'] += 1
+            s['total_ms'] += entry['elapsed_ms']
+            s['max_ms'] = max(s['max_ms'], entry['elapsed_ms'])
+            s['rows_sent'] += entry['rows_sent']
+            s['rows_examined_est'] += entry['rows_examined_est'] or 0
+            s['last_seen'] = entry['time']
+            s['last_params'] = entry['params']
+            if entry['explain'] is not None:
+                s['last_plan'] = [{k: p[k] for k in ('table', 'type', 'key', 'rows', 'Extra')} for p in entry['explain']]
+
+    def summary(self, limit=20):
+        """按总耗时排序的前 limit 个形状"""
+        with self._shapes_lock:
+            shapes = [dict(s) for s in self._shapes.values()]
+            dropped = self._dropped
+        shapes.sort(key=lambda s: s['total_ms'], reverse=True)
+        for s in shapes:
+            s['avg_ms'] = round(s['total_ms'] / s['count'], 3)
+            s['total_ms'] = round(s['total_ms'], 3)
+        return {
+            'threshold_ms': Config.SLOW_QUERY_THRESHOLD_MS,
+            'log_file': self.log_file,
+            'shapes': len(shapes),
+            'dropped': dropped,
+            'pending': self._queue.qsize(),
+            'top': shapes[:limit],
+        }
+
+    def reset(self):
+        with self._shapes_lock:
+            self._shapes.clear()
+            self._dropped = 0
+
+    def shutdown(self, timeout=5):
+        if self._thread is not None and self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                return
+            self._thread.join(timeout)
+
+
+slow_query_log = SlowQueryLog(
+    log_file=Config.SLOW_QUERY_LOG_FILE,
+    max_bytes=Config.SLOW_QUERY_LOG_MAX_BYTES,
+    backups=Config.SLOW_QUERY_LOG_BACKUPS,
+    queue_size=Config.SLOW_QUERY_QUEUE_SIZE
+)
+
+
+def init_slow_query_log():
+    """Config.SLOW_QUERY_ENABLED 时为连接池游标加上慢查询计时"""
+    if Config.SLOW_QUERY_ENABLED:
+        add_cursor_wrapper(SlowQueryCursor)
+
+
+def shutdown_slow_query_log():
+    slow_query_log.shutdown()
+
+
+def get_slow_query_summary(limit=20):
+    return slow_query_log.summary(limit)
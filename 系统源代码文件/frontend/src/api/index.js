@@ -1,46 +1,107 @@
-import axios from 'axios'
-
-const api = axios.create({
-  baseURL: '/api',
-  timeout: 10000
-})
-
-export async function getShips() {
-  return api.get('/data/ships')
-}
-
-export async function getVesselTracks(params) {
-  // params: { ship_id, start_time, end_time }
-  return api.get('/data/vessel-tracks', { params })
-}
-
-export async function getOceanEnvironment(params) {
-  return api.get('/data/ocean-environment', { params })
-}
-
-export async function addData(payload, headers = {}) {
-  return api.post('/data/add', payload, { headers })
-}
-
-export async function importCsv(formData, headers = {}) {
-  // let axios set multipart headers (boundary) — don't set Content-Type manually
-  return api.post('/data/import', formData, { headers })
-}
-
-export async function getRecords(params, headers = {}) {
-  return api.get('/record/operations', { params, headers })
-}
-
-export async function listData(params, headers = {}) {
-  return api.get('/data/list', { params, headers })
-}
-
-export async function deleteData(payload, headers = {}) {
-  return api.post('/data/delete', payload, { headers })
-}
-
-export async function updateData(payload, headers = {}) {
-  return api.post('/data/update', payload, { headers })
-}
-
-export default api
+import axios from 'axios'
+
+const api = axios.create({
+  baseURL: '/api',
+  timeout: 10000
+})
+
+// 携带登录令牌（登录时保存在 localStorage 的 user.token 中）
+api.interceptors.request.use((config) => {
+  try {
+    const user = JSON.parse(localStorage.getItem('user') || 'null')
+    if (user && user.token) {
+      config.headers = config.headers || {}
+      config.headers.Authorization = 'Bearer ' + user.token
+    }
+  } catch (e) {}
+  return config
+})
+
+export async function getShips() {
+  return api.get('/data/ships')
+}
+
+export async function getVesselTracks(params) {
+  // params: { ship_id, start_time, end_time }
+  return api.get('/data/vessel-tracks', { params })
+}
+
+// 流式读取轨迹（NDJSON），每收到一批就回调 onRows，返回全部轨迹点
+export async function streamVesselTracks(params, onRows) {
+  const qs = new URLSearchParams(Object.assign({}, params, { stream: 'ndjson' })).toString()
+  const resp = await fetch('/api/data/vessel-tracks?' + qs)
+  if (!resp.ok) throw new Error('请求失败: ' + resp.status)
+  const reader = resp.body.getReader()
+  const decoder = new TextDecoder()
+  const all = []
+  let buf = ''
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buf += decoder.decode(value, { stream: true })
+    const lines = buf.split('\n')
+    buf = lines.pop()
+    const rows = lines.filter(l => l).map(l => JSON.parse(l))
+    if (rows.length) {
+      all.push(...rows)
+      if (onRows) onRows(rows, all)
+    }
+  }
+  if (buf.trim()) all.push(JSON.parse(buf))
+  return all
+}
+
+export async function getOceanEnvironment(params) {
+  return api.get('/data/ocean-environment', { params })
+}
+
+export async function getOceanGrid(params) {
+  // params: { resolution, min_lat, max_lat, min_lng, max_lng, start_time, end_time }
+  return api.get('/data/ocean-grid', { params })
+}
+
+export async function getNearby(params) {
+  // params: { lat, lng, time, window_hours | start_time, end_time, radius_km | k, per_ship }
+  return api.get('/data/nearby', { params })
+}
+
+export async function addData(payload, headers = {}) {
+  return api.post('/data/add', payload, { headers })
+}
+
+export async function importCsv(formData, headers = {}) {
+  // let axios set multipart headers (boundary) — don't set Content-Type manually
+  return api.post('/data/import', formData, { headers })
+}
+
+// 后台导入：立即返回 job_id，之后用 getImportJob 轮询进度
+export async function startImportJob(formData, headers = {}, params = {}) {
+  // params.on_duplicate: insert | skip | update
+  return api.post('/data/import', formData, { headers, params: Object.assign({}, params, { mode: 'job' }) })
+}
+
+export async function getImportJob(jobId) {
+  return api.get('/data/import/' + jobId)
+}
+
+export async function cancelImportJob(jobId) {
+  return api.post('/data/import/' + jobId + '/cancel')
+}
+
+export async function getRecords(params, headers = {}) {
+  return api.get('/record/operations', { params, headers })
+}
+
+export async function listData(params, headers = {}) {
+  return api.get('/data/list', { params, headers })
+}
+
+export async function deleteData(payload, headers = {}) {
+  return api.post('/data/delete', payload, { headers })
+}
+
+export async function updateData(payload, headers = {}) {
+  return api.post('/data/update', payload, { headers })
+}
+
+export default api